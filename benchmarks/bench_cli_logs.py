@@ -0,0 +1,103 @@
+"""
+Parsing speed of ``yarn logs`` output.
+
+Compares the streaming parser used by ``YARNAPI.logs`` with the previous
+string-concatenating one on synthetic CLI output. Run directly, giving the
+size of output to generate in MB (the old parser is only timed on sizes it
+can finish in reasonable time):
+
+    $ python benchmarks/bench_cli_logs.py 4096
+"""
+from __future__ import print_function
+
+import os
+import re
+import resource
+import sys
+import tempfile
+import time
+
+from knit.yarn_api import collect_cli_logs, iter_cli_logs
+
+LINE = b'2018-01-01 00:00:00,000 INFO worker: some routine log message\n'
+
+
+def write_cli_output(path, size_mb, n_containers=400):
+    """Synthetic ``yarn logs`` output of roughly the given size"""
+    per_log = size_mb * 2**20 // (n_containers * 2)
+    body = LINE * (per_log // len(LINE))
+    with open(path, 'wb') as f:
+        for i in range(n_containers):
+            f.write(b'\nContainer: container_1_0001_01_%06i on node%i_45454\n'
+                    b'=============================\n' % (i, i % 50))
+            for ltype in [b'stderr', b'stdout']:
+                f.write(b'LogType:%s\nLogLength:%i\nLog Contents:\n'
+                        % (ltype, len(body)))
+                f.write(body)
+                f.write(b'\nEnd of LogType:%s\n\n' % ltype)
+
+
+def legacy_parse(out):
+    """The parser as it was: whole output in memory, quadratic joins"""
+    logs = {}
+    container = None
+    ltype = 'stdout'
+    started = False
+    for line in out.split('\n'):
+        p = re.compile('Container: ([a-zA-Z0-9_]+) on ([a-zA-Z0-9_]+)')
+        r = p.match(line)
+        if r:
+            container, nodeID = r.groups()
+            logs[container] = dict(nodeId=nodeID, stdout='', stderr='')
+            started = False
+        elif line == 'LogType:stderr':
+            ltype = 'stderr'
+        elif line == 'LogType:stdout':
+            ltype = 'stdout'
+        elif line == "Log Contents:":
+            started = True
+        elif started:
+            logs[container][ltype] = logs[container][ltype] + '\n' + line
+    return logs
+
+
+def time_streaming(path):
+    with open(path, 'rb') as f:
+        n = 0
+        for record in iter_cli_logs(f):
+            n += len(record[3])
+    return n
+
+
+def time_collect(path):
+    with open(path, 'rb') as f:
+        return collect_cli_logs(iter_cli_logs(f))
+
+
+def time_legacy(path):
+    with open(path, 'rb') as f:
+        return legacy_parse(f.read().decode('utf-8'))
+
+
+def main(size_mb):
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        write_cli_output(path, size_mb)
+        tests = [time_streaming, time_collect]
+        if size_mb <= 64:
+            tests.append(time_legacy)
+        for func in tests:
+            t0 = time.time()
+            func(path)
+            t = time.time() - t0
+            print('{0:>15}: {1:7.2f}s {2:8.1f} MB/s'.format(
+                func.__name__, t, size_mb / t))
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+        print('peak RSS: {0} MB'.format(rss))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 64)
@@ -0,0 +1,74 @@
+"""
+Getting a JVM knit Client: starting one per launch, against attaching to a
+running daemon.
+
+Needs the ``hadoop`` command and a built knit JAR, but no cluster; skipped
+otherwise. Run with asv, or directly for a summary:
+
+    $ python benchmarks/bench_launch.py
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import time
+
+from distutils.spawn import find_executable
+
+from knit.core import Knit
+from knit.conf import DEFAULT_KNIT_HOME
+from knit.daemon import ClientDaemon, launch_client
+
+JAR = os.path.join(DEFAULT_KNIT_HOME, Knit.JAR_FILE)
+
+
+def _check():
+    if not find_executable('hadoop') or not os.path.exists(JAR):
+        # asv skips a benchmark whose setup raises this
+        raise NotImplementedError('needs hadoop and the knit JAR')
+
+
+class TimeClient(object):
+    """Time until the Client gateway answers"""
+    timeout = 300
+
+    def setup(self):
+        _check()
+        self.state_dir = tempfile.mkdtemp()
+        self.daemon = ClientDaemon(JAR, state_dir=self.state_dir)
+        # started once, outside of the timing
+        self.daemon.acquire()
+
+    def teardown(self):
+        self.daemon.stop()
+        shutil.rmtree(self.state_dir)
+
+    def time_cold(self):
+        proc, port, token = launch_client(JAR)
+        proc.kill()
+        proc.wait()
+
+    def time_warm(self):
+        client = self.daemon.acquire()
+        client.references()
+        self.daemon.release()
+
+
+def run(bench, method, repeat=3):
+    """Best time of a benchmark method, in seconds"""
+    bench.setup()
+    try:
+        times = []
+        for i in range(repeat):
+            t0 = time.time()
+            getattr(bench, method)()
+            times.append(time.time() - t0)
+        return min(times)
+    finally:
+        bench.teardown()
+
+
+if __name__ == '__main__':
+    for method in ['time_cold', 'time_warm']:
+        print('{0:>20}: {1:8.4f}s'.format(method, run(TimeClient(), method)))
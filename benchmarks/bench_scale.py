@@ -0,0 +1,112 @@
+"""
+YARNAPI calls against synthetic clusters of various sizes.
+
+The stand-in RM/NM serves every node of the cluster from one local server,
+with an optional delay per request to stand for network and RM latency. Run
+with asv, or directly for a summary:
+
+    $ python benchmarks/bench_scale.py
+"""
+from __future__ import print_function
+
+import time
+
+from knit.core import Knit
+from knit.tests.fake_yarn import FakeYARN
+from knit.yarn_api import YARNAPI
+
+
+class TimeClusterQueries(object):
+    """RM listing calls, whose responses grow with the cluster"""
+    params = [10, 1000, 5000]
+    param_names = ['nodes']
+
+    def setup(self, nodes):
+        self.fake = FakeYARN().start()
+        self.fake.populate(nodes=nodes, apps=nodes // 10, containers=2)
+        self.yarn = YARNAPI(self.fake.host, self.fake.port)
+
+    def teardown(self, nodes):
+        self.yarn.close()
+        self.fake.stop()
+
+    def time_nodes(self, nodes):
+        self.yarn.nodes()
+
+    def time_apps_info(self, nodes):
+        self.yarn.apps_info()
+
+    def time_app_containers(self, nodes):
+        self.yarn.app_containers('application_1_0001')
+
+
+class TimeLogs(object):
+    """``logs()`` of a running app, fetched concurrently from its nodes"""
+    params = ([10, 200], [0, 0.01])
+    param_names = ['containers', 'latency']
+    timeout = 120
+
+    def setup(self, containers, latency):
+        self.fake = FakeYARN().start()
+        self.fake.populate(nodes=max(1, containers // 4), apps=1,
+                           containers=containers, log_size=2**14)
+        self.fake.delay = latency
+        # all the stand-in's nodes share one host, and so one pool
+        self.yarn = YARNAPI(self.fake.host, self.fake.port, pool_maxsize=16)
+
+    def teardown(self, containers, latency):
+        self.yarn.close()
+        self.fake.stop()
+
+    def time_logs(self, containers, latency):
+        self.yarn.logs('application_1_0001')
+
+
+class TimePreFlight(object):
+    """Knit's checks of cluster capacity before launching"""
+    params = [10, 1000, 5000]
+    param_names = ['nodes']
+
+    def setup(self, nodes):
+        self.fake = FakeYARN().start()
+        self.fake.populate(nodes=nodes)
+        self.knit = Knit(autodetect=False, rm=self.fake.host,
+                         rm_port=self.fake.port, user='knit',
+                         replication_factor=1)
+
+    def teardown(self, nodes):
+        self.fake.stop()
+
+    def time_pre_flight(self, nodes):
+        self.knit._pre_flight_checks(num_containers=nodes, virtual_cores=1,
+                                     memory=1024, files=[], queue='default')
+
+
+def run(bench, params, method, repeat=5):
+    """Best time of a benchmark method, in seconds"""
+    bench.setup(*params)
+    try:
+        times = []
+        for i in range(repeat):
+            t0 = time.time()
+            getattr(bench, method)(*params)
+            times.append(time.time() - t0)
+        return min(times)
+    finally:
+        bench.teardown(*params)
+
+
+if __name__ == '__main__':
+    for nodes in TimeClusterQueries.params:
+        for method in ['time_nodes', 'time_apps_info', 'time_app_containers']:
+            print('{0:>20} nodes={1:<5}: {2:8.4f}s'.format(
+                method, nodes, run(TimeClusterQueries(), (nodes, ), method)))
+    for containers in TimeLogs.params[0]:
+        for latency in TimeLogs.params[1]:
+            print('{0:>20} containers={1:<4} latency={2}: {3:8.4f}s'.format(
+                'time_logs', containers, latency,
+                run(TimeLogs(), (containers, latency), 'time_logs', 2)))
+    for nodes in TimePreFlight.params:
+        print('{0:>20} nodes={1:<5}: {2:8.4f}s'.format(
+            'time_pre_flight', nodes,
+            run(TimePreFlight(), (nodes, ), 'time_pre_flight')))
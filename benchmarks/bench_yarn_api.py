@@ -0,0 +1,63 @@
+"""
+Throughput of YARNAPI calls against the in-process stand-in RM.
+
+Run directly to compare requests/sec of the pooled session against
+un-pooled module-level ``requests.get`` calls (a new connection per call):
+
+    $ python benchmarks/bench_yarn_api.py
+"""
+from __future__ import print_function
+
+import time
+
+import requests
+
+from knit.tests.fake_yarn import FakeYARN
+from knit.yarn_api import YARNAPI
+
+
+class UnpooledYARNAPI(YARNAPI):
+    """YARNAPI as it was before connection pooling: one connection per call"""
+
+    def _get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return requests.get(url, auth=self.auth, **kwargs)
+
+
+class TimeRESTCalls(object):
+    params = [YARNAPI, UnpooledYARNAPI]
+    param_names = ['client']
+    number = 200
+
+    def setup(self, cls):
+        self.fake = FakeYARN().start()
+        self.fake.add_app('application_1_0001')
+        self.yarn = cls(self.fake.host, self.fake.port)
+
+    def teardown(self, cls):
+        self.yarn.close()
+        self.fake.stop()
+
+    def time_state(self, cls):
+        self.yarn.state('application_1_0001')
+
+    def time_cluster_metrics(self, cls):
+        self.yarn.cluster_metrics()
+
+
+def requests_per_second(cls, n=2000):
+    bench = TimeRESTCalls()
+    bench.setup(cls)
+    try:
+        t0 = time.time()
+        for i in range(n):
+            bench.time_state(cls)
+        return n / (time.time() - t0)
+    finally:
+        bench.teardown(cls)
+
+
+if __name__ == '__main__':
+    for cls in TimeRESTCalls.params:
+        print('{0:>16}: {1:8.0f} req/s'.format(cls.__name__,
+                                                requests_per_second(cls)))
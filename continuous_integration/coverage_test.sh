@@ -1,7 +1,7 @@
 #!/usr/bin/env bash
 
 source activate test
-conda install -y py4j lxml requests pytest-cov python-coveralls coveralls -c conda-forge
+conda install -y py4j numpy lxml requests pytest-cov python-coveralls coveralls -c conda-forge
 cd /knit
 python setup.py install mvn
 py.test --cov=knit knit/tests --cov-report term-missing -s -vv
@@ -1,6 +1,6 @@
 #!/usr/bin/env bash
 source activate test
-conda install -c conda-forge -y py4j hdfs3
+conda install -c conda-forge -y py4j numpy hdfs3
 cd /knit
 python setup.py install mvn
 if [ "$TEST_DASK" = "true"]; then
@@ -8,6 +8,7 @@ from tornado import gen
 from toolz import unique
 
 from knit import Knit, CondaCreator, zip_path
+from knit.utils import run_in_thread
 from distributed import LocalCluster
 
 global_packages = ['dask>=0.14', 'distributed>=1.16']
@@ -54,6 +55,8 @@ class DaskYARNCluster(object):
         ip = ip or socket.gethostbyname(socket.gethostname())
 
         self.env = env
+        # (future, name) of an env being built or zipped
+        self._env_build = None
         self.application_master_container = None
         self.app_id = None
         self.channels = channels or []
@@ -91,36 +94,48 @@ class DaskYARNCluster(object):
             How many CPU cores is available in each container
         memory: int=2048
             Memory available to each dask worker (in MB)
-        checks: bool=True
-            Whether to run pre-flight checks before submitting app to YARN
+        checks: bool or 'strict' (default True)
+            Whether to run pre-flight checks before submitting app to YARN;
+            see ``Knit.start()``
         kwargs: passed to ``Knit.start()``
         
         Returns
         -------
         YARN application ID.
         """
-        if self.env is None:
+        # an env to build or zip is made in the background, while Knit starts
+        # its client and schedules the app; it is uploaded once ready
+        env = self.env
+        if self._env_build is not None and not (
+                self._env_build[0].done() and
+                self._env_build[0].exception() is not None):
+            # from an earlier start which failed: still being made, or made
+            env, bn = self._env_build
+        elif self.env is None:
             c = CondaCreator(channels=self.channels, **(self.conda_pars or {}))
             env_name = 'dask-' + sha1(
                 '-'.join(self.packages + self.channels).encode()).hexdigest()
             env_path = os.path.join(c.conda_envs, env_name)
             if os.path.exists(env_path + '.zip'):
                 # zipfile exists, ready to upload
-                self.env = env_path + '.zip'
+                self.env = env = env_path + '.zip'
             elif os.path.exists(env_path):
                 # environment exists, can zip and upload
-                self.env = zip_path(env_path)
+                env = run_in_thread(zip_path, env_path)
             else:
                 # create env from scratch
-                self.env = c.create_env(env_name=env_name,
-                                        packages=self.packages)
+                env = run_in_thread(c.create_env, env_name=env_name,
+                                    packages=self.packages)
+            bn = env_name + '.zip'
         elif (not self.env.endswith('.zip') and
               not self.env.startswith('hdfs://')):
             # given env directory, so zip it
-            self.env = zip_path(self.env)
+            env = run_in_thread(zip_path, self.env)
+            bn = os.path.basename(self.env) + '.zip'
+        else:
+            bn = os.path.basename(self.env)
 
         # TODO: memory should not be total available?
-        bn = os.path.basename(self.env)
         pathsep = '/'  # assume execution is always on posix
         pref = pathsep.join([bn, os.path.splitext(bn)[0]])  # like myenv.zip/myenv
         command = ('{pref}/bin/python {pref}/bin/dask-worker --nprocs=1 '
@@ -128,13 +143,32 @@ class DaskYARNCluster(object):
                    ''.format(cpus=cpus, mem=memory * 1e6, pref=pref,
                              addr=self.local_cluster.scheduler.address))
 
-        files = [self.env] + kwargs.pop('files', [])
+        if env is not self.env:
+            # reused if this start fails, rather than made again
+            self._env_build = env, bn
+        files = [env] + kwargs.pop('files', [])
         app_id = self.knit.start(command, files=files,
                                  num_containers=n_workers, virtual_cores=cpus,
                                  memory=memory, checks=checks, **kwargs)
+        if env is not self.env:
+            self.env = env.result()
+            self._env_build = None
         self.app_id = app_id
         return app_id
 
+    def start_async(self, n_workers=1, cpus=1, memory=2048, checks=True,
+                    **kwargs):
+        """
+        Like ``start``, but runs in a background thread, returning at once
+
+        Returns
+        -------
+        concurrent.futures.Future, resolving to the YARN application ID. See
+        ``Knit.start_async``.
+        """
+        return run_in_thread(self.start, n_workers=n_workers, cpus=cpus,
+                             memory=memory, checks=checks, **kwargs)
+
     def remove_worker(self, container_id):
         """
         Stop worker and remove container
@@ -0,0 +1,498 @@
+"""
+Reading YARN's aggregated application logs directly from the filesystem.
+
+Once an application finishes, each NodeManager writes the logs of the app's
+containers on that node into one file, ``<remote-app-log-dir>/<user>/
+<suffix>/<app-id>/<node-id>``. The file is a Hadoop TFile: a sequence of
+(possibly compressed) data blocks of key/value records, with an index at the
+end. Each record's key is a container ID, and its value holds all of that
+container's logs, each as (log type, length, bytes).
+
+Only the parts of the file needed are read: the index, the record headers,
+and the bytes of the logs asked for. With uncompressed blocks (YARN's
+default), skipping over other logs costs a seek rather than a read.
+
+Hadoop 3 can instead aggregate into the IndexedFile format
+(``yarn.log-aggregation.file-formats`` set to ``IFile``), whose index is a
+serialized Java object; such files are recognized, and refused with an
+error saying so. Read those logs with the yarn CLI instead.
+"""
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import os
+import struct
+import zlib
+
+# ends every TFile (BCFile magic)
+MAGIC = bytes(bytearray([0xd1, 0x11, 0xd3, 0x68, 0x91, 0xb5, 0xd7, 0xb6,
+                         0x39, 0xdf, 0x41, 0x40, 0x92, 0xba, 0xe1, 0x50]))
+# meta-index offset (8), version (4), magic (16)
+TRAILER_SIZE = 28
+
+# an IndexedFile starts with the SHA-256 of its app ID
+UUID_SIZE = 32
+
+# records which are not container logs
+SPECIAL_KEYS = ('VERSION', 'APPLICATION_ACL', 'APPLICATION_OWNER')
+
+
+def read_vlong(stream):
+    """Decode a Hadoop TFile variable-length integer
+
+    (``org.apache.hadoop.io.file.tfile.Utils.readVLong``; not the same
+    encoding as ``WritableUtils``)
+    """
+    first = struct.unpack('>b', _read_exactly(stream, 1))[0]
+    if first >= -32:
+        return first
+    kind = (first + 128) // 8
+    if kind >= 7:
+        return ((first + 52) << 8) | _unpack('>B', stream)
+    if kind >= 3:
+        return ((first + 88) << 16) | _unpack('>H', stream)
+    if kind >= 1:
+        return (((first + 112) << 24) | (_unpack('>H', stream) << 8) |
+                _unpack('>B', stream))
+    size = first + 129
+    if size == 4:
+        return _unpack('>i', stream)
+    if size == 5:
+        return (_unpack('>i', stream) << 8) | _unpack('>B', stream)
+    if size == 6:
+        return (_unpack('>i', stream) << 16) | _unpack('>H', stream)
+    if size == 7:
+        return ((_unpack('>i', stream) << 24) | (_unpack('>H', stream) << 8) |
+                _unpack('>B', stream))
+    if size == 8:
+        return _unpack('>q', stream)
+    raise IOError('Corrupted VLong encoding')
+
+
+def _read_exactly(stream, n):
+    data = stream.read(n)
+    if len(data) != n:
+        raise IOError('Unexpected end of aggregated log data')
+    return data
+
+
+def _unpack(fmt, stream):
+    return struct.unpack(fmt, _read_exactly(stream, struct.calcsize(fmt)))[0]
+
+
+def _read_string(stream):
+    """TFile ``Utils.readString``: VInt length, UTF-8 bytes"""
+    n = read_vlong(stream)
+    if n < 0:
+        return None
+    return _read_exactly(stream, n).decode('utf-8')
+
+
+def _read_utf(stream):
+    """Java ``DataInput.readUTF``: unsigned short length, (modified) UTF-8"""
+    n = _unpack('>H', stream)
+    return _read_exactly(stream, n).decode('utf-8', 'replace')
+
+
+class _Region(object):
+    """Reads a raw (uncompressed) block of the file; skipping is free"""
+
+    def __init__(self, f, offset, size):
+        self.f = f
+        self.start = self.pos = offset
+        self.end = offset + size
+
+    def read(self, n):
+        n = min(n, self.end - self.pos)
+        self.f.seek(self.pos)
+        data = self.f.read(n)
+        self.pos += len(data)
+        return data
+
+    def skip(self, n):
+        if self.pos + n > self.end:
+            raise IOError('Unexpected end of aggregated log data')
+        self.pos += n
+
+    def tell(self):
+        return self.pos - self.start
+
+
+class _ZlibRegion(object):
+    """Reads a zlib-compressed ("gz") block of the file, decompressing
+    only as far as needed"""
+    blocksize = 2**16
+
+    def __init__(self, f, offset, size):
+        self.f = f
+        self.cpos = offset
+        self.cend = offset + size
+        self.decomp = zlib.decompressobj()
+        self.buf = b''
+        self.bufpos = 0
+        self.pos = 0
+
+    def _fill(self, n):
+        parts = [self.buf[self.bufpos:]]
+        have = len(parts[0])
+        while have < n and self.cpos < self.cend:
+            self.f.seek(self.cpos)
+            data = self.f.read(min(self.blocksize, self.cend - self.cpos))
+            if not data:
+                break
+            self.cpos += len(data)
+            out = self.decomp.decompress(data)
+            if self.cpos >= self.cend:
+                out += self.decomp.flush()
+            parts.append(out)
+            have += len(out)
+        self.buf = b''.join(parts)
+        self.bufpos = 0
+
+    def read(self, n):
+        if len(self.buf) - self.bufpos < n:
+            self._fill(n)
+        data = self.buf[self.bufpos:self.bufpos + n]
+        self.bufpos += len(data)
+        self.pos += len(data)
+        return data
+
+    def skip(self, n):
+        while n:
+            data = self.read(min(n, 2**20))
+            if not data:
+                raise IOError('Unexpected end of aggregated log data')
+            n -= len(data)
+
+    def tell(self):
+        return self.pos
+
+
+class _Chunked(object):
+    """The value of a TFile record: chunks, each preceded by its length as a
+    VInt, negative for all but the last chunk"""
+
+    def __init__(self, region):
+        self.region = region
+        self.remaining = 0
+        self.last = False
+        self.consumed = 0
+
+    def _next(self):
+        while self.remaining == 0 and not self.last:
+            n = read_vlong(self.region)
+            self.last = n >= 0
+            self.remaining = abs(n)
+
+    def eof(self):
+        self._next()
+        return self.remaining == 0
+
+    def _take(self, n, func):
+        while n:
+            self._next()
+            if self.remaining == 0:
+                raise IOError('Unexpected end of aggregated log record')
+            k = min(n, self.remaining)
+            func(k)
+            self.remaining -= k
+            self.consumed += k
+            n -= k
+
+    def read(self, n):
+        out = []
+        self._take(n, lambda k: out.append(_read_exactly(self.region, k)))
+        return b''.join(out)
+
+    def skip(self, n):
+        self._take(n, self.region.skip)
+
+    def close(self):
+        while not self.eof():
+            self.region.skip(self.remaining)
+            self.remaining = 0
+
+
+class AggregatedLog(object):
+    """The aggregated logs of one application on one node
+
+    Parameters
+    ----------
+    f: binary file-like
+        Open aggregated log file, supporting ``seek`` and ``read``, e.g.,
+        from ``open(path, 'rb')`` or ``HDFileSystem.open(path, 'rb')``
+    node_id: str or None
+        Node to report for this file's containers
+
+    Examples
+    --------
+    >>> with open(path, 'rb') as f:  # doctest: +SKIP
+    ...     log = AggregatedLog(f)
+    ...     log.containers()
+    ['container_1452274436693_0001_01_000001', ...]
+    >>> log.read('container_1452274436693_0001_01_000001', 'stderr')
+    b'...'
+    """
+
+    def __init__(self, f, node_id=None):
+        self.f = f
+        self.node_id = node_id
+        metas = self._read_meta_index()
+        if 'BCFile.index' not in metas:
+            raise IOError('Aggregated log has no data index')
+        index = self._open(*metas['BCFile.index'])
+        self.compression = _read_string(index)
+        self.blocks = [[read_vlong(index) for _ in range(3)]
+                       for _ in range(read_vlong(index))]
+        self.last_keys = self._read_last_keys(metas)
+        self._positions = None
+
+    def _read_meta_index(self):
+        """Name -> (compression, region) of the meta blocks"""
+        f = self.f
+        f.seek(0, 2)
+        size = f.tell()
+        if size < TRAILER_SIZE:
+            raise IOError('Not an aggregated log file: too short')
+        f.seek(size - TRAILER_SIZE)
+        trailer = _read_exactly(f, TRAILER_SIZE)
+        if trailer[-16:] != MAGIC:
+            raise IOError('Not a TFile aggregated log')
+        meta_offset = struct.unpack('>q', trailer[:8])[0]
+        f.seek(meta_offset)
+        metas = {}
+        for _ in range(read_vlong(f)):
+            name = _read_string(f)
+            if name.startswith('data:'):
+                name = name[5:]
+            compression = _read_string(f)
+            region = [read_vlong(f) for _ in range(3)]
+            metas[name] = (compression, region)
+        return metas
+
+    def _read_last_keys(self, metas):
+        """Container ID -> number of the block it ends, from the TFile index
+
+        A container whose logs are large enough to close a block can so be
+        found without scanning the file.
+        """
+        if 'TFile.index' not in metas:
+            return {}
+        last_keys = {}
+        try:
+            index = self._open(*metas['TFile.index'])
+            size = read_vlong(index)
+            if size <= 0:
+                return {}
+            _read_exactly(index, size)  # first key
+            for i in range(len(self.blocks)):
+                read_vlong(index)  # size of entry
+                key = _read_exactly(index, read_vlong(index))
+                read_vlong(index)  # number of records in block
+                last_keys[key[2:].decode('utf-8', 'replace')] = i
+        except IOError:
+            pass
+        return last_keys
+
+    def _open(self, compression, region):
+        offset, size, raw_size = region
+        if compression == 'none':
+            return _Region(self.f, offset, size)
+        if compression == 'gz':
+            return _ZlibRegion(self.f, offset, size)
+        raise ValueError('Unsupported aggregated log compression: %s'
+                         % compression)
+
+    def _records(self, blocks=None):
+        """Yield (key, block number, position of value, value) for each
+        record of all (or the given) blocks; the value is skipped if the
+        caller does not read it"""
+        for i in range(len(self.blocks)) if blocks is None else blocks:
+            region = self.blocks[i]
+            block = self._open(self.compression, region)
+            raw_size = region[2]
+            while block.tell() < raw_size:
+                key = _read_exactly(block, read_vlong(block))
+                # LogKey: written by DataOutput.writeUTF
+                key = key[2:].decode('utf-8', 'replace')
+                value = _Chunked(block)
+                yield key, i, block.tell(), value
+                value.close()
+
+    @property
+    def positions(self):
+        """Container ID -> (block number, position in block) of its logs"""
+        if self._positions is None:
+            self._positions = {key: (i, pos)
+                               for key, i, pos, _ in self._records()
+                               if key not in SPECIAL_KEYS}
+        return self._positions
+
+    def containers(self):
+        """IDs of the containers with logs in this file, sorted"""
+        return sorted(self.positions)
+
+    def _locate(self, container_id):
+        if self._positions is None and container_id in self.last_keys:
+            for key, i, pos, _ in self._records(
+                    [self.last_keys[container_id]]):
+                if key == container_id:
+                    return i, pos
+        if container_id not in self.positions:
+            raise KeyError('No logs for container %s' % container_id)
+        return self.positions[container_id]
+
+    def _value(self, container_id):
+        i, pos = self._locate(container_id)
+        block = self._open(self.compression, self.blocks[i])
+        block.skip(pos)
+        return _Chunked(block)
+
+    def _iter_files(self, value):
+        """Yield (log type, length) of each log in a container's value; the
+        caller reads the bytes or they are skipped"""
+        while not value.eof():
+            ltype = _read_utf(value)
+            length = int(_read_utf(value))
+            start = value.consumed
+            yield ltype, length
+            if value.consumed == start:
+                # not read by the caller
+                value.skip(length)
+
+    def log_types(self, container_id):
+        """Log type -> length in bytes, for the given container"""
+        return dict(self._iter_files(self._value(container_id)))
+
+    def read(self, container_id, log_type):
+        """Contents of one log of one container, as bytes
+
+        Other logs stored before it are skipped over, not read.
+        """
+        value = self._value(container_id)
+        for ltype, length in self._iter_files(value):
+            if ltype == log_type:
+                return value.read(length)
+        raise KeyError('No %s log for container %s'
+                       % (log_type, container_id))
+
+    def iter_logs(self, containers=None, log_types=None):
+        """Yield (container ID, log type, bytes) for all (or the given)
+        containers and log types
+
+        Given containers are looked for first in the blocks the index says
+        they end, and the reading stops once all have been found.
+        """
+        if containers is None:
+            for key, _, _, value in self._records():
+                if key not in SPECIAL_KEYS:
+                    for item in self._read_files(key, value, log_types):
+                        yield item
+            return
+        remaining = set(containers)
+        known = sorted(set(self.last_keys[c] for c in remaining
+                           if c in self.last_keys))
+        order = known + [i for i in range(len(self.blocks))
+                         if i not in known]
+        for key, _, _, value in self._records(order):
+            if key in remaining:
+                remaining.discard(key)
+                for item in self._read_files(key, value, log_types):
+                    yield item
+                if not remaining:
+                    return
+
+    def _read_files(self, key, value, log_types):
+        for ltype, length in self._iter_files(value):
+            if log_types is None or ltype in log_types:
+                yield key, ltype, value.read(length)
+
+
+def app_log_dir(app_id, user, root='/tmp/logs', suffix='logs'):
+    """Directory of an app's aggregated logs, as configured by
+    ``yarn.nodemanager.remote-app-log-dir`` (root) and
+    ``yarn.nodemanager.remote-app-log-dir-suffix`` (suffix)"""
+    return '/'.join([root.rstrip('/'), user, suffix, app_id])
+
+
+def _aggregated_log(f, app_id, node_id=None):
+    """AggregatedLog of an open file of the given app, failing clearly on
+    the IndexedFile format"""
+    try:
+        return AggregatedLog(f, node_id)
+    except IOError:
+        f.seek(0)
+        if f.read(UUID_SIZE) == hashlib.sha256(
+                app_id.encode('utf-8')).digest():
+            raise IOError('The aggregated logs of %s are in the IndexedFile'
+                          ' format (IFile), which cannot be read directly;'
+                          ' use the yarn CLI (YARNAPI.logs with shell=True)'
+                          % app_id)
+        raise
+
+
+def read_app_logs(path, fs=None, containers=None, log_types=None):
+    """Logs of an app from its directory of aggregated log files
+
+    Parameters
+    ----------
+    path: str
+        The app's log directory, see ``app_log_dir``
+    fs: HDFileSystem or None
+        Filesystem to read from, with ``ls`` and ``open`` methods like
+        hdfs3's; if None, the local filesystem.
+    containers: list of str or None
+        Only these containers' logs
+    log_types: list of str or None
+        Only these log types, e.g., ``['stderr']``
+
+    Returns
+    -------
+    dict of container ID -> {'nodeId': .., <log type>: text}, as
+    ``YARNAPI.logs``.
+
+    When containers are given, the index of each file is read first, and
+    the files whose index names them are read before the others; reading
+    stops once all have been found.
+
+    Only TFile logs can be read; for logs in the IndexedFile format, IOError
+    is raised.
+    """
+    app_id = os.path.basename(path.rstrip('/'))
+    if fs is None:
+        files = [os.path.join(path, fn) for fn in sorted(os.listdir(path))]
+        opener = open
+    else:
+        files = sorted(fs.ls(path))
+        opener = fs.open
+    # files still being written by the NodeManager end in .tmp
+    files = [fn for fn in files if not fn.endswith('.tmp')]
+    if not files:
+        raise IOError('No aggregated logs in %s' % path)
+    if containers is not None:
+        remaining = set(containers)
+        located = []
+        for fn in files:
+            with opener(fn, 'rb') as f:
+                if remaining & set(_aggregated_log(f, app_id).last_keys):
+                    located.append(fn)
+        files = located + [fn for fn in files if fn not in located]
+    logs = {}
+    for fn in files:
+        if containers is not None:
+            if not remaining:
+                break
+            wanted = list(remaining)
+        else:
+            wanted = None
+        # node ID, with ':' replaced
+        node = os.path.basename(fn.rstrip('/'))
+        node = '{0}:{1}'.format(*node.rsplit('_', 1)) if '_' in node else node
+        with opener(fn, 'rb') as f:
+            log = _aggregated_log(f, app_id, node)
+            for container, ltype, data in log.iter_logs(wanted, log_types):
+                out = logs.setdefault(container, {'nodeId': node})
+                out[ltype] = data.decode('utf-8', 'replace')
+                if containers is not None:
+                    remaining.discard(container)
+    return logs
@@ -0,0 +1,340 @@
+"""
+asyncio REST interface to YARN.
+
+Requires python >= 3.5 and aiohttp.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from subprocess import STDOUT, SubprocessError
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from .exceptions import YARNException
+from .utils import get_log_content, shell_out
+from .yarn_api import (ACTIVE_STATES, YARNBase, cli_log_records,
+                       collect_cli_logs, container_parents)
+
+logger = logging.getLogger(__name__)
+
+
+class KerberosAuth(object):
+    """SPNEGO ``Authorization`` header for each host, sent with the first
+    request, from the requests_kerberos handler that ``YARNAPI`` uses"""
+
+    def __init__(self, auth):
+        self.auth = auth
+        # the handler keeps one security context per host
+        self._lock = threading.Lock()
+
+    def __call__(self, host):
+        with self._lock:
+            return {'Authorization': self.auth.generate_request_header(
+                None, host, is_preemptive=True)}
+
+
+class AsyncYARNAPI(YARNBase):
+    """Non-blocking REST interface to YARN
+
+    Offers the same calls as ``YARNAPI``, as coroutines, so that many
+    applications can be monitored or killed from a single event loop
+    without one slow RM response stalling the others. The yarn CLI
+    fallbacks run in the loop's executor.
+
+    Parameters
+    ----------
+    rm, rm_port, scheme, gateway_path, kerberos, username, password:
+        As for ``YARNAPI``
+    limit: int
+        Maximum number of simultaneous connections in flight
+    limit_per_host: int
+        Maximum number of simultaneous connections to any one host (RM or
+        NodeManager); 0 for no limit beyond ``limit``.
+
+    Examples
+    --------
+    >>> async def main():  # doctest: +SKIP
+    ...     async with AsyncYARNAPI('localhost', 8088) as yarn:
+    ...         states = await asyncio.gather(*[yarn.state(a) for a in ids])
+    """
+
+    def __init__(self, rm, rm_port, scheme='http', gateway_path='',
+                 kerberos=False, username=None, password=None, limit=500,
+                 limit_per_host=0):
+        super().__init__(rm, rm_port, scheme=scheme,
+                         gateway_path=gateway_path, kerberos=kerberos,
+                         username=username, password=password)
+        if kerberos:
+            self.auth = KerberosAuth(self._kerberos_auth())
+        elif username and password:
+            self.auth = aiohttp.BasicAuth(username, password)
+        else:
+            self.auth = None
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._session = None
+        # whether the RM reports containers of an attempt (unknown: None)
+        self._rm_container_reports = None
+        self._node_list = None
+
+    @property
+    def session(self):
+        # created on first use, so that it binds to the running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        """Release pooled connections"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _get_text(self, url, params=None):
+        status, text = await self._fetch(url, params)
+        if status >= 400:
+            raise self._error(text)
+        return text
+
+    async def _fetch(self, url, params=None, method='GET', body=None):
+        """HTTP status and body of a request; GET by default, else with
+        ``body`` sent as JSON"""
+        # no total: time queued for a connection (see ``limit``) must not
+        # count against a request
+        kwargs = {'timeout': aiohttp.ClientTimeout(
+                      total=None, sock_connect=self.timeout,
+                      sock_read=self.timeout),
+                  'params': params}
+        if body is not None:
+            kwargs['json'] = body
+        if isinstance(self.auth, KerberosAuth):
+            # GSSAPI calls block, and may go to the KDC
+            kwargs['headers'] = await asyncio.get_event_loop(
+                ).run_in_executor(None, self.auth, urlsplit(url).hostname)
+        elif self.auth is not None:
+            kwargs['auth'] = self.auth
+        async with self.session.request(method, url, **kwargs) as r:
+            return r.status, await r.text()
+
+    async def _shell_out(self, cmd, **kwargs):
+        return await asyncio.get_event_loop().run_in_executor(
+            None, lambda: shell_out(cmd, **kwargs))
+
+    async def _get_json(self, url, params=None):
+        return json.loads(await self._get_text(url, params))
+
+    async def apps(self):
+        """App IDs known to YARN"""
+        return [d['id'] for d in await self.apps_info()]
+
+    async def apps_info(self, app_id=None, name=None, **filters):
+        """List app apps, or info for given app; the same filters as
+        ``YARNAPI.apps_info`` apply"""
+        if app_id is None:
+            filters['name'] = name
+            data = await self._get_json(self.url + 'cluster/apps/',
+                                        self._query_params(filters))
+            apps = (data.get('apps', None) or {'app': []})['app']
+            if name is not None:
+                apps = [a for a in apps if a['name'] == name]
+            return apps
+        data = await self._get_json(self.url + 'cluster/apps/{}'.format(
+            app_id))
+        return data['app']
+
+    async def status(self, app_id):
+        """Get status of an application"""
+        return await self.apps_info(app_id)
+
+    async def app_attempts(self, app_id):
+        """List of attempt details for given app"""
+        data = await self._get_json(
+            self.url + 'cluster/apps/{}/appattempts'.format(app_id))
+        return data.get('appAttempts', {'app_attempt': []})['appAttempt']
+
+    async def state(self, app_id):
+        """Current state of given application"""
+        data = await self._get_json(
+            self.url + 'cluster/apps/{}/state'.format(app_id))
+        return data['state']
+
+    async def app_containers(self, app_id=None, info=None):
+        """List of container information for given app, on all nodes; see
+        ``YARNAPI.app_containers``"""
+        if (app_id is None) == (info is None):
+            raise TypeError('Must provide app_id or info')
+        app_id = app_id or info['id']
+        if self._rm_container_reports is not False:
+            attempts = await self.app_attempts(app_id)
+            if not attempts:
+                # not yet scheduled
+                return []
+            attempt_id = self._attempt_id(app_id, attempts[-1])
+            status, text = await self._fetch(
+                self.url + 'cluster/apps/{0}/appattempts/{1}/containers'
+                ''.format(app_id, attempt_id))
+            if status < 400:
+                self._rm_container_reports = True
+                return [self._from_report(c)
+                        for c in json.loads(text).get('container') or []]
+            if not self._reports_missing(status, text, app_id, attempt_id):
+                raise self._error(text)
+            self._rm_container_reports = False
+
+        per_node = await asyncio.gather(
+            *[self._node_app_containers(addr, app_id)
+              for addr in await self._node_addresses()])
+        return [c for containers in per_node for c in containers]
+
+    async def _node_addresses(self):
+        """HTTP addresses of running NodeManagers, cached for a time"""
+        if self._node_list is None or self._node_list[0] < time.time():
+            addresses = [n['nodeHTTPAddress'] for n in await self.nodes()
+                         if n.get('state', 'RUNNING') == 'RUNNING']
+            self._node_list = (time.time() + self.node_list_ttl, addresses)
+        return self._node_list[1]
+
+    async def _node_app_containers(self, address, app_id):
+        """Containers of the app on one NodeManager"""
+        url = "http://{0}/ws/v1/node/containers".format(address)
+        try:
+            data = (await self._get_json(url))['containers']
+        except Exception:
+            logger.debug("Failed to list containers on %s", address,
+                         exc_info=1)
+            return []
+        if not data:
+            return []
+        return self._containers_of_app(app_id, data)
+
+    async def _container_logs(self, c, semaphore):
+        """Fetch stdout/stderr of one container, holding the node's
+        semaphore; failures are recorded under ``errors``, as in
+        ``YARNAPI.logs``"""
+        log = dict(nodeId=c['nodeId'])
+        async with semaphore:
+            for ltype in ['stdout', 'stderr']:
+                url = "{0}/{1}/?start=0".format(c['containerLogsLink'], ltype)
+                try:
+                    log[ltype] = get_log_content(await self._get_text(url))
+                except Exception as e:
+                    log[ltype] = ''
+                    log.setdefault('errors', {})[ltype] = str(e)
+        return log
+
+    async def logs(self, app_id, shell=False, retries=4, delay=3,
+                   per_node=4):
+        """Collect logs from RM (if running), or from the yarn CLI after
+        completion; see ``YARNAPI.logs``. Container logs are fetched
+        concurrently, at most ``per_node`` at a time from any NodeManager;
+        the CLI output is parsed as it streams, in a thread."""
+        running = await self.state(app_id) == 'RUNNING'
+        if not shell and running:
+            try:
+                containers = await self.app_containers(app_id)
+                semaphores = {c['nodeId']: asyncio.Semaphore(per_node)
+                              for c in containers}
+                logs = await asyncio.gather(
+                    *[self._container_logs(c, semaphores[c['nodeId']])
+                      for c in containers])
+                return {c['id']: log for c, log in zip(containers, logs)}
+            except Exception:
+                logger.warning("Error while attempting to fetch logs,"
+                               " using fallback", exc_info=1)
+
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                return await loop.run_in_executor(
+                    None, lambda: collect_cli_logs(cli_log_records(app_id)))
+            except SubprocessError:
+                retries -= 1
+                if retries < 0:
+                    raise RuntimeError('Retries exceeded when fetching logs for'
+                                       ' ' + app_id)
+                await asyncio.sleep(delay)
+
+    async def kill(self, app_id):
+        """Kill a yarn application, by REST or else the yarn CLI; see
+        ``YARNAPI.kill``"""
+        url = self.url + 'cluster/apps/{}/state'.format(app_id)
+        params = {'user.name': self.username} if self.username else None
+        try:
+            status, text = await self._fetch(url, params, method='PUT',
+                                             body={'state': 'KILLED'})
+            if status < 400:
+                return True
+            logger.debug("Kill by REST failed, using CLI fallback: %s",
+                         self._error(text))
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            logger.debug("Kill by REST failed, using CLI fallback",
+                         exc_info=1)
+        try:
+            out = await self._shell_out(
+                ["yarn", "application", "-kill", app_id], stderr=STDOUT)
+            return "Killed application" in out
+        except (SubprocessError, OSError):
+            return False
+
+    async def kill_all(self, knit_only=True):
+        """Kill the active apps, all at once; see ``YARNAPI.kill_all``
+
+        Returns
+        -------
+        dict of app ID -> whether killing succeeded
+        """
+        apps = await self.apps_info(states=ACTIVE_STATES,
+                                    name='knit' if knit_only else None)
+        app_ids = [a['id'] for a in apps if a['state'] in ACTIVE_STATES]
+        results = await asyncio.gather(*[self.kill(a) for a in app_ids])
+        return dict(zip(app_ids, results))
+
+    async def container_info(self, container_id):
+        """Report on the given container, as a dictionary, from REST or
+        else the yarn CLI; see ``YARNAPI.container_info``"""
+        app_id, attempt_id = container_parents(container_id)
+        url = self.url + 'cluster/apps/{0}/appattempts/{1}/containers/{2}'
+        try:
+            return (await self._get_json(url.format(
+                app_id, attempt_id, container_id)))['container']
+        except (aiohttp.ClientError, asyncio.TimeoutError, YARNException,
+                ValueError, KeyError):
+            logger.debug("Container report not available from REST, using"
+                         " CLI fallback", exc_info=1)
+        return self._parse_container_status(await self._shell_out(
+            ["yarn", "container", "-status", container_id]))
+
+    async def cluster_info(self):
+        """YARN cluster information: driver, version..."""
+        return (await self._get_json(self.url + 'cluster'))['clusterInfo']
+
+    async def cluster_metrics(self):
+        """YARN cluster global capacity/allocations"""
+        data = await self._get_json(self.url + 'cluster/metrics')
+        return data['clusterMetrics']
+
+    async def scheduler(self):
+        """State of the scheduler/queue"""
+        data = await self._get_json(self.url + 'cluster/scheduler')
+        return data['scheduler']
+
+    async def app_stats(self):
+        """Number of apps of various states"""
+        data = await self._get_json(self.url + 'cluster/appstatistics')
+        return data['appStatInfo']
+
+    async def nodes(self):
+        """Info on YARN's worker nodes"""
+        data = await self._get_json(self.url + 'cluster/nodes')
+        return data['nodes']['node']
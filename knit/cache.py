@@ -0,0 +1,157 @@
+"""
+Time-limited caching of REST query results.
+"""
+from __future__ import absolute_import, division, print_function
+
+from collections import OrderedDict
+import functools
+import threading
+import time
+
+# endpoints cached when a single TTL is given for a whole YARNAPI
+CLUSTER_ENDPOINTS = ('cluster_info', 'cluster_metrics', 'nodes', 'scheduler',
+                     'app_stats')
+
+
+class _Call(object):
+    """A request in flight, which concurrent identical requests wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TTLCache(object):
+    """Memo of query results, each endpoint with its own time-to-live
+
+    Concurrent identical requests for a missing or expired entry are
+    coalesced: one caller makes the request, the others wait for its result.
+    Results are shared between callers, and so should not be mutated.
+
+    One instance may be shared by several ``YARNAPI`` objects, so that, for
+    example, many ``Knit`` instances launched together query the RM once.
+
+    Parameters
+    ----------
+    ttls: dict or number
+        Endpoint name -> seconds; endpoints not listed are not cached. A
+        single number applies to ``CLUSTER_ENDPOINTS``.
+    max_entries: int
+        Most results kept; the oldest are dropped first. Expired results
+        are also dropped as they are found, and by a sweep of all entries
+        at most once per shortest TTL.
+
+    Attributes
+    ----------
+    stats: dict
+        Counts of ``hits``, ``misses`` (requests made) and ``coalesced``
+        (requests that waited on an identical one in flight)
+    """
+
+    def __init__(self, ttls, max_entries=1000):
+        if not isinstance(ttls, dict):
+            ttls = {endpoint: ttls for endpoint in CLUSTER_ENDPOINTS}
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+        # key -> (expiry time, result), oldest first
+        self._data = OrderedDict()
+        self._next_sweep = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint, key, func, fresh=False):
+        """Cached result of ``func()``, calling it if needed
+
+        Parameters
+        ----------
+        endpoint: str
+            Name used to look up the TTL and to invalidate
+        key: hashable
+            Distinguishes calls to the same endpoint
+        func: callable
+            Makes the request
+        fresh: bool
+            Ignore a stored result, and store the new one
+        """
+        ttl = self.ttls.get(endpoint)
+        if not ttl:
+            return func()
+        full_key = (endpoint, key)
+        with self._lock:
+            entry = self._data.get(full_key)
+            if entry is not None:
+                if entry[0] > time.time() and not fresh:
+                    self.stats['hits'] += 1
+                    return entry[1]
+                del self._data[full_key]
+            call = self._inflight.get(full_key)
+            owner = call is None
+            if owner:
+                call = self._inflight[full_key] = _Call()
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+        if not owner:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[full_key]
+                if call.error is None:
+                    self._store(full_key, ttl, call.result)
+            call.event.set()
+        return call.result
+
+    def _store(self, full_key, ttl, result):
+        # called with the lock held
+        now = time.time()
+        self._data.pop(full_key, None)
+        self._data[full_key] = (now + ttl, result)
+        if now >= self._next_sweep:
+            for k in [k for k, v in self._data.items() if v[0] <= now]:
+                del self._data[k]
+            self._next_sweep = now + min(t for t in self.ttls.values() if t)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def invalidate(self, endpoint=None):
+        """Drop cached results, of the given endpoint or of all"""
+        with self._lock:
+            if endpoint is None:
+                self._data.clear()
+            else:
+                for k in [k for k in self._data if k[0] == endpoint]:
+                    del self._data[k]
+
+
+def cached(method):
+    """Decorate a ``YARNAPI`` method to go through its ``cache``, if any
+
+    The method's name is the endpoint name for the cache's TTLs. The
+    decorated method takes ``fresh=True`` to skip a cached result, for
+    loops waiting on a change; the new result is still cached.
+    """
+    endpoint = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        fresh = kwargs.pop('fresh', False)
+        if self.cache is None:
+            return method(self, *args, **kwargs)
+        key = repr((self.url, args, sorted(kwargs.items())))
+        return self.cache.get(endpoint, key,
+                              lambda: method(self, *args, **kwargs),
+                              fresh=fresh)
+    return wrapper
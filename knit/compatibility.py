@@ -10,6 +10,14 @@ else:
     PermissionError = PermissionError
     FileNotFoundError = FileNotFoundError
 
+try:
+    from html import escape, unescape
+except ImportError:  # pragma: no cover
+    # py2
+    from cgi import escape
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
+
     
 try:
     from subprocess import check_output
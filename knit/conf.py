@@ -62,6 +62,9 @@ DEFAULTS = {'rm': 'localhost',
 
 def get_host_port(addr):
     """Infer a host & port from a given addr"""
+    if '//' not in addr:
+        # "host:port" would otherwise parse as scheme "host"
+        addr = '//' + addr
     parsed = urlsplit(addr)
     if parsed.hostname:
         host = parsed.hostname
@@ -97,11 +100,35 @@ def infer_extra_params(config):
     else:
         rm_port_https = DEFAULTS['rm_port_https']
 
-    return {'user': user,
-            'replication_factor': replication_factor,
-            'rm': rm,
-            'rm_port': rm_port,
-            'rm_port_https': rm_port_https}
+    out = {'user': user,
+           'replication_factor': replication_factor,
+           'rm': rm,
+           'rm_port': rm_port,
+           'rm_port_https': rm_port_https}
+
+    # all resourcemanagers, in HA mode
+    ha = str(config.get('yarn.resourcemanager.ha.enabled', '')).lower()
+    rm_ids = config.get('yarn.resourcemanager.ha.rm-ids')
+    if ha == 'true' and rm_ids:
+        rm_ha, rm_ha_https = [], []
+        for rm_id in rm_ids.split(','):
+            rm_id = rm_id.strip()
+            host = config.get('yarn.resourcemanager.hostname.' + rm_id, rm)
+            for key, port, addrs in [
+                    ('yarn.resourcemanager.webapp.address.',
+                     DEFAULTS['rm_port'], rm_ha),
+                    ('yarn.resourcemanager.webapp.https.address.',
+                     DEFAULTS['rm_port_https'], rm_ha_https)]:
+                if key + rm_id in config:
+                    h, p = get_host_port(config[key + rm_id])
+                    addrs.append((h, p or port))
+                else:
+                    addrs.append((host, port))
+        out['rm_ha'] = rm_ha
+        out['rm_ha_https'] = rm_ha_https
+        out['rm'], out['rm_port'] = rm_ha[0]
+        out['rm_port_https'] = rm_ha_https[0][1]
+    return out
 
 
 def config_to_dict(fname):
@@ -1,24 +1,30 @@
 from __future__ import absolute_import, division, print_function
 
 import atexit
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+import json
 import os
 import logging
-import socket
-import select
-import signal
 import platform
+import posixpath
 import requests
-import socket
-from subprocess import Popen, PIPE, call
-import struct
-import time
+import threading
 import weakref
 
+from .cache import TTLCache
 from .conf import get_config, DEFAULT_KNIT_HOME
+from .daemon import ClientDaemon, SharedClient
 from .env import CondaCreator
 from .exceptions import KnitException, YARNException
 from .yarn_api import YARNAPI
-from .utils import triple_slash
+from .metrics import Sampler
+from .preflight import estimate_wait, place_containers, queue_capacity
+from .staging import (HashCache, NAME_SUFFIX, STAGING_DIR, log_progress,
+                      name_path, resource, staging_path, summarize)
+from .tracing import LaunchTrace
+from .utils import run_in_thread, triple_slash
+from .watcher import StateWatcher, wait_until
 
 from py4j.protocol import Py4JError
 from py4j.java_gateway import JavaGateway, GatewayClient
@@ -28,13 +34,6 @@ logger = logging.getLogger(__name__)
 on_windows = platform.system() == "Windows"
 
 
-def read_int(stream):
-    length = stream.read(4)
-    if not length:
-        raise EOFError
-    return struct.unpack("!i", length)[0]
-
-
 class Knit(object):
     """
     Connection to HDFS/YARN. Launches a single "application" master with a
@@ -72,15 +71,29 @@ class Knit(object):
     upload_always: bool(=False)
         If True, will upload conda environment zip always; otherwise will
         attempt to check for the file's existence in HDFS (using the hdfs3
-        library, if present) and not upload if that matches the existing local
-        file in size and is newer.
+        library, if present) and not upload if a file of the same content is
+        already staged. Files are staged in HDFS by the hash of their
+        content, see ``staging_path``.
     knit_home: str
         Location of knit's jar
     hdfs: HDFileSystem instance or None
         Used for checking files in HDFS.
-
-    Note: for now, only one Knit instance can live in a single process because
-    of how py4j interfaces with the JVM.
+    cache: knit.cache.TTLCache, dict or number
+        Caching of RM queries, passed to YARNAPI. Pass the same TTLCache to
+        several Knit instances to have them share results, e.g., for the
+        pre-flight checks of many apps started together.
+    daemon: bool or knit.daemon.ClientDaemon
+        If True, start apps through a JVM client daemon which stays running
+        between launches, attaching to it if it is running already, rather
+        than starting a JVM for this instance. Pass a ClientDaemon to set
+        its options.
+    tracer: tracer or None
+        Receives a span for each phase of ``start``, e.g., an OpenTelemetry
+        tracer; None for the one set by ``knit.tracing.set_tracer`` (by
+        default, none). The timings are also in ``launch_timings``.
+
+    Any number of Knit instances can run apps at once, from any threads; those
+    in one process share a single JVM client (see ``knit.daemon``).
 
     Examples
     --------
@@ -91,11 +104,13 @@ class Knit(object):
 
     JAR_FILE = "knit-1.0-SNAPSHOT.jar"
     JAVA_APP = "io.continuum.knit.Client"
+    # seconds a listing of the HDFS staging directory is reused
+    staging_ttl = 30
     _instances = weakref.WeakSet()
 
     def __init__(self, autodetect=True, upload_always=False, hdfs_home=None,
-                 knit_home=DEFAULT_KNIT_HOME, hdfs=None, pars=None,
-                 **kwargs):
+                 knit_home=DEFAULT_KNIT_HOME, hdfs=None, pars=None, cache=None,
+                 daemon=False, tracer=None, **kwargs):
 
         self.conf = get_config(autodetect=autodetect, pars=pars, **kwargs)
         gateway_path = self.conf.get('gateway_path', '')
@@ -114,30 +129,40 @@ class Knit(object):
             self.yarn_api = YARNAPI(self.conf['rm'], self.conf['rm_port_https'],
                                     scheme='https', gateway_path=gateway_path,
                                     kerberos=kerb, username=self.conf['user'],
-                                    password=pw)
+                                    password=pw, cache=cache,
+                                    rm_ha=self.conf.get('rm_ha_https'))
         else:
             self.yarn_api = YARNAPI(self.conf['rm'], self.conf['rm_port'],
                                     gateway_path=gateway_path,
                                     kerberos=kerb, username=self.conf['user'],
-                                    password=pw)
+                                    password=pw, cache=cache,
+                                    rm_ha=self.conf.get('rm_ha'))
+        for key, attr in [('yarn.nodemanager.remote-app-log-dir',
+                           'remote_log_dir'),
+                          ('yarn.nodemanager.remote-app-log-dir-suffix',
+                           'remote_log_dir_suffix')]:
+            if key in self.conf:
+                setattr(self.yarn_api, attr, self.conf[key])
 
         self.KNIT_HOME = knit_home
         self.upload_always = upload_always
+        self.hash_cache = HashCache.default()
+        self._staging_cache = TTLCache({'staged_files': self.staging_ttl})
         self.lang = self.conf.get('lang', 'C.UTF-8')
         self.hdfs_home = hdfs_home or self.conf.get(
             'dfs.user.home.base.dir', '/user/' + self.conf['user'])
         self.client_gateway = None
 
-        # must set KNIT_HOME ENV for YARN App
-        os.environ['KNIT_HOME'] = self.KNIT_HOME
-        os.environ['REPLICATION_FACTOR'] = str(self.conf['replication_factor'])
-        os.environ['HDFS_KNIT_DIR'] = self.hdfs_home
-
         self.client = None
         self.master = None
         self.app_id = None
         self.proc = None
+        self.daemon = daemon
         self.hdfs = hdfs
+        self._jvm = None
+        self._lock = threading.Lock()
+        self.tracer = tracer
+        self.launch_trace = None
         self._instances.add(self)
 
     def __repr__(self):
@@ -147,13 +172,71 @@ class Knit(object):
     def JAR_FILE_PATH(self):
         return os.path.join(self.KNIT_HOME, self.JAR_FILE)
 
+    def placement(self, num_containers=1, virtual_cores=1, memory=128):
+        """Where YARN could place an app's containers now
+
+        Models first-fit placement of the AM and worker containers on the
+        free resources each NodeManager reports.
+
+        Parameters
+        ----------
+        num_containers, virtual_cores, memory:
+            As for ``start``
+
+        Returns
+        -------
+        knit.preflight.Placement, giving the number of containers which fit,
+        and on which nodes.
+        """
+        mmin = int(self.conf.get('yarn.scheduler.minimum-allocation-mb', 1024))
+        return place_containers(self.yarn_api.nodes(), num_containers,
+                                memory, virtual_cores, min_memory=mmin)
+
+    def _check_queue(self, queue, met, memory, vcores, am_memory,
+                     strict=False):
+        """Fail if the queue can never run the app; warn if it must wait
+
+        If the scheduler cannot be read or understood, the check is skipped
+        with a warning, or, if strict, the error is raised.
+        """
+        try:
+            cap = queue_capacity(self.yarn_api.scheduler(), queue,
+                                 self.conf['user'], met['totalMB'],
+                                 met['totalVirtualCores'])
+        except (requests.RequestException, YARNException, KeyError,
+                ValueError, TypeError, AttributeError) as e:
+            if isinstance(e, KeyError) and e.args == (queue,):
+                raise KnitException('No such queue: %s' % queue)
+            if strict:
+                raise
+            logger.warning('Could not check queue %s, continuing: %r',
+                           queue, e)
+            return
+        if cap is None:
+            return
+        errors, waits = cap.problems(memory, vcores, am_memory)
+        if errors:
+            raise KnitException('App cannot run in queue %s: %s'
+                                % (queue, '; '.join(errors)))
+        if waits:
+            msg = 'App will wait in queue %s: %s' % (queue, '; '.join(waits))
+            sampler = Sampler.running(self.yarn_api)
+            wait = sampler and estimate_wait(
+                memory - cap.user_available_mb, sampler)
+            if wait:
+                msg += ' (estimated wait %is)' % wait
+            logger.warning(msg)
+
     def _pre_flight_checks(self, num_containers, virtual_cores, memory,
-                           files, queue):
+                           files, queue, strict=False):
         """Some checks to see if app is possible to schedule
 
         This depends on YARN's allocations reporting, which do not necessarily
         reflect the true amount of resources on the cluster. Other failure
         modes, such as full disc, are not likely to be caught here.
+
+        The queue check is advisory: if the scheduler's state cannot be had,
+        the launch goes ahead, unless strict.
         """
         try:
             # check response from RM
@@ -184,17 +267,24 @@ class Knit(object):
         if met['availableVirtualCores'] < c:
             raise KnitException('vCPU request for app (%i) exceeds cluster capa'
                                 'city (%i)' % (c, met['availableVirtualCores']))
-        nodes = self.yarn_api.nodes()
-        if all((max(mmin, memory) > n['availMemoryMB']) and
-               (virtual_cores > n['availableVirtualCores'])
-               for n in nodes):
-            # cannot test without multiple nodemanagers
+        self._check_queue(queue, met, mem, c, max(300, mmin),
+                          strict=strict)
+        placement = self.placement(num_containers, virtual_cores, memory)
+        if placement.placed == 0 and num_containers:
             raise KnitException('No NodeManager can fit any single container')
+        if not placement.feasible:
+            raise KnitException(
+                'Only %i of the %i containers requested fit on the '
+                'NodeManagers%s' % (placement.placed, num_containers,
+                                    '' if placement.am_node else
+                                    ', with no room for the AM'))
         if self.hdfs:
             df = self.hdfs.df()
             cap = (df['capacity'] - df['used']) // 2**20
+            # files still being built (futures) are not counted
             fs = [self.JAR_FILE_PATH] + [f for f in files
-                                         if not f.startswith('hdfs://')]
+                                         if not isinstance(f, Future) and
+                                         not f.startswith('hdfs://')]
             need = sum(os.stat(f).st_size for f in fs) // 2**20
             # NB: if replication > 1 this might not be enough
             if cap < need:
@@ -203,7 +293,7 @@ class Knit(object):
 
     def start(self, cmd, num_containers=1, virtual_cores=1, memory=128,
               files=None, envvars=None, app_name="knit", queue="default",
-              checks=True):
+              checks=True, progress=log_progress, on_phase=None):
         """
         Method to start a yarn app with a distributed shell
 
@@ -233,6 +323,9 @@ class Knit(object):
             container before launch as a directory with the same name as the
             file: if myarc.zip contains files inside a directory stuff/, to
             the container they will appear at ./myarc.zip/stuff/* .
+            Entries may also be futures resolving to such paths, e.g., of
+            archives still being built; each is uploaded once ready, and the
+            app is scheduled meanwhile.
         envvars: dict
             Environment variables to pass to AM *and* workers. Both keys
             and values must be strings only.
@@ -240,13 +333,28 @@ class Knit(object):
             Application name shown in YARN (default: "knit")
         queue: String
             RM Queue to use while scheduling (default: "default")
-        checks: bool=True
-            Whether to run pre-flight checks before submitting app to YARN
+        checks: bool or 'strict' (default True)
+            Whether to run pre-flight checks before submitting app to YARN.
+            If the queue's capacity cannot be checked, because the scheduler
+            cannot be read or understood, a warning is logged; with
+            'strict', the launch fails instead.
+        progress: callable or None
+            Called with the progress of file uploads, see ``stage``
+        on_phase: callable or None
+            Called as ``on_phase(name, event, span)`` as each phase of the
+            launch starts ('start') and ends ('end' or 'error'). The phases
+            are preflight, client, submit, wait_am, am_connect, wait_upload
+            and init, all within launch; upload, with a hash for each batch
+            of ready files, runs alongside them from another thread.
 
         Returns
         -------
         applicationId: str
             A yarn application ID string
+
+        See Also
+        --------
+        start_async
         """
         files = files or []
         envvars = envvars or {'KNIT_LANG': self.lang}
@@ -262,81 +370,77 @@ class Knit(object):
             if not isinstance(files, list):
                 raise KnitException("File argument must be a list of strings")
 
-        if checks:
-            self._pre_flight_checks(num_containers, virtual_cores, memory,
-                                    files, queue)
-        # From https://github.com/apache/spark/blob/d83c2f9f0b08d6d5d369d9fae04cdb15448e7f0d/python/pyspark/java_gateway.py
-        # thank you spark
-
-        ## Socket for PythonGatewayServer to communicate its port to us
-        callback_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        callback_socket.bind(('127.0.0.1', 0))
-        callback_socket.listen(1)
-        callback_host, callback_port = callback_socket.getsockname()
-
-        if not os.path.exists(self.JAR_FILE_PATH):
-            raise KnitException('JAR file %s does not exists - please build'
-                                ' with maven' % self.JAR_FILE_PATH)
-        args = ["hadoop", "jar", self.JAR_FILE_PATH, self.JAVA_APP,
-                "--callbackHost", str(callback_host), "--callbackPort",
-                str(callback_port)]
-
-        ## Launch the Java gateway.
-        # We open a pipe to stdin so that the Java gateway can die when the pipe is broken
-        if not on_windows:
-            # Don't send ctrl-c / SIGINT to the Java gateway:
-            def preexec_func():
-                signal.signal(signal.SIGINT, signal.SIG_IGN)
-            proc = Popen(args, stdin=PIPE, preexec_fn=preexec_func)
-        else:
-            # preexec_fn not supported on Windows
-            proc = Popen(args, stdin=PIPE)
-        self.proc = proc
-        gateway_port = None
-        # We use select() here in order to avoid blocking indefinitely if the
-        # subprocess dies before connecting
-        long_timeout = 60
-        while gateway_port is None and proc.poll() is None and long_timeout > 0:
-            timeout = 1  # (seconds)
-            readable, _, _ = select.select([callback_socket], [], [], timeout)
-            if callback_socket in readable:
-                gateway_connection = callback_socket.accept()[0]
-                # Determine which ephemeral port the server started on:
-                gateway_port = read_int(gateway_connection.makefile(mode="rb"))
-                gateway_connection.close()
-                callback_socket.close()
-            long_timeout -= 1
-
-        if gateway_port is None:
-            raise Exception("The JVM Knit client failed to launch successfully."
-                            " Check that java is installed and the Knit JAR"
-                            " file exists.")
-
-        gateway = JavaGateway(GatewayClient(port=gateway_port),
-                              auto_convert=True)
-        self.client = gateway.entry_point
-        self.client_gateway = gateway
-        logger.debug("Files submitted: %s" % files)
-        upfiles = [f for f in files if (not f.startswith('hdfs://')
-                   and self.check_needs_upload(f))]
-        logger.debug("Files to upload: %s" % upfiles)
-        jfiles = ListConverter().convert(upfiles, gateway._gateway_client)
-        jenv = MapConverter().convert(envvars, gateway._gateway_client)
-
-        self.app_id = self.client.start(jfiles, jenv, app_name, queue)
-
-        ## Wait for AM to appear
-        long_timeout = 100
-        master_rpcport = -1
-        while master_rpcport == -1:
-            master_rpcport = self.client.masterRPCPort()
-            time.sleep(0.2)
-            long_timeout -= 0.2
-            if long_timeout < 0:
-                break
-
-        if master_rpcport in [-1, 'N/A']:
-            raise Exception(
+        trace = self.launch_trace = LaunchTrace(self.tracer, on_phase)
+        with trace.span('launch', app_name=app_name, queue=queue,
+                        num_containers=num_containers) as launch:
+            if checks:
+                with trace.span('preflight'):
+                    self._pre_flight_checks(num_containers, virtual_cores,
+                                            memory, files, queue,
+                                            strict=checks == 'strict')
+            # The launch holds a reference to the JVM client throughout, so
+            # that the uploads, which take and drop their own, cannot shut
+            # it down before the app is submitted
+            jvm = self._jvm_client()
+            with trace.span('client', daemon=bool(self.daemon)):
+                with self._lock:
+                    if self.client is not None:
+                        raise ValueError('Already started')
+                    self.client = jvm.acquire()
+                    self._jvm = jvm
+            # The AM needs none of the files until init, so they are hashed
+            # and uploaded while the app is submitted and the AM is
+            # scheduled
+            stop = Future()
+            uploads = run_in_thread(self._stage_files, files, trace,
+                                    progress, stop)
+
+            def uploaded():
+                try:
+                    return uploads.result()
+                except Exception:
+                    if self.app_id:
+                        # the AM would wait for its files forever
+                        self.kill()
+                    raise
+            try:
+                self.proc = jvm.proc
+                gateway = jvm.gateway
+                self.client_gateway = gateway
+                jfiles = MapConverter().convert({}, gateway._gateway_client)
+                jenv = MapConverter().convert(envvars,
+                                              gateway._gateway_client)
+
+                with trace.span('submit') as span:
+                    self.app_id = self.client.start(
+                        jfiles, jenv, app_name, queue, self.hdfs_home,
+                        self.JAR_FILE_PATH,
+                        int(self.conf['replication_factor']))
+                    span.set_attribute('app_id', self.app_id)
+                    launch.set_attribute('app_id', self.app_id)
+                    self._jvm_timings(trace, span)
+
+                ## Wait for AM to appear, giving up early if the app has
+                ## already ended; the shared watcher lists the states of
+                ## all apps being launched at once
+                final = StateWatcher.shared(self.yarn_api).watch(self.app_id)
+
+                def am_reported():
+                    port = self.client.masterRPCPort(self.app_id)
+                    if port != -1:
+                        return port
+                    if uploads.done() and uploads.exception() is not None:
+                        return True
+                    return final.done()
+                with trace.span('wait_am'):
+                    wait_until(am_reported, timeout=100)
+                    master_rpcport = self.client.masterRPCPort(self.app_id)
+
+                if uploads.done() and uploads.exception() is not None:
+                    uploaded()
+
+                if master_rpcport in [-1, 'N/A']:
+                    raise Exception(
 """The application master JVM process failed to report back. This can mean:
  - that the YARN cluster cannot scheduler adequate resources - check
    k.yarn_api.cluster_metrics() and other diagnostic methods;
@@ -344,23 +448,108 @@ class Knit(object):
  - that the cluster is otherwise unhealthy - check the RM and NN logs 
    (use k.yarn_api.system_logs() to find these on a one-node system
 """)
-        master_rpchost = self.client.masterRPCHost()
-
-        gateway = JavaGateway(GatewayClient(
-            address=master_rpchost, port=master_rpcport), auto_convert=True)
-        self.master = gateway.entry_point
-        rfiles = [triple_slash(f) if f.startswith('hdfs://') else
-                  '/'.join(['hdfs://', self.hdfs_home, '.knitDeps',
-                            os.path.basename(f)])
-                  for f in files]
-        logger.debug("Resource files: %s" % rfiles)
-        jfiles = ListConverter().convert(rfiles, gateway._gateway_client)
-        jenv = MapConverter().convert(envvars, gateway._gateway_client)
-        self.master.init(jfiles, jenv, cmd, num_containers,
-                         virtual_cores, memory)
+                master_rpchost = self.client.masterRPCHost(self.app_id)
+
+                with trace.span('am_connect', host=master_rpchost,
+                                port=master_rpcport):
+                    gateway = JavaGateway(GatewayClient(
+                        address=master_rpchost, port=master_rpcport),
+                        auto_convert=True)
+                    self.master = gateway.entry_point
+                with trace.span('wait_upload'):
+                    files, staged = uploaded()
+                rfiles = [triple_slash(f) if f.startswith('hdfs://') else
+                          resource(staged[f], os.path.basename(f))
+                          for f in files]
+                logger.debug("Resource files: %s" % rfiles)
+                with trace.span('init'):
+                    jfiles = ListConverter().convert(rfiles,
+                                                     gateway._gateway_client)
+                    jenv = MapConverter().convert(envvars,
+                                                  gateway._gateway_client)
+                    self.master.init(jfiles, jenv, cmd, num_containers,
+                                     virtual_cores, memory)
+            except BaseException:
+                # leave no thread uploading, or waiting for files still
+                # being built, once the launch has failed
+                stop.set_result(None)
+                wait([uploads])
+                raise
 
         return self.app_id
 
+    def _stage_files(self, files, trace, progress, stop=None):
+        """Hash and upload the local files of a launch, each as soon as it
+        is ready
+
+        If the future ``stop`` is done, no further files are uploaded or
+        waited for, and KnitException is raised.
+
+        Returns
+        -------
+        files: list of str
+            The files, with futures replaced by their results
+        staged: dict
+            Local path -> HDFS path, by content
+        """
+        logger.debug("Files submitted: %s" % files)
+        pending = [f for f in files if isinstance(f, Future)]
+        ready = [f for f in files if not isinstance(f, Future)]
+        staged = {}
+        nbytes = 0
+        with trace.span('upload') as span:
+            while True:
+                local = [f for f in ready
+                         if not f.startswith('hdfs://') and f not in staged]
+                with trace.span('hash', files=len(local)):
+                    new = {f: self.staging_path(f) for f in local}
+                stats = self.stage(list(new), progress=progress)
+                staged.update(new)
+                nbytes += summarize(stats)[1]
+                span.set_attribute('files', len(staged))
+                span.set_attribute('bytes', nbytes)
+                if not pending:
+                    break
+                done, _ = wait(pending + ([stop] if stop is not None else []),
+                               return_when=FIRST_COMPLETED)
+                if stop is not None and stop.done():
+                    raise KnitException('Launch failed: upload stopped')
+                pending = [f for f in pending if f not in done]
+                ready = [f.result() for f in done]
+        files = [f.result() if isinstance(f, Future) else f for f in files]
+        return files, staged
+
+    def start_async(self, cmd, **kwargs):
+        """
+        Start a yarn app without waiting for it, see ``start``
+
+        The launch runs in a background thread, so that the caller can do
+        other work meanwhile, or launch many apps at once, each from its own
+        Knit instance; pass ``on_phase=`` to follow it.
+
+        Parameters
+        ----------
+        cmd: str
+            Command to run in each yarn container
+        kwargs:
+            Passed to ``start``
+
+        Returns
+        -------
+        concurrent.futures.Future, resolving to the application ID, or
+        raising the error which stopped the launch. From asyncio, await
+        ``asyncio.wrap_future(fut)``; tornado coroutines can yield it
+        directly.
+
+        Examples
+        --------
+        >>> k = Knit()  # doctest: +SKIP
+        >>> fut = k.start_async('sleep 100', num_containers=5)
+        >>> # ... other work ...
+        >>> app_id = fut.result()
+        """
+        return run_in_thread(self.start, cmd, **kwargs)
+
     def add_containers(self, num_containers=1, virtual_cores=1, memory=128):
         """
         Method to add containers to an already running yarn app
@@ -468,6 +657,9 @@ class Knit(object):
         Collect logs from RM (if running)
         With shell=True, collect logs from HDFS after job completion
 
+        If the ``hdfs`` attribute is set, the logs of a finished app are read
+        directly from the aggregated log files in HDFS.
+
         Parameters
         ----------
         shell: bool
@@ -479,7 +671,32 @@ class Knit(object):
             logs from each container (when possible)
         """
         if self.app_id:
-            return self.yarn_api.logs(self.app_id, shell=shell)
+            return self.yarn_api.logs(self.app_id, shell=shell,
+                                      fs=None if shell else self.hdfs)
+        else:
+            raise KnitException('Cannot get logs, app not started')
+
+    def tail_logs(self, log_types=('stdout', 'stderr'), interval=1):
+        """
+        Follow the container logs of the running app
+
+        Only the bytes written since the previous poll are fetched, so this
+        is cheap to leave running for the life of the app.
+
+        Parameters
+        ----------
+        log_types: list of str
+            Which log files to follow in each container
+        interval: number
+            Seconds between polls
+
+        Yields
+        ------
+        (container ID, log type, line), until the app stops running
+        """
+        if self.app_id:
+            return self.yarn_api.follow_logs(self.app_id, log_types=log_types,
+                                             interval=interval)
         else:
             raise KnitException('Cannot get logs, app not started')
 
@@ -494,21 +711,25 @@ class Knit(object):
     def wait_for_completion(self, timeout=10):
         """
         Wait for completion of the yarn application
+
+        The app is watched by the ``StateWatcher`` shared by all Knit
+        instances of the ResourceManager, so that waiting on many apps
+        costs one request per poll.
         
         Returns
         -------
         bool:
             True if successful, False otherwise
         """
-        cur_status = self.runtime_status()
-        while cur_status not in ['FAILED', 'KILLED', 'FINISHED']:
-            time.sleep(0.2)
-            timeout -= 0.2
-            cur_status = self.runtime_status()
-            if timeout < 0:
-                break
-
-        return timeout > 0
+        if self.app_id is None:
+            return False
+        try:
+            state = StateWatcher.shared(self.yarn_api).wait(self.app_id,
+                                                            timeout)
+        except Exception:
+            logger.debug("Failed to watch %s", self.app_id, exc_info=1)
+            return False
+        return state is not None
 
     def kill(self):
         """
@@ -519,24 +740,21 @@ class Knit(object):
         bool:
             True if successful, False otherwise.
         """
-        if self.client is None:
+        with self._lock:
+            client, self.client = self.client, None
+            jvm, self._jvm = self._jvm, None
+        if client is None:
             # never started, can't stop - should be warning or exception?
             return False
         try:
-            self.client.kill()
+            client.kill(self.app_id)
         except Py4JError:
             logger.debug("Error while attempting to kill", exc_info=1)
             # fallback
             self.yarn_api.kill(self.app_id)
-        if self.proc is not None:
-            self.client_gateway.shutdown()
-            if on_windows:
-                call(["cmd", "/c", "taskkill", "/f", "/t", "/pid",
-                      str(self.proc.pid)])
-            self.proc.terminate()
-            self.proc.communicate()
-            self.proc = None
-        self.client = None
+        jvm.release()
+        self.client_gateway = None
+        self.proc = None
         out = self.runtime_status() == 'KILLED'
         return out
 
@@ -557,7 +775,7 @@ class Knit(object):
             status of application
         """
         if self.app_id:
-            return self.yarn_api.apps_info(self.app_id)
+            return self.yarn_api.apps_info(self.app_id, fresh=True)
         else:
             raise KnitException("Cannot get status, app not started")
     
@@ -570,45 +788,201 @@ class Knit(object):
             status of application
         """
         try:
-            return self.yarn_api.state(self.app_id)
+            return self.yarn_api.state(self.app_id, fresh=True)
         except:
             return "NONE"
 
+    def _jvm_timings(self, trace, span):
+        """Add the JVM client's timings of starting the app to the trace,
+        as phases and as attributes of the submit span"""
+        try:
+            steps = json.loads(self.client.timings(self.app_id),
+                               object_pairs_hook=OrderedDict)
+        except Exception:
+            logger.debug("No timings from the JVM client", exc_info=1)
+            return
+        for step, seconds in steps.items():
+            span.set_attribute('jvm.' + step, seconds)
+            trace.add('submit.' + step, seconds)
+
+    @property
+    def launch_timings(self):
+        """Seconds taken by each phase of the last ``start``, in order
+
+        The whole is ``launch``; ``submit.*`` are steps timed in the JVM
+        client. The spans themselves, with their attributes, are in
+        ``launch_trace.spans``.
+        """
+        if self.launch_trace is None:
+            return OrderedDict()
+        return self.launch_trace.timings
+
+    def _jvm_client(self):
+        """The JVM client of this instance: its daemon, or the one shared by
+        the process"""
+        if self._jvm is not None:
+            return self._jvm
+        if self.daemon:
+            if not isinstance(self.daemon, ClientDaemon):
+                self.daemon = ClientDaemon.get(self.JAR_FILE_PATH)
+            return self.daemon
+        return SharedClient.get(self.JAR_FILE_PATH)
+
+    def stage(self, files, progress=log_progress, interval=1, threads=4):
+        """Upload local files to the HDFS staging directory
+
+        Files whose content is staged already are skipped, unless
+        ``upload_always``. The JVM client uploads several files at once, and
+        resumes uploads which failed part way.
+
+        Parameters
+        ----------
+        files: list of str
+            Local paths
+        progress: callable or None
+            Called every ``interval`` seconds while uploading, and at the
+            end, with the statistics so far: HDFS path -> dict of ``size``,
+            ``bytes``, ``resumed_from``, ``seconds``, ``done`` and ``error``
+            (see ``knit.staging.summarize``). The default logs the totals.
+        interval: number
+            Seconds between progress calls
+        threads: int
+            Number of files uploaded at once
+
+        Returns
+        -------
+        dict: local path -> statistics of its upload, for the files uploaded
+        """
+        upfiles = {f: self.staging_path(f) for f in files
+                   if self.check_needs_upload(f)}
+        logger.debug("Files to upload: %s" % upfiles)
+        if not upfiles:
+            return {}
+        jvm = self._jvm_client()
+        client = jvm.acquire()
+        done = threading.Event()
+
+        def poll():
+            while not done.wait(interval):
+                try:
+                    progress(json.loads(client.stagingProgress(jdests)))
+                except Exception:
+                    logger.debug("Upload progress failed", exc_info=1)
+        # the gateway converts these to Java collections (auto_convert)
+        jdests = list(upfiles.values())
+        try:
+            if progress is not None:
+                thread = threading.Thread(target=poll,
+                                          name='knit-upload-progress')
+                thread.daemon = True
+                thread.start()
+            try:
+                stats = json.loads(client.stage(
+                    upfiles, threads, int(self.conf['replication_factor'])))
+            finally:
+                done.set()
+            if progress is not None:
+                thread.join()
+                progress(stats)
+        finally:
+            jvm.release()
+            self._staging_cache.invalidate('staged_files')
+        self._record_names({f: p for f, p in upfiles.items()
+                            if stats.get(p, {}).get('done')})
+        return {f: stats[p] for f, p in upfiles.items() if p in stats}
+
+    def _record_names(self, staged):
+        """Write the local name of each newly staged file next to it, for
+        ``list_envs``; the names are informative only, so failures are
+        logged and ignored"""
+        if not self.hdfs:
+            return
+        for local, path in staged.items():
+            try:
+                with self.hdfs.open(name_path(path), 'wb') as f:
+                    f.write(os.path.basename(local).encode('utf-8'))
+            except Exception:
+                logger.debug("Failed to record name of %s", path, exc_info=1)
+
+    def staged_files(self):
+        """Files in the HDFS staging directory
+
+        All come from one directory listing, kept for ``staging_ttl``
+        seconds, so that the upload checks of all of an app's files, and
+        ``list_envs``, cost a single NameNode request.
+
+        Returns: dict
+            File name -> details, as from ``hdfs.ls``"""
+        if not self.hdfs:
+            raise ImportError('Set the `hdfs` attribute to be able to list'
+                              'staged files.')
+        path = posixpath.join(self.hdfs_home, STAGING_DIR)
+
+        def listing():
+            try:
+                files = self.hdfs.ls(path, True)
+            except (IOError, OSError):
+                # nothing staged yet
+                files = []
+            return {posixpath.basename(f['name'].rstrip('/')): f
+                    for f in files}
+        return self._staging_cache.get('staged_files', path, listing)
+
     def list_envs(self):
         """List knit conda environments already in HDFS
         
-        Looks in staging directory for zip-files
+        Looks in staging directory for zip-files, which are named by the
+        hash of their content (see ``staging_path``)
         
         Returns: list of dict
-            Details for each zip-file."""
+            Details for each zip-file, as from ``hdfs.ls``, with
+            ``original_name``, the name of the local file it was uploaded
+            from (None if that was not recorded)."""
         if self.hdfs:
-            files = self.hdfs.ls(self.hdfs_home + '/.knitDeps/', True)
-            return [f for f in files if f['name'].endswith('.zip')]
+            files = self.staged_files()
+            envs = []
+            for name in sorted(files):
+                if not name.endswith('.zip'):
+                    continue
+                env = dict(files[name], original_name=None)
+                if name + NAME_SUFFIX in files:
+                    try:
+                        env['original_name'] = self.hdfs.cat(name_path(
+                            posixpath.join(self.hdfs_home, STAGING_DIR,
+                                           name))).decode('utf-8')
+                    except Exception:
+                        logger.debug("Failed to read name of %s", name,
+                                     exc_info=1)
+                envs.append(env)
+            return envs
         else:
             raise ImportError('Set the `hdfs` attribute to be able to list'
                               'environments.')
 
+    def staging_path(self, path):
+        """HDFS path at which a local file is staged, by its content:
+        ``<hdfs_home>/.knitDeps/<sha256><ext>``"""
+        return staging_path(self.hdfs_home, path, self.hash_cache.hash(path))
+
     def check_needs_upload(self, path):
-        """Upload is needed if file does not exist in HDFS or is older"""
+        """Upload is needed unless the file's content is already staged
+
+        Without the ``hdfs`` attribute, this cannot be checked, and the file
+        is always uploaded.
+        """
         if self.upload_always:
             return True
-        fn = '/'.join([self.hdfs_home, '.knitDeps', os.path.basename(path)])
-        if self.hdfs and self.hdfs.exists(fn):
-            st = os.stat(path)
-            size = st.st_size
-            t = st.st_mtime
-            info = self.hdfs.info(fn)
-            if info['size'] == size and t < info['last_mod']:
-                return False
-            else:
-                return True
-        else:
+        if not self.hdfs:
             return True
+        info = self.staged_files().get(
+            posixpath.basename(self.staging_path(path)))
+        # a partial upload would have the wrong size
+        return info is None or info['size'] != os.path.getsize(path)
 
     @classmethod
     def _cleanup(cls):
         # called on program exit to destroy lingering connections/apps
-        for instance in cls._instances:
+        for instance in list(cls._instances):
             instance.kill()
 
 atexit.register(Knit._cleanup)
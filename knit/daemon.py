@@ -0,0 +1,422 @@
+"""
+Launching the JVM knit Client, and sharing it between apps and launches.
+"""
+from __future__ import absolute_import, division, print_function
+
+import binascii
+import errno
+import getpass
+import hashlib
+import json
+import logging
+import os
+import platform
+import select
+import signal
+import socket
+import struct
+import subprocess
+import threading
+from subprocess import Popen, PIPE
+
+from py4j.java_gateway import JavaGateway, GatewayParameters
+
+from .exceptions import KnitException
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+on_windows = platform.system() == "Windows"
+JAVA_APP = "io.continuum.knit.Client"
+# environment variable giving the JVM the token its gateway requires; unlike
+# arguments, the environment of a process is not visible to other users
+TOKEN_ENV = 'KNIT_GATEWAY_TOKEN'
+
+
+def read_int(stream):
+    length = stream.read(4)
+    if not length:
+        raise EOFError
+    return struct.unpack("!i", length)[0]
+
+
+def launch_client(jar, java_app=JAVA_APP, args=(), detached=False, log=None,
+                  timeout=60):
+    """Start a JVM running the knit Client, and wait for its gateway
+
+    Parameters
+    ----------
+    jar: str
+        Path of the knit JAR
+    java_app: str
+        Class to run
+    args: list of str
+        Extra arguments for the Client
+    detached: bool
+        If False, the JVM exits when this process closes its stdin, i.e.,
+        when this process ends; if True, it is started in its own session
+        and does not.
+    log: file or None
+        Where the output of a detached JVM goes
+    timeout: number
+        Seconds to wait for the gateway port
+
+    The gateway only serves callers presenting a random token, made here.
+
+    Returns
+    -------
+    proc: Popen
+    gateway_port: int
+    auth_token: str
+        For ``connect_gateway``
+    """
+    # From https://github.com/apache/spark/blob/d83c2f9f0b08d6d5d369d9fae04cdb15448e7f0d/python/pyspark/java_gateway.py
+    # thank you spark
+
+    ## Socket for PythonGatewayServer to communicate its port to us
+    callback_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    callback_socket.bind(('127.0.0.1', 0))
+    callback_socket.listen(1)
+    callback_host, callback_port = callback_socket.getsockname()
+
+    if not os.path.exists(jar):
+        raise KnitException('JAR file %s does not exists - please build'
+                            ' with maven' % jar)
+    args = ["hadoop", "jar", jar, java_app,
+            "--callbackHost", str(callback_host), "--callbackPort",
+            str(callback_port)] + list(args)
+
+    auth_token = binascii.hexlify(os.urandom(32)).decode('ascii')
+    env = os.environ.copy()
+    env[TOKEN_ENV] = auth_token
+    kwargs = {'env': env}
+    if detached:
+        kwargs['stdin'] = open(os.devnull)
+        kwargs['stdout'] = log
+        kwargs['stderr'] = subprocess.STDOUT if log else None
+        if on_windows:
+            kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        ## Launch the Java gateway.
+        # We open a pipe to stdin so that the Java gateway can die when the
+        # pipe is broken
+        kwargs['stdin'] = PIPE
+    if not on_windows:
+        # Don't send ctrl-c / SIGINT to the Java gateway:
+        def preexec_func():
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            if detached:
+                os.setsid()
+        kwargs['preexec_fn'] = preexec_func
+    proc = Popen(args, **kwargs)
+    gateway_port = None
+    # We use select() here in order to avoid blocking indefinitely if the
+    # subprocess dies before connecting
+    long_timeout = timeout
+    while gateway_port is None and proc.poll() is None and long_timeout > 0:
+        timeout = 1  # (seconds)
+        readable, _, _ = select.select([callback_socket], [], [], timeout)
+        if callback_socket in readable:
+            gateway_connection = callback_socket.accept()[0]
+            # Determine which ephemeral port the server started on:
+            gateway_port = read_int(gateway_connection.makefile(mode="rb"))
+            gateway_connection.close()
+        long_timeout -= 1
+    callback_socket.close()
+
+    if gateway_port is None:
+        raise KnitException("The JVM Knit client failed to launch "
+                            "successfully. Check that java is installed and "
+                            "the Knit JAR file exists.")
+    return proc, gateway_port, auth_token
+
+
+def connect_gateway(port, auth_token):
+    """py4j gateway to a JVM started by ``launch_client``"""
+    return JavaGateway(gateway_parameters=GatewayParameters(
+        port=port, auth_token=auth_token, auto_convert=True))
+
+
+def _write_private(path, data):
+    """Write a file which only the current user may read"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # the mode of a file which already existed is unchanged by os.open
+    if hasattr(os, 'fchmod'):
+        os.fchmod(fd, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(data)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def client_key(jar):
+    """Identifies the Client JVMs which can serve Knit instances of the
+    current user with the given JAR
+
+    The HDFS staging settings of each instance are passed with each call, so
+    these are all the JVM depends on.
+    """
+    return hashlib.md5('\n'.join(
+        [os.path.abspath(jar), getpass.getuser()]
+    ).encode('utf-8')).hexdigest()[:12]
+
+
+class SharedClient(object):
+    """The JVM knit Client of this process, shared by its Knit instances
+
+    The Client handles any number of applications, and py4j serves each
+    Python thread on its own connection, so Knit instances in any number of
+    threads can use one JVM. It is started by the first ``acquire``, and
+    shut down when the last reference is released, or when this process
+    exits.
+
+    Use ``SharedClient.get`` so that a process has one per JAR (see
+    ``client_key``).
+
+    Parameters
+    ----------
+    jar: str
+        Path of the knit JAR
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, jar):
+        self.jar = os.path.abspath(jar)
+        self.key = client_key(jar)
+        self.gateway = None
+        self.proc = None
+        self.refs = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<{0}: {1}, {2} references>'.format(
+            type(self).__name__, self.key, self.refs)
+
+    @classmethod
+    def get(cls, jar, **kwargs):
+        """The instance in this process for jar; kwargs apply only when it is
+        made"""
+        client = cls(jar, **kwargs)
+        with cls._shared_lock:
+            return cls._shared.setdefault((cls, client._shared_key), client)
+
+    @property
+    def _shared_key(self):
+        # the instances which ``get`` treats as the same
+        return self.key
+
+    def _connect(self):
+        self.proc, port, token = launch_client(self.jar)
+        return connect_gateway(port, token)
+
+    def _attach(self):
+        pass
+
+    def _detach(self):
+        pass
+
+    def _disconnect(self):
+        self.gateway.shutdown()
+        if self.proc is not None:
+            if on_windows:
+                subprocess.call(["cmd", "/c", "taskkill", "/f", "/t", "/pid",
+                                 str(self.proc.pid)])
+            self.proc.terminate()
+            self.proc.communicate()
+            self.proc = None
+
+    def acquire(self):
+        """Take a reference to the JVM, starting it if needed
+
+        Returns
+        -------
+        The Client entry point
+        """
+        with self._lock:
+            if self.gateway is None:
+                self.gateway = self._connect()
+            self._attach()
+            self.refs += 1
+            return self.gateway.entry_point
+
+    def release(self):
+        """Drop a reference taken by ``acquire``"""
+        with self._lock:
+            if self.refs == 0 or self.gateway is None:
+                return
+            self.refs -= 1
+            self._detach()
+            if self.refs == 0:
+                self._disconnect()
+                self.gateway = None
+
+
+class ClientDaemon(SharedClient):
+    """A JVM knit Client which outlives the processes using it
+
+    The first ``acquire`` on a host starts the JVM, detached from the
+    calling process, and records its gateway port and token in a state file
+    which only the user can read; later ``Knit`` instances, in this process
+    or others of the user on the host, attach to the same JVM and so skip
+    JVM startup. The JVM counts references by process. While a process
+    holds references, a thread sends the JVM heartbeats; a process which is
+    not heard from for ``lease_timeout`` seconds, e.g., because it died
+    without releasing, is forgotten. The JVM exits once nothing has
+    referred to it for ``idle_timeout`` seconds. Releasing the last
+    reference of this process leaves it running.
+
+    There is one daemon per JAR, user and ``state_dir`` (see
+    ``client_key``).
+
+    Parameters
+    ----------
+    jar: str
+        Path of the knit JAR
+    idle_timeout: int
+        Seconds without references before the JVM exits
+    state_dir: str or None
+        Directory of the state and log files, default ``~/.knit``
+    lease_timeout: int
+        Seconds without a heartbeat after which the JVM forgets a process
+
+    Examples
+    --------
+    >>> k = Knit(daemon=True)  # doctest: +SKIP
+    >>> k.start('sleep 100')  # starts the daemon, or attaches to it
+    """
+
+    def __init__(self, jar, idle_timeout=600, state_dir=None,
+                 lease_timeout=60):
+        super(ClientDaemon, self).__init__(jar)
+        self.idle_timeout = idle_timeout
+        self.lease_timeout = lease_timeout
+        self.state_dir = state_dir or os.path.join(
+            os.path.expanduser('~'), '.knit')
+        self.state_path = os.path.join(self.state_dir,
+                                       'daemon-%s.json' % self.key)
+        self._heartbeat = None
+        self._stop_heartbeat = threading.Event()
+
+    @property
+    def _shared_key(self):
+        # daemons with other state files are other JVMs
+        return self.key, os.path.abspath(self.state_dir)
+
+    def __repr__(self):
+        return '<ClientDaemon: {0}, {1} references>'.format(
+            self.state_path, self.refs)
+
+    def _read_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _gateway(self, port, token):
+        gateway = connect_gateway(port, token)
+        try:
+            gateway.entry_point.references()
+        except Exception:
+            logger.debug('No knit daemon at port %s', port, exc_info=1)
+            gateway.close()
+            return None
+        return gateway
+
+    def _connect(self):
+        """Gateway of the running daemon, starting it if there is none"""
+        if not os.path.isdir(self.state_dir):
+            os.makedirs(self.state_dir, 0o700)
+        # only one process at a time may start the daemon
+        with open(self.state_path + '.lock', 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                state = self._read_state()
+                if (state and state.get('token') and
+                        _pid_alive(state['pid'])):
+                    gateway = self._gateway(state['port'], state['token'])
+                    if gateway is not None:
+                        logger.debug('Attached to knit daemon %s',
+                                     state['pid'])
+                        return gateway
+                log = os.open(self.state_path[:-5] + '.log',
+                              os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+                with os.fdopen(log, 'ab') as log:
+                    proc, port, token = launch_client(
+                        self.jar, args=['--daemon', '--idleTimeout',
+                                        str(self.idle_timeout),
+                                        '--leaseTimeout',
+                                        str(self.lease_timeout)],
+                        detached=True, log=log)
+                state = {'pid': proc.pid, 'port': port, 'token': token}
+                _write_private(self.state_path, json.dumps(state))
+                logger.debug('Started knit daemon %s', proc.pid)
+                return connect_gateway(port, token)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _attach(self):
+        try:
+            self.gateway.entry_point.attach(os.getpid())
+        except Exception:
+            # the daemon went away, e.g., after an idle timeout
+            self.gateway.close()
+            self.gateway = None
+            self.gateway = self._connect()
+            self.gateway.entry_point.attach(os.getpid())
+        if self._heartbeat is None or not self._heartbeat.is_alive():
+            self._stop_heartbeat.clear()
+            self._heartbeat = threading.Thread(target=self._beat)
+            self._heartbeat.daemon = True
+            self._heartbeat.start()
+
+    def _beat(self):
+        """Tell the JVM, while this process holds references, that it is
+        alive and how many it holds"""
+        while not self._stop_heartbeat.wait(self.lease_timeout / 4):
+            with self._lock:
+                gateway, refs = self.gateway, self.refs
+            if gateway is None or refs == 0:
+                return
+            try:
+                gateway.entry_point.heartbeat(os.getpid(), refs)
+            except Exception:
+                logger.debug('Knit daemon heartbeat failed', exc_info=1)
+
+    def _detach(self):
+        try:
+            self.gateway.entry_point.detach(os.getpid())
+        except Exception:
+            logger.debug('Could not detach from knit daemon', exc_info=1)
+
+    def _disconnect(self):
+        self._stop_heartbeat.set()
+        self.gateway.close()
+
+    def stop(self):
+        """Shut down the daemon JVM, whoever is using it"""
+        with self._lock:
+            state = self._read_state()
+            if state and _pid_alive(state['pid']):
+                os.kill(state['pid'], signal.SIGTERM)
+            self._stop_heartbeat.set()
+            if self.gateway is not None:
+                self.gateway.close()
+                self.gateway = None
+            self.refs = 0
+            try:
+                os.remove(self.state_path)
+            except OSError:
+                pass
@@ -0,0 +1,249 @@
+"""
+Sampling YARN cluster and application metrics over time.
+"""
+from __future__ import absolute_import, division, print_function
+
+from collections import OrderedDict
+import logging
+import numbers
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def numeric_fields(d):
+    """The fields of a REST response dict with numeric values"""
+    return {k: v for k, v in d.items()
+            if isinstance(v, numbers.Number) and not isinstance(v, bool)}
+
+
+class RingBuffer(object):
+    """Fixed number of timestamped rows of float fields; once full, each new
+    row replaces the oldest
+
+    Parameters
+    ----------
+    size: int
+        Number of rows kept
+    fields: list of str
+        Initial columns; more are added as new fields are appended
+    """
+
+    def __init__(self, size, fields=()):
+        self.size = size
+        self.fields = list(fields)
+        self.times = np.full(size, np.nan)
+        self.data = np.full((size, len(self.fields)), np.nan)
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def append(self, t, values):
+        """Add a row at time t; fields missing from values are NaN"""
+        new = [k for k in values if k not in self.fields]
+        if new:
+            self.fields.extend(new)
+            self.data = np.hstack([self.data,
+                                   np.full((self.size, len(new)), np.nan)])
+        i = self.count % self.size
+        self.times[i] = t
+        self.data[i] = [values.get(f, np.nan) for f in self.fields]
+        self.count += 1
+
+    def window(self, start=None):
+        """Rows at or after time ``start`` (all if None), oldest first
+
+        Returns
+        -------
+        times: 1-d array
+        data: 2-d array, columns as ``fields``
+        """
+        n = len(self)
+        i = self.count % self.size
+        order = np.arange(i - n, i) % self.size
+        times, data = self.times[order], self.data[order]
+        if start is not None:
+            first = np.searchsorted(times, start)
+            times, data = times[first:], data[first:]
+        return times, data
+
+
+class Sampler(object):
+    """Samples cluster metrics, and the usage of apps, in a background thread
+
+    Each sample is one ``cluster_metrics()`` and (unless ``app_filters`` is
+    False) one ``apps_info()`` request; the numeric fields are kept in ring
+    buffers, so that memory use is fixed however long the sampler runs.
+
+    Use ``Sampler.shared`` so that all readers in a process share one
+    poller per RM.
+
+    Parameters
+    ----------
+    yarn_api: YARNAPI
+    interval: number
+        Seconds between samples
+    size: int
+        Number of cluster samples kept (the default, at 60s intervals, is a
+        week)
+    app_filters: dict, None or False
+        Filters for ``apps_info``, selecting which apps to sample; None for
+        the running apps, False to sample only the cluster
+    app_size: int
+        Number of samples kept for each app
+    max_apps: int
+        Number of apps kept; those least recently seen are dropped first
+
+    Examples
+    --------
+    >>> s = Sampler.shared(k.yarn_api, interval=10)  # doctest: +SKIP
+    >>> s.percentile('allocatedMB', 95, window=3600)
+    >>> s.headroom_trend('availableMB', window=600)
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, yarn_api, interval=60, size=10080,
+                 app_filters=None, app_size=1440, max_apps=100):
+        self.yarn_api = yarn_api
+        self.interval = interval
+        if app_filters is None:
+            app_filters = {'states': ['RUNNING']}
+        self.app_filters = app_filters
+        self.app_size = app_size
+        self.max_apps = max_apps
+        self.cluster = RingBuffer(size)
+        self.apps = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def shared(cls, yarn_api, **kwargs):
+        """The running sampler of the RM of yarn_api, made and started if
+        needed; kwargs apply only when it is made"""
+        with cls._shared_lock:
+            sampler = cls._shared.get(yarn_api.url)
+            if sampler is None or sampler._thread is None:
+                sampler = cls._shared[yarn_api.url] = cls(yarn_api, **kwargs)
+                sampler.start()
+            return sampler
+
+    @classmethod
+    def running(cls, yarn_api):
+        """The shared sampler of the RM of yarn_api, if one is running"""
+        with cls._shared_lock:
+            sampler = cls._shared.get(yarn_api.url)
+            return sampler if sampler and sampler._thread else None
+
+    def sample(self):
+        """Take one sample now"""
+        t = time.time()
+        metrics = numeric_fields(self.yarn_api.cluster_metrics())
+        apps = (self.yarn_api.apps_info(fresh=True, **self.app_filters)
+                if self.app_filters is not False else [])
+        with self._lock:
+            self.cluster.append(t, metrics)
+            for app in apps:
+                buf = self.apps.pop(app['id'], None)
+                if buf is None:
+                    buf = RingBuffer(self.app_size)
+                # most recently seen last
+                self.apps[app['id']] = buf
+                buf.append(t, numeric_fields(app))
+            while len(self.apps) > self.max_apps:
+                self.apps.popitem(last=False)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.sample()
+            except Exception:
+                logger.debug("Metrics sample failed", exc_info=1)
+            self._stopped.wait(self.interval)
+
+    def start(self):
+        """Sample in a background thread"""
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name='knit-metrics-sampler')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def series(self, field, window=None, app_id=None):
+        """Samples of one field
+
+        Parameters
+        ----------
+        field: str
+            E.g., 'availableMB' for the cluster, 'allocatedMB' for an app
+        window: number or None
+            Only samples from the last this many seconds
+        app_id: str or None
+            Samples of this app rather than of the cluster
+
+        Returns
+        -------
+        times, values: 1-d arrays, oldest first
+        """
+        with self._lock:
+            buf = self.cluster if app_id is None else self.apps.get(app_id)
+            if buf is None:
+                raise KeyError('No samples for app %s' % app_id)
+            start = None if window is None else time.time() - window
+            times, data = buf.window(start)
+            if field not in buf.fields:
+                raise KeyError('No samples of %s' % field)
+            return times, data[:, buf.fields.index(field)]
+
+    def rate(self, field, window=None, app_id=None):
+        """Average change of a field per second, e.g., of the cluster's
+        'appsCompleted' or an app's 'memorySeconds'; NaN with fewer than
+        two samples"""
+        times, values = self.series(field, window, app_id)
+        ok = ~np.isnan(values)
+        times, values = times[ok], values[ok]
+        if len(times) < 2 or times[-1] == times[0]:
+            return np.nan
+        return (values[-1] - values[0]) / (times[-1] - times[0])
+
+    def percentile(self, field, q, window=None, app_id=None):
+        """Percentile(s) q (0-100) of a field over the window"""
+        values = self.series(field, window, app_id)[1]
+        if np.isnan(values).all():
+            return np.nan
+        return np.nanpercentile(values, q)
+
+    def headroom_trend(self, field='availableMB', window=None):
+        """Linear trend of free cluster capacity
+
+        Returns
+        -------
+        current: float
+            Latest sample of the field
+        slope: float
+            Fitted change per second
+        exhausted: float
+            Seconds until the fit reaches zero (inf if not decreasing)
+        """
+        times, values = self.series(field, window)
+        ok = ~np.isnan(values)
+        times, values = times[ok], values[ok]
+        if len(times) < 2:
+            return (values[-1] if len(values) else np.nan), np.nan, np.inf
+        slope = np.polyfit(times - times[-1], values, 1)[0]
+        exhausted = values[-1] / -slope if slope < 0 else np.inf
+        return values[-1], slope, exhausted
@@ -0,0 +1,310 @@
+"""
+Models of whether YARN can schedule an application, checked before launch.
+"""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+# resources of the ApplicationMaster container, as requested by Client.scala
+AM_MEMORY = 300
+AM_VCORES = 1
+
+
+def normalize(memory, minimum):
+    """Memory YARN allocates for a request: a multiple of the minimum"""
+    minimum = max(int(minimum), 1)
+    return max(minimum, -(-int(memory) // minimum) * minimum)
+
+
+class Placement(object):
+    """Result of placing containers on nodes
+
+    Attributes
+    ----------
+    requested: int
+        Number of worker containers asked for
+    placed: int
+        Number of those which fit
+    nodes: dict
+        Node ID -> number of worker containers placed there
+    am_node: str or None
+        Node the ApplicationMaster was placed on, None if it did not fit
+    """
+
+    def __init__(self, requested, placed, nodes, am_node):
+        self.requested = requested
+        self.placed = placed
+        self.nodes = nodes
+        self.am_node = am_node
+
+    @property
+    def feasible(self):
+        """Whether the AM and all the containers fit"""
+        return self.am_node is not None and self.placed == self.requested
+
+    def __repr__(self):
+        return '<Placement: {0} of {1} containers on {2} nodes, AM: {3}>'.format(
+            self.placed, self.requested, len(self.nodes), self.am_node)
+
+
+def _first_fit(free_mb, free_vcores, num, memory, vcores):
+    """Place num identical containers, each on the first node with room
+
+    Updates the free arrays in place; returns the count on each node.
+    """
+    if vcores > 0:
+        fits = np.minimum(free_mb // memory, free_vcores // vcores)
+    else:
+        fits = free_mb // memory
+    fits = np.maximum(fits, 0)
+    # containers on each node, filling nodes in order
+    before = np.cumsum(fits) - fits
+    counts = np.clip(num - before, 0, fits)
+    free_mb -= counts * memory
+    free_vcores -= counts * vcores
+    return counts
+
+
+def place_containers(nodes, num_containers, memory, virtual_cores,
+                     min_memory=1024, am_memory=AM_MEMORY,
+                     am_vcores=AM_VCORES):
+    """Place an app's containers on the cluster, first-fit decreasing
+
+    All worker containers are the same size, so placing them one by one
+    in the first node with room comes to filling nodes in turn, which is
+    done for all nodes at once with array operations. The larger of the AM
+    and worker containers is placed first.
+
+    Parameters
+    ----------
+    nodes: list of dict
+        As returned by ``YARNAPI.nodes()``; only RUNNING nodes are used
+    num_containers: int
+        Number of worker containers
+    memory: int
+        MB for each worker container, before rounding up by YARN
+    virtual_cores: int
+        vcores for each worker container
+    min_memory: int
+        ``yarn.scheduler.minimum-allocation-mb``, to which YARN rounds
+        requests up
+    am_memory, am_vcores: int
+        Size of the ApplicationMaster container
+
+    Returns
+    -------
+    Placement
+    """
+    nodes = [n for n in nodes if n.get('state', 'RUNNING') == 'RUNNING']
+    ids = [n['id'] for n in nodes]
+    free_mb = np.fromiter((n['availMemoryMB'] for n in nodes), dtype='i8',
+                          count=len(nodes))
+    free_vcores = np.fromiter((n['availableVirtualCores'] for n in nodes),
+                              dtype='i8', count=len(nodes))
+    memory = normalize(memory, min_memory)
+    am_memory = normalize(am_memory, min_memory)
+
+    def place_am():
+        counts = _first_fit(free_mb, free_vcores, 1, am_memory, am_vcores)
+        where = np.flatnonzero(counts)
+        return ids[where[0]] if len(where) else None
+
+    if am_memory > memory:
+        am_node = place_am()
+    counts = _first_fit(free_mb, free_vcores, num_containers, memory,
+                        virtual_cores)
+    if am_memory <= memory:
+        am_node = place_am()
+    used = np.flatnonzero(counts)
+    return Placement(num_containers, int(counts.sum()),
+                     {ids[i]: int(counts[i]) for i in used}, am_node)
+
+
+def _children(queue):
+    """Sub-queues of a capacity or fair scheduler queue"""
+    children = queue.get('queues') or queue.get('childQueues') or []
+    if isinstance(children, dict):
+        children = children.get('queue', [])
+    return children
+
+
+def find_queue(root, name):
+    """The queue of the given name, or full dotted path, below root"""
+    stack = [root]
+    while stack:
+        q = stack.pop()
+        qname = q.get('queueName', '')
+        if '.' in qname:
+            # fair scheduler: full paths
+            found = name in (qname, qname.split('.')[-1])
+        else:
+            # capacity scheduler: leaf names, which are unique
+            found = qname == name.split('.')[-1]
+        if found:
+            return q
+        stack.extend(_children(q))
+    return None
+
+
+class QueueCapacity(object):
+    """Resources of a scheduler queue, in MB and vcores, for one user
+
+    Attributes
+    ----------
+    name, state: str
+    max_mb, max_vcores: int
+        Most the queue can ever use
+    available_mb, available_vcores: int
+        What the queue can use now, beyond its current usage
+    user_max_mb, user_available_mb: int
+        As above, for the submitting user's share of the queue
+    am_available_mb: int or None
+        Room left under the queue's limit on ApplicationMaster resources
+    pending_apps: int
+        Apps waiting in the queue already
+    """
+
+    def __init__(self, name, state, max_mb, max_vcores, used_mb, used_vcores,
+                 user_max_mb=None, user_used_mb=0, am_available_mb=None,
+                 pending_apps=0):
+        self.name = name
+        self.state = state
+        self.max_mb = int(max_mb)
+        self.max_vcores = int(max_vcores)
+        self.available_mb = int(max_mb - used_mb)
+        self.available_vcores = int(max_vcores - used_vcores)
+        self.user_max_mb = int(max_mb if user_max_mb is None
+                               else min(max_mb, user_max_mb))
+        self.user_available_mb = min(self.available_mb,
+                                     int(self.user_max_mb - user_used_mb))
+        self.am_available_mb = am_available_mb
+        self.pending_apps = pending_apps
+
+    def __repr__(self):
+        return '<Queue {0}: {1}/{2}MB available>'.format(
+            self.name, self.available_mb, self.max_mb)
+
+    def problems(self, memory, vcores, am_memory):
+        """Reasons an app needing these resources cannot run in the queue
+
+        Returns
+        -------
+        errors: list of str
+            Reasons it can never run
+        waits: list of str
+            Reasons it would wait for resources to be freed
+        """
+        errors, waits = [], []
+        if self.state != 'RUNNING':
+            errors.append('queue %s is %s' % (self.name, self.state))
+        if memory > self.max_mb:
+            errors.append('app needs %iMB, more than the maximum of queue '
+                          '%s (%iMB)' % (memory, self.name, self.max_mb))
+        elif memory > self.user_max_mb:
+            errors.append('app needs %iMB, more than the user limit of queue'
+                          ' %s (%iMB)' % (memory, self.name,
+                                          self.user_max_mb))
+        if vcores > self.max_vcores:
+            errors.append('app needs %i vcores, more than the maximum of '
+                          'queue %s (%i)' % (vcores, self.name,
+                                             self.max_vcores))
+        if errors:
+            return errors, waits
+        if memory > self.user_available_mb:
+            waits.append('app needs %iMB, but only %iMB of queue %s is free '
+                         'for this user' % (memory, self.user_available_mb,
+                                            self.name))
+        if vcores > self.available_vcores:
+            waits.append('app needs %i vcores, but only %i of queue %s are '
+                          'free' % (vcores, self.available_vcores, self.name))
+        if self.am_available_mb is not None and am_memory > \
+                self.am_available_mb:
+            waits.append('queue %s is at its limit of resources for '
+                         'ApplicationMasters (%iMB free)'
+                         % (self.name, self.am_available_mb))
+        if waits and self.pending_apps:
+            waits.append('%i apps already waiting in queue %s'
+                         % (self.pending_apps, self.name))
+        return errors, waits
+
+
+def queue_capacity(scheduler, queue, user, total_mb, total_vcores):
+    """Capacity of a queue, from ``YARNAPI.scheduler()``
+
+    Understands the capacity and fair schedulers; the FIFO scheduler has a
+    single queue with the whole cluster, and gives None.
+
+    Parameters
+    ----------
+    scheduler: dict
+        As returned by ``YARNAPI.scheduler()``
+    queue: str
+        Queue name, or dotted path
+    user: str
+        Submitting user, for the user limits
+    total_mb, total_vcores: int
+        Cluster totals, from ``YARNAPI.cluster_metrics()``
+
+    Returns
+    -------
+    QueueCapacity or None
+
+    Raises
+    ------
+    KeyError, if the queue does not exist
+    """
+    info = scheduler.get('schedulerInfo', {})
+    kind = info.get('type')
+    if kind == 'capacityScheduler':
+        q = find_queue(info, queue)
+        if q is None:
+            raise KeyError(queue)
+        frac = q.get('absoluteMaxCapacity', 100) / 100
+        used = q.get('resourcesUsed', {})
+        user_used = 0
+        users = (q.get('users') or {}).get('user', [])
+        for u in users:
+            if u.get('username') == user:
+                user_used = u.get('resourcesUsed', {}).get('memory', 0)
+        user_max = (q.get('absoluteCapacity', 100) / 100 * total_mb *
+                    q.get('userLimitFactor', 1))
+        am_free = None
+        if 'AMResourceLimit' in q:
+            am_free = (q['AMResourceLimit'].get('memory', 0) -
+                       q.get('usedAMResource', {}).get('memory', 0))
+        return QueueCapacity(q['queueName'], q.get('state', 'RUNNING'),
+                             frac * total_mb, frac * total_vcores,
+                             used.get('memory', 0), used.get('vCores', 0),
+                             user_max_mb=user_max, user_used_mb=user_used,
+                             am_available_mb=am_free,
+                             pending_apps=q.get('numPendingApplications', 0))
+    if kind == 'fairScheduler':
+        q = find_queue(info.get('rootQueue', {}), queue)
+        if q is None:
+            raise KeyError(queue)
+        most = q.get('maxResources', {})
+        used = q.get('usedResources', {})
+        am_free = None
+        if 'amMaxResources' in q:
+            am_free = (q['amMaxResources'].get('memory', 0) -
+                       q.get('amUsedResources', {}).get('memory', 0))
+        return QueueCapacity(q['queueName'], q.get('state', 'RUNNING'),
+                             min(most.get('memory', total_mb), total_mb),
+                             min(most.get('vCores', total_vcores),
+                                 total_vcores),
+                             used.get('memory', 0), used.get('vCores', 0),
+                             am_available_mb=am_free,
+                             pending_apps=q.get('numPendingApps', 0))
+    return None
+
+
+def estimate_wait(shortfall_mb, sampler, window=600):
+    """Seconds until shortfall_mb more memory is free, from the trend of
+    free cluster memory in a metrics sampler; None if not freeing up"""
+    try:
+        slope = sampler.headroom_trend('availableMB', window)[1]
+    except KeyError:
+        return None
+    if not slope > 0:
+        return None
+    return shortfall_mb / slope
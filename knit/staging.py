@@ -0,0 +1,179 @@
+"""
+Content-addressed staging of files in HDFS.
+
+Each file shipped with an app is stored at
+``<hdfs_home>/.knitDeps/<hash><ext>``, so that files of the same name but
+different content do not overwrite each other, and the same content is only
+uploaded once, whatever it is called locally. Containers see the file under
+its local name (see ``resource``); the extension is kept because YARN
+unpacks archives by it. Next to each uploaded file, ``<hash><ext>.name``
+records the local name it was uploaded from, for ``Knit.list_envs``.
+"""
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+STAGING_DIR = '.knitDeps'
+BLOCK_SIZE = 2**20
+NAME_SUFFIX = '.name'
+
+
+def file_hash(path, blocksize=BLOCK_SIZE):
+    """Hex SHA-256 of the content of a local file, read in blocks"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class HashCache(object):
+    """Hashes of local files, kept on disc so that large files are not
+    re-hashed while they are unchanged
+
+    Entries are keyed on the file's real path, size, modification time and
+    inode; changing any of these means hashing again.
+
+    Parameters
+    ----------
+    path: str or None
+        JSON file the hashes are kept in; None to keep them only in memory
+    max_entries: int
+        Number of files remembered; the oldest are forgotten first
+    """
+    _default = None
+
+    def __init__(self, path=None, max_entries=1000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @classmethod
+    def default(cls):
+        """The cache shared by this process, in ``~/.knit/hashes.json``"""
+        if cls._default is None:
+            cls._default = cls(os.path.join(os.path.expanduser('~'), '.knit',
+                                            'hashes.json'))
+        return cls._default
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            if self.path is not None:
+                try:
+                    with open(self.path) as f:
+                        self._entries = json.load(f)
+                except (IOError, OSError, ValueError):
+                    pass
+        return self._entries
+
+    def _save(self):
+        if self.path is None:
+            return
+        d = os.path.dirname(self.path)
+        try:
+            if not os.path.isdir(d):
+                os.makedirs(d)
+            # write and rename, so that readers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=d, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._entries, f)
+            os.rename(tmp, self.path)
+        except (IOError, OSError):
+            logger.debug('Could not save hash cache %s', self.path,
+                         exc_info=1)
+
+    @staticmethod
+    def _key(path):
+        path = os.path.realpath(path)
+        st = os.stat(path)
+        return path, [st.st_size, st.st_mtime, st.st_ino]
+
+    def hash(self, path):
+        """Hash of the file at path, from the cache if unchanged"""
+        key, stamp = self._key(path)
+        with self._lock:
+            entry = self._load().get(key)
+        if entry is not None and entry['stamp'] == stamp:
+            return entry['hash']
+        digest = file_hash(path)
+        with self._lock:
+            entries = self._load()
+            entries[key] = {'stamp': stamp, 'hash': digest,
+                            'order': max([e['order'] for e in
+                                          entries.values()] or [0]) + 1}
+            if len(entries) > self.max_entries:
+                oldest = sorted(entries, key=lambda k: entries[k]['order'])
+                for k in oldest[:len(entries) - self.max_entries]:
+                    del entries[k]
+            self._save()
+        return digest
+
+
+def extension(name):
+    """File extension, including compound ones like .tar.gz"""
+    for ext in ('.tar.gz', '.tar.bz2'):
+        if name.endswith(ext):
+            return ext
+    return os.path.splitext(name)[1]
+
+
+def staging_path(hdfs_home, path, digest):
+    """HDFS path at which a local file of the given hash is staged"""
+    return posixpath.join(hdfs_home, STAGING_DIR,
+                          digest + extension(os.path.basename(path)))
+
+
+def name_path(staged):
+    """HDFS path of the record of a staged file's local name"""
+    return staged + NAME_SUFFIX
+
+
+def resource(staged, name):
+    """Resource URL for the ApplicationMaster: a staged HDFS path, to appear
+    in containers under the given name"""
+    return 'hdfs://' + staged + '#' + name
+
+
+def summarize(stats):
+    """Totals of upload statistics, as reported by the JVM client
+
+    Parameters
+    ----------
+    stats: dict
+        Destination -> dict with ``size``, ``bytes``, ``resumed_from``,
+        ``seconds``, ``done`` and ``error``
+
+    Returns
+    -------
+    done: int
+        Bytes uploaded so far, including resumed ones
+    size: int
+        Bytes in all
+    rate: float
+        Bytes per second sent by this upload; files upload in parallel, so
+        this is the bytes sent over the longest time taken by one file
+    """
+    done = sum(s['bytes'] for s in stats.values())
+    size = sum(s['size'] for s in stats.values())
+    sent = sum(s['bytes'] - s['resumed_from'] for s in stats.values())
+    seconds = max([s['seconds'] for s in stats.values()] or [0])
+    return done, size, sent / seconds if seconds else 0.
+
+
+def log_progress(stats):
+    """Default progress callback of ``Knit.stage``: log the totals"""
+    done, size, rate = summarize(stats)
+    logger.info('Uploaded %.1f of %.1f MB to HDFS (%.1f MB/s)',
+                done / 2**20, size / 2**20, rate / 2**20)
@@ -0,0 +1,17 @@
+import sys
+
+import pytest
+
+from knit.tests.fake_yarn import FakeYARN
+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # coroutine syntax
+    collect_ignore.append('test_async_yarn_api.py')
+
+
+@pytest.fixture
+def fake():
+    """A stand-in RM and NodeManager, serving on localhost"""
+    with FakeYARN() as f:
+        yield f
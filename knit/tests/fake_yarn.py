@@ -0,0 +1,453 @@
+"""
+In-process stand-in for the YARN ResourceManager REST service.
+
+Only intended for tests and benchmarks: serves canned JSON for the endpoints
+that ``YARNAPI`` uses, and keeps count of requests and TCP connections so that
+connection reuse can be measured.
+"""
+from __future__ import absolute_import, division, print_function
+
+import json
+import re
+import socket
+import threading
+import time
+
+from knit.compatibility import escape
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit, parse_qs, urlencode
+except ImportError:  # pragma: no cover
+    # py2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit, parse_qs
+    from urllib import urlencode
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # tests open hundreds of connections at once; with the default backlog
+    # of 5, dropped SYNs are only retried after the client's timeout
+    request_queue_size = 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive, so that clients may reuse connections
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes; don't let Nagle hold the
+    # second back waiting for an ACK
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.fake._count('connections')
+        self.server.fake._sockets.add(self.connection)
+
+    def finish(self):
+        self.server.fake._sockets.discard(self.connection)
+        BaseHTTPRequestHandler.finish(self)
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, method):
+        parsed = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, out = self.server.fake.handle(
+            method, parsed.path, parse_qs(parsed.query), body)
+        if 300 <= status < 400:
+            # out is the redirect location
+            self.send_response(status)
+            self.send_header('Location', out)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if isinstance(out, str):
+            data, ctype = out.encode(), 'text/html'
+        else:
+            data, ctype = json.dumps(out).encode(), 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_PUT(self):
+        self._respond('PUT')
+
+
+def _app_num(container_id):
+    """'<timestamp>_<app number>' of a container ID"""
+    parts = container_id.split('_')[1:]
+    if parts[0].startswith('e'):
+        parts = parts[1:]
+    return '_'.join(parts[:2])
+
+
+def _not_found(message):
+    return 404, {'RemoteException': {'exception': 'NotFoundException',
+                                     'message': message}}
+
+
+class FakeYARN(object):
+    """Minimal ResourceManager REST server, running in a background thread
+
+    Parameters
+    ----------
+    host: str
+        Interface to listen on
+    port: int
+        Port to listen on; 0 picks a free one
+
+    Attributes
+    ----------
+    apps: dict
+        app-id -> app info dict, as returned by the RM
+    metrics: dict
+        as returned by ``cluster/metrics``
+    nodes: list of dict
+        as returned by ``cluster/nodes``
+    containers: dict
+        container-id -> container info dict, as returned by a NodeManager
+    container_logs: dict
+        container-id -> {log-type: text}
+    counts: dict
+        number of ``requests`` served and ``connections`` accepted
+    delay: float
+        Seconds to wait before answering each request, to simulate network
+        and RM latency
+    ha_state: str
+        Reported by ``cluster/info``. Unless 'ACTIVE', the other RM
+        endpoints redirect to ``active_rm`` (if set), as a standby RM does.
+    active_rm: str or None
+        "host:port" of the active RM, for a standby to redirect to
+
+    Examples
+    --------
+    >>> with FakeYARN() as fake:  # doctest: +SKIP
+    ...     yarn = YARNAPI(fake.host, fake.port)
+    ...     yarn.cluster_metrics()
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.apps = {}
+        self.metrics = {'activeNodes': 1, 'availableMB': 8192,
+                        'availableVirtualCores': 8, 'totalMB': 8192,
+                        'totalVirtualCores': 8, 'allocatedMB': 0,
+                        'allocatedVirtualCores': 0, 'appsRunning': 0}
+        self.nodes = []
+        self.containers = {}
+        self.container_logs = {}
+        # container IDs by node ID and by app number, for quick lookup
+        self._node_index = {}
+        self._app_index = {}
+        self.scheduler = {'schedulerInfo': {'type': 'fifoScheduler'}}
+        self.counts = {'requests': 0, 'connections': 0}
+        self.delay = 0
+        self.ha_state = 'ACTIVE'
+        self.active_rm = None
+        self._lock = threading.Lock()
+        self._sockets = set()
+        self.server = _Server((host, port), _Handler)
+        self.server.fake = self
+        self.host, self.port = self.server.server_address[:2]
+        self._thread = None
+        self.rm_container_reports = True
+        self.add_node('localhost:45454')
+        self.routes = [
+            ('GET', r'/ws/v1/cluster/?(?:info/?)?$', self._cluster_info),
+            ('GET', r'/ws/v1/cluster/metrics/?$', self._metrics),
+            ('GET', r'/ws/v1/cluster/scheduler/?$', self._scheduler),
+            ('GET', r'/ws/v1/cluster/appstatistics/?$', self._app_stats),
+            ('GET', r'/ws/v1/cluster/nodes/?$', self._nodes),
+            ('GET', r'/ws/v1/cluster/apps/?$', self._apps),
+            ('GET', r'/ws/v1/cluster/apps/([^/]+)/?$', self._app),
+            ('GET', r'/ws/v1/cluster/apps/([^/]+)/state/?$', self._state),
+            ('PUT', r'/ws/v1/cluster/apps/([^/]+)/state/?$',
+             self._set_state),
+            ('GET', r'/ws/v1/cluster/apps/([^/]+)/appattempts/?$',
+             self._app_attempts),
+            ('GET', r'/ws/v1/cluster/apps/([^/]+)/appattempts/[^/]+/'
+                    r'containers/?$', self._attempt_containers),
+            ('GET', r'/ws/v1/cluster/apps/[^/]+/appattempts/[^/]+/'
+                    r'containers/([^/]+)/?$', self._container_report),
+            # NodeManager endpoints, optionally under /nm/<node-id>
+            ('GET', r'(?:/nm/([^/]+))?/ws/v1/node/containers/?$',
+             self._node_containers),
+            ('GET', r'(?:/nm/[^/]+)?/node/containerlogs/([^/]+)/[^/]+/'
+                    r'([^/]+)/?$', self._container_log),
+        ]
+
+    @property
+    def address(self):
+        return '{0}:{1}'.format(self.host, self.port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        # also drop kept-alive connections, as a crashed server would
+        for sock in list(self._sockets):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def add_app(self, app_id, name='knit', state='RUNNING', **info):
+        """Register an application with the fake RM"""
+        info.update(id=app_id, name=name, state=state)
+        info.setdefault('startedTime', int(time.time() * 1000))
+        info.setdefault('amHostHttpAddress', self.address)
+        self.apps[app_id] = info
+        return info
+
+    def add_node(self, node_id, memory=8192, vcores=8, state='RUNNING'):
+        """Register a NodeManager with the fake RM
+
+        All NodeManagers are served by this same server, each under the path
+        prefix /nm/<node-id>, which is included in its HTTP address.
+        """
+        info = {'id': node_id, 'nodeHostName': node_id.split(':')[0],
+                'nodeHTTPAddress': '{0}/nm/{1}'.format(self.address, node_id),
+                'state': state, 'availMemoryMB': memory,
+                'availableVirtualCores': vcores, 'usedMemoryMB': 0,
+                'usedVirtualCores': 0}
+        self.nodes.append(info)
+        return info
+
+    def add_container(self, container_id, node_id='localhost:45454',
+                      state='RUNNING', **logs):
+        """Register a container with the fake NodeManager of the given node
+
+        Any keyword arguments are log-type: text for the container's logs.
+        """
+        info = {'id': container_id, 'state': state, 'nodeId': node_id,
+                'user': 'knit', 'containerLogsLink': 'http://{0}/nm/{1}/node/'
+                'containerlogs/{2}/knit'.format(self.address, node_id,
+                                                container_id)}
+        self.containers[container_id] = info
+        self.container_logs[container_id] = logs
+        self._node_index.setdefault(node_id, set()).add(container_id)
+        self._app_index.setdefault(_app_num(container_id), set()).add(
+            container_id)
+        return info
+
+    def populate(self, nodes=1, apps=0, containers=0, log_size=0,
+                 memory=8192, vcores=8):
+        """Make a synthetic cluster, replacing any nodes, apps and containers
+
+        Parameters
+        ----------
+        nodes: int
+            Number of NodeManagers
+        apps: int
+            Number of running apps
+        containers: int
+            Number of containers of each app (including the AM), spread over
+            the nodes in turn
+        log_size: int
+            Bytes in each of the stdout and stderr logs of each container
+        memory, vcores: int
+            Capacity of each node
+
+        Returns
+        -------
+        list of app IDs
+        """
+        self.nodes = []
+        self.apps = {}
+        self.containers = {}
+        self.container_logs = {}
+        self._node_index = {}
+        self._app_index = {}
+        for i in range(nodes):
+            self.add_node('node%05d:45454' % i, memory=memory, vcores=vcores)
+        self.metrics.update(activeNodes=nodes, totalMB=nodes * memory,
+                            availableMB=nodes * memory,
+                            totalVirtualCores=nodes * vcores,
+                            availableVirtualCores=nodes * vcores,
+                            appsRunning=apps)
+        line = 'INFO a line of logging from the container\n'
+        text = (line * (log_size // len(line) + 1))[:log_size]
+        app_ids = []
+        k = 0
+        for a in range(apps):
+            app_id = 'application_1_%04d' % (a + 1)
+            self.add_app(app_id, user='knit', startedTime=1 + a,
+                         allocatedMB=containers * 1024,
+                         allocatedVCores=containers)
+            app_ids.append(app_id)
+            for c in range(containers):
+                node = self.nodes[k % nodes]['id']
+                k += 1
+                self.add_container('container_1_%04d_01_%06d' % (a + 1, c + 1),
+                                   node, stdout=text, stderr=text)
+        return app_ids
+
+    def handle(self, method, path, query, body):
+        """Dispatch a request; returns (HTTP status, JSON-able object)"""
+        self._count('requests')
+        if self.delay:
+            time.sleep(self.delay)
+        if (self.ha_state != 'ACTIVE' and path.startswith('/ws/v1/cluster')
+                and not re.match(self.routes[0][1], path)):
+            if self.active_rm is None:
+                return 503, {'RemoteException': {
+                    'exception': 'StandbyException',
+                    'message': 'This is a standby RM'}}
+            return 307, 'http://{0}{1}?{2}'.format(
+                self.active_rm, path, urlencode(query, doseq=True))
+        for meth, pattern, func in self.routes:
+            if meth != method:
+                continue
+            m = re.match(pattern, path)
+            if m:
+                return func(query, body, *m.groups())
+        return _not_found('No such endpoint: ' + path)
+
+    def _cluster_info(self, query, body):
+        return 200, {'clusterInfo': {'state': 'STARTED',
+                                     'haState': self.ha_state}}
+
+    def _metrics(self, query, body):
+        return 200, {'clusterMetrics': self.metrics}
+
+    def _scheduler(self, query, body):
+        return 200, {'scheduler': self.scheduler}
+
+    def _app_stats(self, query, body):
+        stats = {}
+        for app in self.apps.values():
+            stats[app['state']] = stats.get(app['state'], 0) + 1
+        return 200, {'appStatInfo': {'statItem': [
+            {'state': k, 'type': '*', 'count': v} for k, v in stats.items()]}}
+
+    def _nodes(self, query, body):
+        return 200, {'nodes': {'node': self.nodes}}
+
+    def _apps(self, query, body):
+        apps = list(self.apps.values())
+        for field, key in [('states', 'state'), ('user', 'user'),
+                           ('queue', 'queue'), ('name', 'name'),
+                           ('applicationTypes', 'applicationType')]:
+            if field in query:
+                allowed = query[field][0].split(',')
+                apps = [a for a in apps if a.get(key) in allowed]
+        if 'startedTimeBegin' in query:
+            begin = int(query['startedTimeBegin'][0])
+            apps = [a for a in apps if a.get('startedTime', 0) >= begin]
+        if 'limit' in query:
+            apps = apps[:int(query['limit'][0])]
+        return 200, {'apps': {'app': apps} if apps else None}
+
+    def _app(self, query, body, app_id):
+        if app_id not in self.apps:
+            return _not_found('app with id: %s not found' % app_id)
+        return 200, {'app': self.apps[app_id]}
+
+    def _set_state(self, query, body, app_id):
+        if app_id not in self.apps:
+            return _not_found('app with id: %s not found' % app_id)
+        app = self.apps[app_id]
+        target = json.loads(body.decode())['state']
+        if target != 'KILLED':
+            return 400, {'RemoteException': {
+                'exception': 'BadRequestException',
+                'message': 'Only KILLED state is supported'}}
+        if app['state'] in ('FINISHED', 'FAILED', 'KILLED'):
+            return 200, {'state': app['state']}
+        app['state'] = 'KILLED'
+        return 202, {'state': 'RUNNING'}
+
+    def _container_report(self, query, body, container_id):
+        if container_id not in self.containers:
+            return _not_found('container with id: %s not found'
+                              % container_id)
+        c = self.containers[container_id]
+        return 200, {'container': {
+            'containerId': c['id'], 'containerState': c['state'],
+            'assignedNodeId': c['nodeId'], 'nodeId': c['nodeId'],
+            'logUrl': c['containerLogsLink'], 'allocatedMB': 1024,
+            'allocatedVCores': 1}}
+
+    def _app_attempts(self, query, body, app_id):
+        if app_id not in self.apps:
+            return _not_found('app with id: %s not found' % app_id)
+        if self.apps[app_id]['state'] in ('NEW', 'NEW_SAVING', 'SUBMITTED'):
+            return 200, {'appAttempts': {'appAttempt': []}}
+        ts, num = app_id.split('_')[1:]
+        return 200, {'appAttempts': {'appAttempt': [{
+            'id': 1, 'appAttemptId': 'appattempt_%s_%s_000001' % (ts, num),
+            'nodeId': self.nodes[0]['id'],
+            'nodeHttpAddress': self.nodes[0]['nodeHTTPAddress']}]}}
+
+    def _attempt_containers(self, query, body, app_id):
+        if not self.rm_container_reports:
+            return 404, 'Not Found'
+        if app_id not in self.apps:
+            return _not_found('app with id: %s not found' % app_id)
+        num = '_'.join(app_id.split('_')[1:])
+        return 200, {'container': [
+            self._container_report(query, body, c)[1]['container']
+            for c in sorted(self._app_index.get(num, ()))]}
+
+    def _node_containers(self, query, body, node_id=None):
+        if node_id is None:
+            cs = list(self.containers.values())
+        else:
+            cs = [self.containers[c]
+                  for c in sorted(self._node_index.get(node_id, ()))]
+        return 200, {'containers': {'container': cs} if cs else None}
+
+    def _container_log(self, query, body, container_id, ltype):
+        # the page of the NM's ContainerLogsPage, for the whole file or,
+        # after a note, part of it; or only a heading
+        logs = self.container_logs.get(container_id, {})
+        if ltype not in logs:
+            content = '<h1>Cannot find this log on the local disk.</h1>'
+        else:
+            data = logs[ltype].encode('utf-8')
+            start = int(query.get('start', ['0'])[0])
+            if start > len(data):
+                content = ('<h1>Invalid start and end values. Start: [%i], '
+                           'end[%i]</h1>' % (start, len(data)))
+            else:
+                content = ''
+                if start > 0:
+                    content = (
+                        '<p>Showing %i bytes. Click <a href="/node/'
+                        'containerlogs/%s/knit/%s/?start=0">here</a> for '
+                        'full log</p>\n          ' % (len(data) - start,
+                                                      container_id, ltype))
+                content += '<pre>%s</pre>' % escape(
+                    data[start:].decode('utf-8'))
+        return 200, ('<html><table><tr><td class="content">\n          %s'
+                     '\n        </td></tr></table></html>' % content)
+
+    def _state(self, query, body, app_id):
+        if app_id not in self.apps:
+            return _not_found('app with id: %s not found' % app_id)
+        return 200, {'state': self.apps[app_id]['state']}
@@ -0,0 +1,253 @@
+import io
+import struct
+import zlib
+
+import pytest
+
+from knit.aggregated_logs import (AggregatedLog, MAGIC, read_vlong,
+                                  read_app_logs)
+from knit.tests.fake_yarn import FakeYARN
+from knit.yarn_api import YARNAPI
+
+
+def write_vlong(n):
+    """As org.apache.hadoop.io.file.tfile.Utils.writeVLong"""
+    if -32 <= n < 128:
+        return struct.pack('>b', n)
+    un = ~n if n < 0 else n
+    size = un.bit_length() // 8 + 1
+    first = n >> ((size - 1) * 8)
+    if size <= 2:
+        if size == 1:
+            first >>= 8
+        if -20 <= first < 20:
+            return struct.pack('>bB', first - 52, n & 0xff)
+        first >>= 8
+        size = 3
+    if size == 3:
+        if -16 <= first < 16:
+            return struct.pack('>bH', first - 88, n & 0xffff)
+        first >>= 8
+        size = 4
+    if size == 4:
+        if -8 <= first < 8:
+            return struct.pack('>bHB', first - 112, (n >> 8) & 0xffff,
+                               n & 0xff)
+        return struct.pack('>bi', size - 129, n)
+    return struct.pack('>b', size - 129) + struct.pack('>q', n)[8 - size:]
+
+
+def write_string(s):
+    b = s.encode('utf-8')
+    return write_vlong(len(b)) + b
+
+
+def utf(s):
+    b = s.encode('utf-8')
+    return struct.pack('>H', len(b)) + b
+
+
+def chunked(value, size):
+    pieces = [value[i:i + size] for i in range(0, len(value), size)] or [b'']
+    out = [write_vlong(-len(p)) + p for p in pieces[:-1]]
+    out.append(write_vlong(len(pieces[-1])) + pieces[-1])
+    return b''.join(out)
+
+
+def container_value(logs):
+    return b''.join(utf(ltype) + utf(str(len(data))) + data
+                    for ltype, data in logs)
+
+
+def write_tfile(records, compression='none', block_records=2, chunk=7):
+    """A TFile of (key, value) records, as written by YARN's log
+    aggregation"""
+    compress = (lambda b: b) if compression == 'none' else zlib.compress
+    out = b''
+    blocks, last_keys = [], []
+    for i in range(0, len(records), block_records):
+        recs = records[i:i + block_records]
+        raw = b''.join(write_vlong(len(utf(k))) + utf(k) + chunked(v, chunk)
+                       for k, v in recs)
+        comp = compress(raw)
+        blocks.append((len(out), len(comp), len(raw)))
+        last_keys.append((utf(recs[-1][0]), len(recs)))
+        out += comp
+    first = utf(records[0][0])
+    first = write_vlong(len(first)) + first
+    tindex = write_vlong(len(first)) + first
+    for key, count in last_keys:
+        entry = write_vlong(len(key)) + key + write_vlong(count)
+        tindex += write_vlong(len(entry)) + entry
+    bindex = write_string(compression) + write_vlong(len(blocks))
+    for region in blocks:
+        bindex += b''.join(write_vlong(x) for x in region)
+    metas = []
+    for name, raw in [('TFile.index', tindex), ('BCFile.index', bindex)]:
+        comp = compress(raw)
+        metas.append((name, (len(out), len(comp), len(raw))))
+        out += comp
+    meta_offset = len(out)
+    out += write_vlong(len(metas))
+    for name, region in metas:
+        out += (write_string('data:' + name) + write_string(compression) +
+                b''.join(write_vlong(x) for x in region))
+    return out + struct.pack('>qhh', meta_offset, 1, 0) + MAGIC
+
+
+def app_records(n=5):
+    records = [('VERSION', struct.pack('>i', 1)),
+               ('APPLICATION_OWNER', utf('knit'))]
+    for i in range(n):
+        cid = 'container_1_0001_01_%06d' % (i + 1)
+        records.append((cid, container_value([
+            ('stderr', ('err %d\n' % i).encode() * (i + 1)),
+            ('stdout', (u'out %d \xe9\n' % i).encode('utf-8')),
+            ('empty', b'')])))
+    return records
+
+
+@pytest.mark.parametrize('n', [0, 1, -1, 127, 128, -32, -33, -129, 1000,
+                               -1000, 2**20, -2**20, 2**23, 2**31 - 1,
+                               -2**31, 2**40, -2**50, 2**63 - 1, -2**63])
+def test_vlong(n):
+    data = write_vlong(n)
+    stream = io.BytesIO(data)
+    assert read_vlong(stream) == n
+    assert stream.tell() == len(data)
+
+
+@pytest.mark.parametrize('compression', ['none', 'gz'])
+def test_read(compression):
+    f = io.BytesIO(write_tfile(app_records(), compression))
+    log = AggregatedLog(f)
+    cids = ['container_1_0001_01_%06d' % (i + 1) for i in range(5)]
+    assert log.containers() == cids
+    assert log.log_types(cids[2]) == {'stderr': 18, 'stdout': 9,
+                                      'empty': 0}
+    assert log.read(cids[2], 'stderr') == b'err 2\n' * 3
+    assert log.read(cids[2], 'stdout') == u'out 2 \xe9\n'.encode('utf-8')
+    assert log.read(cids[2], 'empty') == b''
+    with pytest.raises(KeyError):
+        log.read(cids[2], 'syslog')
+    with pytest.raises(KeyError):
+        log.read('container_1_0001_01_000009', 'stderr')
+
+    out = list(log.iter_logs(containers=cids[3:], log_types=['stdout']))
+    assert out == [(c, 'stdout', u'out {0} \xe9\n'.format(i).encode('utf-8'))
+                   for i, c in zip([3, 4], cids[3:])]
+    assert len(list(log.iter_logs())) == 15
+
+
+def test_read_block_end_without_scan():
+    f = io.BytesIO(write_tfile(app_records()))
+    log = AggregatedLog(f)
+    # the last record of the second block
+    assert log.read('container_1_0001_01_000002', 'stderr') == b'err 1\n' * 2
+    assert log._positions is None
+    assert log.read('container_1_0001_01_000001', 'stderr') == b'err 0\n'
+    assert log._positions is not None
+
+
+def test_not_tfile():
+    with pytest.raises(IOError):
+        AggregatedLog(io.BytesIO(b'x' * 100))
+
+
+def test_app_logs(tmpdir):
+    records = app_records(4)
+    logdir = tmpdir.mkdir('logs').mkdir('knit').mkdir('logs').mkdir(
+        'application_1_0001')
+    logdir.join('node1_45454').write_binary(
+        write_tfile(records[:4], 'gz'))
+    logdir.join('node2_45454').write_binary(
+        write_tfile(records[:2] + records[4:]))
+    logdir.join('node3_45454.tmp').write_binary(b'incomplete')
+
+    logs = read_app_logs(str(logdir), log_types=['stderr'])
+    assert sorted(logs) == ['container_1_0001_01_%06d' % (i + 1)
+                            for i in range(4)]
+    assert logs['container_1_0001_01_000004'] == {
+        'nodeId': 'node2:45454', 'stderr': 'err 3\n' * 4}
+
+    with FakeYARN() as fake:
+        fake.add_app('application_1_0001', state='FINISHED', user='knit')
+        y = YARNAPI(fake.host, fake.port)
+        y.remote_log_dir = str(tmpdir.join('logs'))
+        logs = y.aggregated_logs('application_1_0001',
+                                 containers=['container_1_0001_01_000001'])
+        assert logs == {'container_1_0001_01_000001': {
+            'nodeId': 'node1:45454', 'stderr': 'err 0\n',
+            'stdout': u'out 0 \xe9\n', 'empty': ''}}
+
+    with pytest.raises(IOError):
+        read_app_logs(str(tmpdir.mkdir('empty')))
+
+
+def test_indexed_file(tmpdir):
+    import hashlib
+    logdir = tmpdir.mkdir('application_1_0001')
+    # an IFile starts with the SHA-256 of the app ID
+    logdir.join('node1_45454').write_binary(
+        hashlib.sha256(b'application_1_0001').digest() + b'x' * 100)
+    with pytest.raises(IOError) as e:
+        read_app_logs(str(logdir))
+    assert 'IndexedFile' in str(e.value)
+    with pytest.raises(IOError) as e:
+        read_app_logs(str(logdir), containers=['container_1_0001_01_000001'])
+    assert 'IndexedFile' in str(e.value)
+
+
+class CountingFS(object):
+    """The local filesystem, counting the bytes read from each file"""
+
+    def __init__(self):
+        self.reads = {}
+
+    def ls(self, path):
+        import os
+        return [os.path.join(path, fn) for fn in os.listdir(path)]
+
+    def open(self, path, mode):
+        fs = self
+        f = open(path, mode)
+
+        class Counting(object):
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                f.close()
+
+            def seek(self, *args):
+                return f.seek(*args)
+
+            def tell(self):
+                return f.tell()
+
+            def read(self, n=-1):
+                data = f.read(n)
+                fs.reads[path] = fs.reads.get(path, 0) + len(data)
+                return data
+        return Counting()
+
+
+def test_read_located_only(tmpdir):
+    records = app_records(30)
+    fn = tmpdir.join('node1_45454')
+    fn.write_binary(write_tfile(records, block_records=4))
+    other = tmpdir.join('node2_45454')
+    other.write_binary(write_tfile(app_records(60)[32:], block_records=4))
+    fs = CountingFS()
+    # the last of the fifth block
+    logs = read_app_logs(str(tmpdir), fs,
+                         containers=['container_1_0001_01_000018'])
+    assert logs['container_1_0001_01_000018']['stderr'] == 'err 17\n' * 18
+    # walking every record header of each file costs far more
+    walk = CountingFS()
+    for path in (fn, other):
+        with walk.open(str(path), 'rb') as f:
+            for _ in AggregatedLog(f)._records():
+                pass
+    assert fs.reads[str(other)] * 4 < walk.reads[str(other)]
+    assert fs.reads[str(fn)] * 1.5 < walk.reads[str(fn)]
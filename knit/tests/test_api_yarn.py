@@ -1,8 +1,12 @@
+import io
 import os
 import pytest
 
-from knit.yarn_api import YARNAPI
+from knit.yarn_api import (ACTIVE_STATES, YARNAPI, parse_cli_logs,
+                           iter_cli_logs, collect_cli_logs,
+                           container_parents)
 from knit.exceptions import YARNException
+from knit.tests.fake_yarn import FakeYARN
 
 
 @pytest.yield_fixture
@@ -38,3 +42,311 @@ def test_syslogs(y):
     out = y.system_logs()
     assert 'rm_proc' in out
     assert out['single_node']
+
+
+def test_connection_reuse(fake):
+    fake.add_app('application_1_0001')
+    y = YARNAPI(fake.host, fake.port)
+    for i in range(10):
+        assert y.state('application_1_0001') == 'RUNNING'
+        y.cluster_metrics()
+    assert y.nodes()[0]['state'] == 'RUNNING'
+    assert fake.counts['requests'] == 21
+    assert fake.counts['connections'] == 1
+    y.close()
+
+
+def test_fake_errors(fake):
+    y = YARNAPI(fake.host, fake.port)
+    with pytest.raises(YARNException):
+        y.state('noapp')
+    assert y.apps == []
+
+
+def test_concurrent_logs(fake):
+    import threading
+    import time
+    app_id = 'application_1_0001'
+    fake.add_app(app_id)
+    for i in range(40):
+        fake.add_container('container_1_0001_01_%06i' % i,
+                           node_id='node%i:45454' % (i % 4),
+                           stdout='out %i' % i, stderr='err %i' % i)
+    fake.add_container('container_1_0001_01_999999', stdout='broken')
+    fake.add_container('container_2_0001_01_000001', stdout='other app')
+
+    in_flight = {}
+    peak = {}
+    lock = threading.Lock()
+    orig = fake._container_log
+
+    def slow_log(query, body, container_id, ltype):
+        if container_id.endswith('999999') and ltype == 'stderr':
+            return 500, 'Internal error'
+        node = fake.containers[container_id]['nodeId']
+        with lock:
+            in_flight[node] = in_flight.get(node, 0) + 1
+            peak[node] = max(peak.get(node, 0), in_flight[node])
+        time.sleep(0.01)
+        with lock:
+            in_flight[node] -= 1
+        return orig(query, body, container_id, ltype)
+
+    fake.routes[-1] = fake.routes[-1][:2] + (slow_log,)
+    y = YARNAPI(fake.host, fake.port)
+    logs = y.logs(app_id, per_node=2)
+    assert len(logs) == 41
+    assert logs['container_1_0001_01_000007'] == {
+        'nodeId': 'node3:45454', 'stdout': 'out 7', 'stderr': 'err 7'}
+    broken = logs['container_1_0001_01_999999']
+    assert broken['stdout'] == 'broken'
+    assert list(broken['errors']) == ['stderr']
+    assert max(peak.values()) <= 2
+
+
+def test_follow_logs(fake):
+    app_id = 'application_1_0001'
+    fake.add_app(app_id)
+    fake.add_container('container_1_0001_01_000001', stdout='one\ntw')
+    y = YARNAPI(fake.host, fake.port)
+    gen = y.follow_logs(app_id, interval=0)
+    assert next(gen) == ('container_1_0001_01_000001', 'stdout', 'one')
+
+    fake.container_logs['container_1_0001_01_000001']['stdout'] += 'o\n<3\n'
+    assert next(gen) == ('container_1_0001_01_000001', 'stdout', 'two')
+    assert next(gen) == ('container_1_0001_01_000001', 'stdout', '<3')
+
+    # text like the NM's page for a missing file is followed as any other
+    fake.container_logs['container_1_0001_01_000001']['stderr'] = (
+        'Cannot find this log\n')
+    assert next(gen) == ('container_1_0001_01_000001', 'stderr',
+                         'Cannot find this log')
+
+    # a file now shorter than the offset gives the NM's "Invalid start and
+    # end values" page: no new text, until the file grows past the offset
+    fake.container_logs['container_1_0001_01_000001']['stdout'] = 'x'
+    fake.container_logs['container_1_0001_01_000001']['stderr'] += 'end'
+    fake.apps[app_id]['state'] = 'FINISHED'
+    # the unterminated line is flushed once the app stops
+    assert list(gen) == [('container_1_0001_01_000001', 'stderr', 'end')]
+
+
+cli_output = b"""
+
+Container: container_1_0001_01_000001 on node1.example.com_45454
+==================================================================
+LogType:stderr
+Log Upload Time:Mon Jan 01 00:00:00 +0000 2018
+LogLength:21
+Log Contents:
+Container: fake
+err 
+End of LogType:stderr
+
+LogType:stdout
+Log Upload Time:Mon Jan 01 00:00:00 +0000 2018
+LogLength:0
+Log Contents:
+End of LogType:stdout
+
+LogType:prelaunch.out
+LogLength:9
+Log Contents:
+caf\xc3\xa9 ok
+End of LogType:prelaunch.out
+
+Container: container_1_0001_01_000002 on node2_45454
+=====================================================
+LogType:stdout
+LogUploadTime:Mon Jan 01 00:00:00 +0000 2018
+Log Contents:
+old style
+no length
+LogType:stderr
+Log Contents:
+
+"""
+
+
+def test_parse_cli_logs():
+    logs = parse_cli_logs(cli_output)
+    assert logs == {
+        'container_1_0001_01_000001': {
+            'nodeId': 'node1.example.com_45454', 'stdout': '',
+            'stderr': 'Container: fake\nerr \n',
+            'prelaunch.out': u'caf\xe9 ok\n'},
+        'container_1_0001_01_000002': {
+            'nodeId': 'node2_45454', 'stdout': 'old style\nno length\n',
+            'stderr': '\n'}}
+    # small chunks, split mid-character
+    records = list(iter_cli_logs(io.BytesIO(cli_output), chunksize=4))
+    assert max(len(r[3]) for r in records if r[1] == 'node1.example.com_45454'
+               ) <= 4
+    assert collect_cli_logs(records) == logs
+
+
+def test_filtered_apps(fake):
+    for i in range(20):
+        fake.add_app('application_1_%04i' % i, user='u%i' % (i % 2),
+                     state=['RUNNING', 'FINISHED'][i % 4 == 0],
+                     name=['knit', 'other'][i % 3 == 0], startedTime=i)
+    y = YARNAPI(fake.host, fake.port)
+    assert len(y.apps_info()) == 20
+    assert len(y.apps_info(states=['FINISHED'])) == 5
+    apps = y.apps_info(states=['RUNNING', 'ACCEPTED'], user='u1',
+                       startedTimeBegin=10)
+    assert [a['id'][-2:] for a in apps] == ['11', '13', '15', '17', '19']
+    assert len(y.apps_info(name='knit', limit=3)) == 3
+
+
+def test_kill_all(fake):
+    for i in range(20):
+        fake.add_app('application_1_%04i' % i,
+                     state=['RUNNING', 'FINISHED'][i % 4 == 0],
+                     name=['knit', 'other'][i % 3 == 0])
+    y = YARNAPI(fake.host, fake.port)
+    killed = []
+    y.kill = lambda app_id: killed.append(app_id) or True
+    out = y.kill_all()
+    assert fake.counts['requests'] == 1
+    assert sorted(killed) == sorted(out) == [
+        'application_1_%04i' % i for i in range(20) if i % 4 and i % 3]
+    assert all(out.values())
+
+
+def test_container_parents():
+    assert container_parents('container_e17_1452274436693_0001_02_000004') == (
+        'application_1452274436693_0001', 'appattempt_1452274436693_0001_000002')
+
+
+def test_rest_kill(fake):
+    fake.add_app('application_1_0001')
+    fake.add_app('application_1_0002', state='FINISHED')
+    y = YARNAPI(fake.host, fake.port, username='knit')
+    assert y.kill('application_1_0001')
+    assert y.state('application_1_0001') == 'KILLED'
+    assert y.kill('application_1_0002')
+    assert y.state('application_1_0002') == 'FINISHED'
+
+
+def test_kill_invalidates(fake):
+    fake.add_app('application_1_0001')
+    y = YARNAPI(fake.host, fake.port, cache={'state': 60, 'apps_info': 60})
+    assert y.apps_info(states=ACTIVE_STATES)[0]['state'] == 'RUNNING'
+    assert y.state('application_1_0001') == 'RUNNING'
+    assert y.kill('application_1_0001')
+    assert y.apps_info(states=ACTIVE_STATES) == []
+    assert y.state('application_1_0001') == 'KILLED'
+
+
+def test_rest_container_info(fake):
+    fake.add_container('container_1_0001_01_000002', node_id='node1:45454')
+    y = YARNAPI(fake.host, fake.port)
+    out = y.container_info('container_1_0001_01_000002')
+    assert out['containerState'] == 'RUNNING'
+    assert out['assignedNodeId'] == 'node1:45454'
+
+
+@pytest.mark.parametrize('rm_reports', [True, False])
+def test_containers_all_nodes(fake, rm_reports):
+    fake.rm_container_reports = rm_reports
+    app_id = 'application_1_0001'
+    fake.add_app(app_id)
+    for i in range(1, 5):
+        fake.add_node('node%i:45454' % i)
+    fake.nodes[-1]['state'] = 'LOST'
+    for i in range(12):
+        fake.add_container('container_1_0001_01_%06i' % (i + 1),
+                           node_id='node%i:45454' % (i % 3 + 1))
+    fake.add_container('container_1_0002_01_000001')
+    y = YARNAPI(fake.host, fake.port)
+    for i in range(2):
+        containers = y.app_containers(app_id)
+        assert sorted(c['id'] for c in containers) == [
+            'container_1_0001_01_%06i' % (i + 1) for i in range(12)]
+        assert set(c['nodeId'] for c in containers) == {
+            'node1:45454', 'node2:45454', 'node3:45454'}
+        assert all(c['containerLogsLink'] for c in containers)
+    # what the RM supports, and the node list, are remembered
+    assert y._rm_container_reports is rm_reports
+    assert y._node_list is None if rm_reports else len(y._node_list[1]) == 4
+
+
+def test_containers_unknown_app(fake):
+    fake.add_app('application_1_0001')
+    fake.add_app('application_1_0002', state='SUBMITTED')
+    fake.add_container('container_1_0001_01_000001')
+    y = YARNAPI(fake.host, fake.port)
+    # no attempt yet
+    assert y.app_containers('application_1_0002') == []
+    # the RM does not know the app: an error, not a missing endpoint
+    y.app_attempts = lambda app_id: [
+        {'appAttemptId': 'appattempt_1_0009_000001'}]
+    with pytest.raises(YARNException):
+        y.app_containers('application_1_0009')
+    assert y._rm_container_reports is None
+    del y.app_attempts
+    assert len(y.app_containers('application_1_0001')) == 1
+    assert y._rm_container_reports is True
+
+
+def test_rm_failover():
+    rm1 = FakeYARN().start()
+    with FakeYARN() as rm2:
+        rm2.ha_state = 'STANDBY'
+        rm2.active_rm = rm1.address
+        rm2.add_app('application_1_0001')
+        y = YARNAPI(rm1.host, rm1.port, rm_ha=[rm1.address, rm2.address])
+        assert y.cluster_metrics()
+        assert y.host_port == rm1.address
+
+        rm1.stop()
+        rm2.ha_state = 'ACTIVE'
+        assert y.state('application_1_0001') == 'RUNNING'
+        assert y.host_port == rm2.address
+        # later calls go straight to the new active RM
+        count = rm2.counts['requests']
+        assert y.apps == ['application_1_0001']
+        assert rm2.counts['requests'] == count + 1
+        # ... and so do those of new instances
+        y2 = YARNAPI(rm1.host, rm1.port, rm_ha=[(rm1.host, rm1.port),
+                                                (rm2.host, rm2.port)])
+        assert y2.host_port == rm2.address
+
+
+def test_rm_standby_redirect():
+    with FakeYARN() as active, FakeYARN() as standby:
+        standby.ha_state = 'STANDBY'
+        standby.active_rm = active.address
+        active.add_app('application_1_0001')
+        dead = '127.0.0.1:1'
+        y = YARNAPI(standby.host, standby.port,
+                    rm_ha=[dead, standby.address, active.address])
+        assert y.apps == ['application_1_0001']
+        assert y.host_port == active.address
+        count = standby.counts['requests']
+        assert y.kill('application_1_0001')
+        assert active.apps['application_1_0001']['state'] == 'KILLED'
+        assert standby.counts['requests'] == count
+
+        # no active RM at all: errors surface, current RM is kept
+        active.ha_state = 'STANDBY'
+        standby.active_rm = None
+        assert y.find_active_rm() is None
+        assert y.host_port == active.address
+
+
+def test_synthetic_cluster(fake):
+    app_ids = fake.populate(nodes=50, apps=3, containers=20, log_size=1000)
+    y = YARNAPI(fake.host, fake.port)
+    assert len(y.nodes()) == 50
+    assert y.cluster_metrics()['totalMB'] == 50 * 8192
+    assert y.apps == app_ids
+    assert len(y.app_containers(app_ids[1])) == 20
+    fake.rm_container_reports = False
+    containers = y.app_containers(app_ids[1])
+    assert len(containers) == 20
+    assert len({c['nodeId'] for c in containers}) == 20
+    logs = y.logs(app_ids[2])
+    assert len(logs) == 20
+    assert all(len(log['stderr']) == 1000 for log in logs.values())
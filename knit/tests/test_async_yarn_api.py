@@ -0,0 +1,161 @@
+import asyncio
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from knit.async_yarn_api import AsyncYARNAPI, KerberosAuth
+from knit.exceptions import YARNException
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_same_surface(fake):
+    fake.add_app('application_1_0001')
+
+    async def f():
+        async with AsyncYARNAPI(fake.host, fake.port) as y:
+            assert await y.apps() == ['application_1_0001']
+            assert await y.apps_info(states=['FINISHED']) == []
+            assert (await y.status('application_1_0001'))['name'] == 'knit'
+            assert await y.state('application_1_0001') == 'RUNNING'
+            assert (await y.cluster_metrics())['activeNodes'] == 1
+            assert (await y.nodes())[0]['state'] == 'RUNNING'
+            assert await y.cluster_info()
+            with pytest.raises(YARNException):
+                await y.state('noapp')
+
+    run(f())
+
+
+def test_many_in_flight(fake):
+    ids = ['application_1_%04i' % i for i in range(300)]
+    for app_id in ids:
+        fake.add_app(app_id, state='ACCEPTED')
+
+    async def f():
+        async with AsyncYARNAPI(fake.host, fake.port, limit=100) as y:
+            return await asyncio.gather(*[y.state(a) for a in ids])
+
+    assert run(f()) == ['ACCEPTED'] * 300
+    assert fake.counts['connections'] <= 100
+
+
+def test_queued_requests_do_not_time_out(fake):
+    ids = ['application_1_%04i' % i for i in range(40)]
+    for app_id in ids:
+        fake.add_app(app_id)
+    fake.delay = 0.1
+
+    async def f():
+        # one connection: the last request waits ~4s, longer than the
+        # timeout, before it is sent
+        async with AsyncYARNAPI(fake.host, fake.port, limit=1) as y:
+            return await asyncio.gather(*[y.state(a) for a in ids])
+
+    assert run(f()) == ['RUNNING'] * 40
+
+
+def test_container_log_errors(fake):
+    app_id = 'application_1_0001'
+    fake.add_app(app_id)
+    fake.add_container('container_1_0001_01_000001', stdout='out',
+                       stderr='err')
+    fake.add_container('container_1_0001_01_000002', stdout='broken')
+    log_route = [i for i, r in enumerate(fake.routes)
+                 if r[2] == fake._container_log][0]
+
+    def broken_log(query, body, container_id, ltype):
+        if container_id.endswith('2') and ltype == 'stderr':
+            return 500, 'Internal error'
+        return fake._container_log(query, body, container_id, ltype)
+
+    fake.routes[log_route] = fake.routes[log_route][:2] + (broken_log, )
+
+    async def f():
+        async with AsyncYARNAPI(fake.host, fake.port) as y:
+            return await y.logs(app_id)
+
+    logs = run(f())
+    assert logs['container_1_0001_01_000001'] == {
+        'nodeId': 'localhost:45454', 'stdout': 'out', 'stderr': 'err'}
+    broken = logs['container_1_0001_01_000002']
+    assert broken['stdout'] == 'broken'
+    assert list(broken['errors']) == ['stderr']
+
+
+@pytest.mark.parametrize('rm_reports', [True, False])
+def test_containers_all_nodes(fake, rm_reports):
+    fake.rm_container_reports = rm_reports
+    app_id = 'application_1_0001'
+    fake.add_app(app_id)
+    fake.add_app('application_1_0002', state='SUBMITTED')
+    for i in range(1, 4):
+        fake.add_node('node%i:45454' % i)
+    for i in range(6):
+        fake.add_container('container_1_0001_01_%06i' % (i + 1),
+                           node_id='node%i:45454' % (i % 3 + 1))
+
+    async def f():
+        async with AsyncYARNAPI(fake.host, fake.port) as y:
+            assert await y.app_containers('application_1_0002') == []
+            containers = await y.app_containers(app_id)
+            assert y._rm_container_reports is rm_reports
+            return containers
+
+    containers = run(f())
+    assert sorted(c['id'] for c in containers) == [
+        'container_1_0001_01_%06i' % (i + 1) for i in range(6)]
+    assert set(c['nodeId'] for c in containers) == {
+        'node1:45454', 'node2:45454', 'node3:45454'}
+
+
+def test_kill(fake):
+    for i in range(6):
+        fake.add_app('application_1_%04i' % i,
+                     state=['RUNNING', 'FINISHED'][i % 3 == 0],
+                     name=['knit', 'other'][i == 4])
+
+    async def f():
+        async with AsyncYARNAPI(fake.host, fake.port, username='knit') as y:
+            assert await y.kill('application_1_0000')
+            out = await y.kill_all()
+            assert await y.state('application_1_0004') == 'RUNNING'
+            return out
+
+    assert run(f()) == {'application_1_0001': True,
+                        'application_1_0002': True,
+                        'application_1_0005': True}
+    assert [a['state'] for _, a in sorted(fake.apps.items())] == [
+        'FINISHED', 'KILLED', 'KILLED', 'FINISHED', 'RUNNING', 'KILLED']
+
+
+def test_container_info(fake):
+    fake.add_container('container_1_0001_01_000002', node_id='node1:45454')
+
+    async def f():
+        async with AsyncYARNAPI(fake.host, fake.port) as y:
+            return await y.container_info('container_1_0001_01_000002')
+
+    out = run(f())
+    assert out['containerState'] == 'RUNNING'
+    assert out['assignedNodeId'] == 'node1:45454'
+
+
+def test_kerberos_header():
+    class Handler(object):
+        """Stands in for requests_kerberos.HTTPKerberosAuth"""
+
+        def generate_request_header(self, response, host,
+                                    is_preemptive=False):
+            assert response is None and is_preemptive
+            return 'Negotiate token-for-' + host
+
+    auth = KerberosAuth(Handler())
+    assert auth('rm.example.com') == {
+        'Authorization': 'Negotiate token-for-rm.example.com'}
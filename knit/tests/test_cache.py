@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from knit.cache import TTLCache
+from knit.exceptions import YARNException
+from knit.yarn_api import YARNAPI
+
+
+def test_ttl(fake):
+    y = YARNAPI(fake.host, fake.port, cache={'cluster_metrics': 0.2})
+    for i in range(5):
+        y.cluster_metrics()
+        y.nodes()  # not cached
+    assert fake.counts['requests'] == 6
+    assert y.cache.stats == {'hits': 4, 'misses': 1, 'coalesced': 0}
+    time.sleep(0.25)
+    y.cluster_metrics()
+    assert fake.counts['requests'] == 7
+    y.invalidate('cluster_metrics')
+    y.cluster_metrics()
+    assert fake.counts['requests'] == 8
+
+
+def test_keyed_by_args(fake):
+    fake.add_app('application_1_0001')
+    fake.add_app('application_1_0002', state='ACCEPTED')
+    y = YARNAPI(fake.host, fake.port, cache={'state': 10})
+    assert y.state('application_1_0001') == 'RUNNING'
+    assert y.state('application_1_0002') == 'ACCEPTED'
+    assert y.state('application_1_0001') == 'RUNNING'
+    assert fake.counts['requests'] == 2
+    # errors are not cached
+    for i in range(2):
+        with pytest.raises(YARNException):
+            y.state('noapp')
+    assert fake.counts['requests'] == 4
+
+
+def test_fresh_polls(fake):
+    app_id = 'application_1_0001'
+    fake.add_app(app_id)
+    fake.add_container('container_1_0001_01_000001', stdout='out\n')
+    y = YARNAPI(fake.host, fake.port, cache={'state': 60, 'apps_info': 60})
+    assert y.state(app_id) == 'RUNNING'
+    fake.apps[app_id]['state'] = 'FINISHED'
+    assert y.state(app_id) == 'RUNNING'
+    assert y.state(app_id, fresh=True) == 'FINISHED'
+    # the fresh result replaces the cached one
+    assert y.state(app_id) == 'FINISHED'
+
+    # loops waiting for the app to end see it end, whatever is cached
+    fake.apps[app_id]['state'] = 'RUNNING'
+    y.invalidate()
+    assert y.state(app_id) == 'RUNNING'
+    gen = y.follow_logs(app_id, interval=0)
+    assert next(gen) == ('container_1_0001_01_000001', 'stdout', 'out')
+    fake.apps[app_id]['state'] = 'FINISHED'
+    assert list(gen) == []
+
+
+def test_coalesce_shared(fake):
+    fake.delay = 0.2
+    cache = TTLCache(10)
+    apis = [YARNAPI(fake.host, fake.port, cache=cache) for i in range(50)]
+    threads = [threading.Thread(target=y.cluster_metrics) for y in apis]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    apis[0].cluster_metrics()
+    assert fake.counts['requests'] == 1
+    assert cache.stats['misses'] == 1
+    assert cache.stats['coalesced'] + cache.stats['hits'] == 50
+
+
+def test_eviction():
+    cache = TTLCache({'state': 0.1}, max_entries=5)
+    for i in range(10):
+        cache.get('state', i, lambda: i)
+    # the oldest are dropped
+    assert len(cache) == 5
+    assert cache.get('state', 9, lambda: None) == 9
+    assert cache.get('state', 0, lambda: None) is None
+    time.sleep(0.15)
+    # expired entries are swept when the next result is stored
+    cache.get('state', 'new', lambda: 1)
+    assert len(cache) == 1
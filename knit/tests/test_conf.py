@@ -43,6 +43,20 @@ def test_infer_extra_params():
     config = {'yarn.resourcemanager.webapp.https.address': 'address.com:1111'}
     extra = infer_extra_params(config)
     assert extra['rm_port_https'] == 1111
+    assert 'rm_ha' not in extra
+
+    # == resourcemanager HA ==
+    config = {'yarn.resourcemanager.ha.enabled': 'true',
+              'yarn.resourcemanager.ha.rm-ids': 'rm1, rm2',
+              'yarn.resourcemanager.hostname.rm1': 'one.com',
+              'yarn.resourcemanager.hostname.rm2': 'two.com',
+              'yarn.resourcemanager.webapp.address.rm2': 'two.com:1111'}
+    extra = infer_extra_params(config)
+    assert extra['rm_ha'] == [('one.com', DEFAULTS['rm_port']),
+                              ('two.com', 1111)]
+    assert extra['rm_ha_https'] == [('one.com', DEFAULTS['rm_port_https']),
+                                    ('two.com', DEFAULTS['rm_port_https'])]
+    assert (extra['rm'], extra['rm_port']) == extra['rm_ha'][0]
 
 
 def test_get_config():
@@ -7,6 +7,7 @@ import socket
 
 from knit import Knit, zip_path
 from knit.exceptions import YARNException, KnitException
+from knit.staging import file_hash, staging_path
 
 
 def check_docker():
@@ -214,8 +215,11 @@ def test_hdfs_home():
         k.start('env', files=[env_zip], memory=128)
 
         assert d + '/.knitDeps' in hdfs.ls(d, False)
-        assert d + "/.knitDeps/knit-1.0-SNAPSHOT.jar" in hdfs.ls(d + '/.knitDeps', False)
-        assert d + "/.knitDeps/dev.zip" in hdfs.ls(d + '/.knitDeps', False)
+        staged = hdfs.ls(d + '/.knitDeps', False)
+        # staged by content, as .knitDeps/<sha256><ext>
+        jar = k.JAR_FILE_PATH
+        assert staging_path(d, jar, file_hash(jar)) in staged
+        assert staging_path(d, env_zip, file_hash(env_zip)) in staged
         if not k.wait_for_completion(30):
             k.kill()
 
@@ -330,8 +334,9 @@ def test_kill_all(k):
     # this is really a yarn api test
     cmd = "sleep 100"
     k.start(cmd, num_containers=1)
-    # kill all knit apps
-    k.yarn_api.kill_all()
+    # kill all apps named "knit", which includes this one
+    out = k.yarn_api.kill_all(knit_only=True)
+    assert out[k.app_id]
     time.sleep(2)
     assert k.runtime_status() == 'KILLED'
 
@@ -0,0 +1,146 @@
+import json
+import os
+import stat
+import threading
+
+import pytest
+
+from knit import daemon
+from knit.daemon import ClientDaemon, SharedClient, launch_client
+from knit.exceptions import KnitException
+from knit.watcher import wait_until
+
+
+def test_no_jar(tmpdir):
+    with pytest.raises(KnitException):
+        launch_client(str(tmpdir.join('missing.jar')))
+
+
+def test_one_handle_per_daemon(tmpdir):
+    jar = str(tmpdir.join('knit.jar'))
+    d = ClientDaemon.get(jar, state_dir=str(tmpdir))
+    assert ClientDaemon.get(jar, state_dir=str(tmpdir)) is d
+    d2 = ClientDaemon.get(str(tmpdir.join('other.jar')),
+                          state_dir=str(tmpdir))
+    assert d2 is not d
+    assert d2.state_path != d.state_path
+    assert os.path.dirname(d.state_path) == str(tmpdir)
+    # the same JAR, with its state elsewhere, is another daemon
+    d3 = ClientDaemon.get(jar, state_dir=str(tmpdir.join('other')))
+    assert d3 is not d
+    assert d3.state_path != d.state_path
+
+
+def test_stale_state(tmpdir):
+    d = ClientDaemon(str(tmpdir.join('knit.jar')), state_dir=str(tmpdir))
+    # the state of a daemon which has exited
+    with open(d.state_path, 'w') as f:
+        json.dump({'pid': 2**22 + 1, 'port': 1}, f)
+    assert d._read_state()['port'] == 1
+    # a new daemon is needed, but there is no JAR to start it
+    with pytest.raises(KnitException):
+        d.acquire()
+    assert d.refs == 0 and d.gateway is None
+    d.release()
+    assert d.refs == 0
+    d.stop()
+    assert not os.path.exists(d.state_path)
+
+
+class Proc(object):
+    pid = os.getpid()
+
+
+class EntryPoint(object):
+    """Records the calls of a ClientDaemon"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name,) + args)
+
+
+class DaemonGateway(object):
+    def __init__(self):
+        self.entry_point = EntryPoint()
+
+    def close(self):
+        pass
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='POSIX file modes')
+def test_private_state(tmpdir, monkeypatch):
+    launched = []
+
+    def launch(jar, args=(), **kwargs):
+        launched.append(args)
+        return Proc(), 1234, 'secret'
+    monkeypatch.setattr(daemon, 'launch_client', launch)
+    monkeypatch.setattr(daemon, 'connect_gateway',
+                        lambda port, token: DaemonGateway())
+    state_dir = str(tmpdir.join('knit'))
+    d = ClientDaemon(str(tmpdir.join('knit.jar')), state_dir=state_dir,
+                     lease_timeout=30)
+    d._connect()
+    assert '--leaseTimeout' in launched[0]
+    assert stat.S_IMODE(os.stat(state_dir).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(d.state_path).st_mode) == 0o600
+    assert d._read_state() == {'pid': os.getpid(), 'port': 1234,
+                               'token': 'secret'}
+
+
+def test_heartbeat(tmpdir, monkeypatch):
+    d = ClientDaemon(str(tmpdir.join('knit.jar')), state_dir=str(tmpdir),
+                     lease_timeout=0.1)
+    gateway = DaemonGateway()
+    monkeypatch.setattr(d, '_connect', lambda: gateway)
+    calls = gateway.entry_point.calls
+    d.acquire()
+    d.acquire()
+    wait_until(lambda: ('heartbeat', os.getpid(), 2) in calls, timeout=5)
+    d.release()
+    d.release()
+    d._heartbeat.join(5)
+    assert not d._heartbeat.is_alive()
+    assert calls[-1] == ('detach', os.getpid())
+
+
+class Gateway(object):
+    entry_point = 'client'
+
+
+class CountingClient(SharedClient):
+    """Counts JVM starts and stops, without a JVM"""
+
+    def __init__(self, jar):
+        super(CountingClient, self).__init__(jar)
+        self.started = self.stopped = 0
+
+    def _connect(self):
+        self.started += 1
+        return Gateway()
+
+    def _disconnect(self):
+        self.stopped += 1
+
+
+def test_shared_between_threads(tmpdir):
+    c = CountingClient.get(str(tmpdir.join('knit.jar')))
+    assert CountingClient.get(str(tmpdir.join('knit.jar'))) is c
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(c.acquire()))
+               for i in range(20)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert out == ['client'] * 20
+    assert c.started == 1 and c.refs == 20
+    for i in range(19):
+        c.release()
+    assert c.stopped == 0
+    c.release()
+    assert c.stopped == 1 and c.gateway is None
+    c.release()
+    assert c.refs == 0
+    c.acquire()
+    assert c.started == 2
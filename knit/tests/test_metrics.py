@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+import pytest
+
+from knit.metrics import RingBuffer, Sampler
+from knit.yarn_api import YARNAPI
+from knit.watcher import wait_until
+
+
+def test_ring_buffer():
+    buf = RingBuffer(4, ['a'])
+    for i in range(6):
+        buf.append(i, {'a': i * 10})
+    buf.append(6, {'a': 60, 'b': 1})
+    times, data = buf.window()
+    assert len(buf) == 4
+    assert times.tolist() == [3, 4, 5, 6]
+    assert data[:, 0].tolist() == [30, 40, 50, 60]
+    assert np.isnan(data[:3, 1]).all() and data[3, 1] == 1
+    times, data = buf.window(start=4.5)
+    assert times.tolist() == [5, 6]
+
+
+def test_sampler(fake):
+    fake.add_app('application_1_0001', allocatedMB=1024, memorySeconds=0,
+                 user='knit', startedTime=1)
+    s = Sampler(YARNAPI(fake.host, fake.port), size=5, app_size=3)
+    for i in range(8):
+        fake.metrics['availableMB'] = 8192 - 1000 * i
+        fake.apps['application_1_0001']['memorySeconds'] = 100 * i
+        s.sample()
+        time.sleep(0.01)
+    times, values = s.series('availableMB')
+    assert values.tolist() == [8192 - 1000 * i for i in range(3, 8)]
+    assert s.percentile('availableMB', 50) == 8192 - 5000
+    assert s.rate('memorySeconds', app_id='application_1_0001') > 0
+    assert len(s.series('allocatedMB', app_id='application_1_0001')[0]) == 3
+
+    current, slope, exhausted = s.headroom_trend()
+    assert current == 1192
+    assert slope < 0
+    assert 0 < exhausted < 1
+    with pytest.raises(KeyError):
+        s.series('allocatedMB', app_id='application_1_0002')
+
+
+def test_max_apps(fake):
+    s = Sampler(YARNAPI(fake.host, fake.port), max_apps=2)
+    for i in range(4):
+        fake.add_app('application_1_%04d' % i)
+        s.sample()
+    assert list(s.apps) == ['application_1_0002', 'application_1_0003']
+
+
+def test_app_filters(fake):
+    fake.add_app('application_1_0001')
+    fake.add_app('application_1_0002', state='FINISHED')
+    y = YARNAPI(fake.host, fake.port)
+    s = Sampler(y)
+    s.sample()
+    assert list(s.apps) == ['application_1_0001']
+    assert Sampler(y).app_filters is not s.app_filters
+    s = Sampler(y, app_filters=False)
+    s.sample()
+    assert not s.apps and len(s.cluster) == 1
+
+
+def test_shared(fake):
+    y = YARNAPI(fake.host, fake.port)
+    s = Sampler.shared(y, interval=0.01)
+    try:
+        assert Sampler.shared(YARNAPI(fake.host, fake.port)) is s
+        wait_until(lambda: len(s.cluster) > 2, 5, min_interval=0.01)
+        assert len(s.cluster) > 2
+    finally:
+        s.stop()
+    assert Sampler.shared(y, interval=10) is not s
+    Sampler.shared(y).stop()
@@ -0,0 +1,159 @@
+import time
+
+import pytest
+import requests
+
+from knit.core import Knit
+from knit.exceptions import KnitException
+from knit.tests.fake_yarn import FakeYARN
+from knit.preflight import normalize, place_containers, queue_capacity
+
+
+def node(i, mb, vcores, state='RUNNING'):
+    return {'id': 'node%i:45454' % i, 'availMemoryMB': mb,
+            'availableVirtualCores': vcores, 'state': state}
+
+
+def test_normalize():
+    assert normalize(128, 1024) == 1024
+    assert normalize(1025, 1024) == 2048
+    assert normalize(2048, 512) == 2048
+
+
+def test_place_containers():
+    nodes = [node(0, 3000, 8), node(1, 8192, 2), node(2, 8192, 8, 'LOST'),
+             node(3, 4096, 8)]
+    p = place_containers(nodes, 4, 2000, 1)
+    # 1 + 2 (vcore bound) + 2, minus the AM's 1024MB
+    assert p.placed == 4
+    assert p.nodes == {'node0:45454': 1, 'node1:45454': 2,
+                       'node3:45454': 1}
+    assert p.am_node == 'node3:45454'
+    assert p.feasible
+
+    # fits in total memory, but not container by container
+    p = place_containers(nodes, 6, 2000, 1)
+    assert p.placed == 5
+    assert not p.feasible
+
+    # larger AM is placed first
+    p = place_containers([node(0, 2048, 8), node(1, 4096, 8)], 3, 1024, 1,
+                         am_memory=4000)
+    assert p.am_node == 'node1:45454'
+    assert p.nodes == {'node0:45454': 2}
+    assert not p.feasible
+
+
+def test_large_cluster():
+    nodes = [node(i, 8192 * (i % 3), 8) for i in range(5000)]
+    t0 = time.time()
+    p = place_containers(nodes, 10000, 1500, 1)
+    assert time.time() - t0 < 0.5
+    assert p.placed == 10000
+    assert p.am_node is not None
+
+
+def test_pre_flight(tmpdir):
+    with FakeYARN() as fake:
+        fake.populate(nodes=4, memory=4096, vcores=4)
+        k = Knit(autodetect=False, rm=fake.host, rm_port=fake.port,
+                 user='knit', replication_factor=1)
+        k._pre_flight_checks(7, 1, 1024, [], 'default')
+        assert k.placement(7, 1, 1024).feasible
+        # fits the totals, but 3GB containers only fit one to a node
+        with pytest.raises(KnitException) as e:
+            k._pre_flight_checks(5, 1, 3000, [], 'default')
+        assert 'Only 4 of the 5' in str(e.value)
+        with pytest.raises(KnitException) as e:
+            k._pre_flight_checks(1, 1, 5000, [], 'default')
+        assert 'No NodeManager' in str(e.value)
+
+
+def capacity_scheduler(used=0, state='RUNNING', am_used=0):
+    leaf = {'type': 'capacitySchedulerLeafQueueInfo', 'queueName': 'small',
+            'state': state, 'capacity': 25.0, 'absoluteCapacity': 25.0,
+            'absoluteMaxCapacity': 50.0, 'userLimitFactor': 1.0,
+            'resourcesUsed': {'memory': used, 'vCores': used // 1024},
+            'numPendingApplications': 2,
+            'AMResourceLimit': {'memory': 2048, 'vCores': 1},
+            'usedAMResource': {'memory': am_used, 'vCores': 1},
+            'users': {'user': [{'username': 'knit',
+                                'resourcesUsed': {'memory': used}}]}}
+    default = dict(leaf, queueName='default', absoluteCapacity=75.0,
+                   absoluteMaxCapacity=100.0, users=None)
+    return {'schedulerInfo': {'type': 'capacityScheduler',
+                              'queueName': 'root', 'queues': {
+                                  'queue': [default, leaf]}}}
+
+
+def test_capacity_scheduler_queue():
+    cap = queue_capacity(capacity_scheduler(used=1024), 'small', 'knit',
+                         16384, 16)
+    assert (cap.max_mb, cap.available_mb) == (8192, 7168)
+    assert cap.user_max_mb == 4096
+    assert cap.user_available_mb == 3072
+    assert cap.am_available_mb == 2048
+    assert cap.problems(3000, 2, 1024) == ([], [])
+    errors, waits = cap.problems(5000, 2, 1024)
+    assert 'user limit' in errors[0]
+    errors, waits = cap.problems(4000, 2, 1024)
+    assert not errors and '3072MB' in waits[0]
+    assert '2 apps already waiting' in waits[-1]
+
+    cap = queue_capacity(capacity_scheduler(state='STOPPED'), 'root.small',
+                         'knit', 16384, 16)
+    assert 'STOPPED' in cap.problems(1024, 1, 1024)[0][0]
+    with pytest.raises(KeyError):
+        queue_capacity(capacity_scheduler(), 'big', 'knit', 16384, 16)
+
+
+def test_fair_scheduler_queue():
+    sched = {'schedulerInfo': {'type': 'fairScheduler', 'rootQueue': {
+        'queueName': 'root', 'childQueues': {'queue': [{
+            'queueName': 'root.etl',
+            'maxResources': {'memory': 4096, 'vCores': 4},
+            'usedResources': {'memory': 1024, 'vCores': 1},
+            'numPendingApps': 0}]}}}}
+    cap = queue_capacity(sched, 'etl', 'knit', 16384, 16)
+    assert (cap.max_mb, cap.available_mb, cap.available_vcores) == (
+        4096, 3072, 3)
+    assert queue_capacity({'schedulerInfo': {'type': 'fifoScheduler'}},
+                          'default', 'knit', 16384, 16) is None
+
+
+def test_pre_flight_queue(caplog):
+    with FakeYARN() as fake:
+        fake.populate(nodes=4, memory=4096, vcores=4)
+        k = Knit(autodetect=False, rm=fake.host, rm_port=fake.port,
+                 user='knit', replication_factor=1)
+        fake.scheduler = capacity_scheduler(used=3072)
+        with pytest.raises(KnitException) as e:
+            k._pre_flight_checks(1, 1, 1024, [], 'nosuch')
+        assert 'No such queue' in str(e.value)
+        with pytest.raises(KnitException) as e:
+            k._pre_flight_checks(4, 1, 1024, [], 'small')
+        assert 'user limit' in str(e.value)
+        # fits the queue, but not while its other apps run
+        k._pre_flight_checks(2, 1, 1024, [], 'small')
+        assert 'will wait in queue small' in caplog.text
+
+
+def test_pre_flight_queue_advisory(caplog, monkeypatch):
+    with FakeYARN() as fake:
+        fake.populate(nodes=4, memory=4096, vcores=4)
+        k = Knit(autodetect=False, rm=fake.host, rm_port=fake.port,
+                 user='knit', replication_factor=1)
+        fake.scheduler = None  # not understood
+        k._pre_flight_checks(1, 1, 1024, [], 'default')
+        assert 'Could not check queue default' in caplog.text
+        with pytest.raises(AttributeError):
+            k._pre_flight_checks(1, 1, 1024, [], 'default', strict=True)
+
+        def fail():
+            raise requests.ConnectionError('refused')
+        monkeypatch.setattr(k.yarn_api, 'scheduler', fail)
+        caplog.clear()
+        k._pre_flight_checks(1, 1, 1024, [], 'default')
+        assert 'refused' in caplog.text
+        with pytest.raises(requests.ConnectionError):
+            k._pre_flight_checks(1, 1, 1024, [], 'default', strict=True)
@@ -0,0 +1,377 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from knit import core, staging
+from knit.core import Knit
+from knit.daemon import SharedClient
+from knit.exceptions import KnitException
+from knit.staging import (HashCache, file_hash, resource, staging_path,
+                          summarize)
+from knit.tracing import LaunchTrace
+from knit.utils import run_in_thread
+from knit.watcher import wait_until
+
+
+class LocalHDFS(object):
+    """The parts of hdfs3.HDFileSystem used by Knit, on a local directory"""
+
+    def __init__(self, root):
+        self.root = str(root)
+        self.calls = []
+
+    def _local(self, path):
+        return os.path.join(self.root, path.lstrip('/'))
+
+    def exists(self, path):
+        self.calls.append('exists')
+        return os.path.exists(self._local(path))
+
+    def info(self, path):
+        self.calls.append('info')
+        return self._info(path)
+
+    def _info(self, path):
+        st = os.stat(self._local(path))
+        kind = 'directory' if os.path.isdir(self._local(path)) else 'file'
+        return {'name': path, 'size': st.st_size, 'kind': kind,
+                'last_mod': st.st_mtime}
+
+    def ls(self, path, detail=False):
+        self.calls.append('ls')
+        out = [self._info(path.rstrip('/') + '/' + name)
+               for name in sorted(os.listdir(self._local(path)))]
+        return out if detail else [o['name'] for o in out]
+
+    def open(self, path, mode='rb'):
+        self.calls.append('open')
+        return open(self._local(path), mode)
+
+    def cat(self, path):
+        self.calls.append('cat')
+        with open(self._local(path), 'rb') as f:
+            return f.read()
+
+    def put(self, local, path):
+        d = os.path.dirname(self._local(path))
+        if not os.path.isdir(d):
+            os.makedirs(d)
+        with open(local, 'rb') as f, open(self._local(path), 'wb') as out:
+            out.write(f.read())
+
+
+@pytest.fixture
+def knit(tmpdir):
+    k = Knit(autodetect=False, rm='localhost', rm_port=8088, user='knit',
+             replication_factor=1, hdfs_home='/user/knit', hdfs=LocalHDFS(tmpdir.mkdir('hdfs')))
+    k.hash_cache = HashCache()
+    yield k
+
+
+@pytest.mark.parametrize('name,ext', [('env.zip', '.zip'),
+                                      ('data.tar.gz', '.tar.gz'),
+                                      ('script', '')])
+def test_staging_path(name, ext):
+    assert staging_path('/user/knit', '/tmp/' + name, 'abc') == \
+        '/user/knit/.knitDeps/abc' + ext
+    assert resource('/user/knit/.knitDeps/abc' + ext, name) == \
+        'hdfs:///user/knit/.knitDeps/abc%s#%s' % (ext, name)
+
+
+def test_file_hash(tmpdir):
+    fn = str(tmpdir.join('data'))
+    data = os.urandom(100000)
+    with open(fn, 'wb') as f:
+        f.write(data)
+    assert file_hash(fn, blocksize=1000) == hashlib.sha256(data).hexdigest()
+
+
+def test_hash_cache(tmpdir, monkeypatch):
+    fn = str(tmpdir.join('data'))
+    with open(fn, 'wb') as f:
+        f.write(b'one')
+    path = str(tmpdir.join('cache', 'hashes.json'))
+    cache = HashCache(path)
+    first = cache.hash(fn)
+    assert first == hashlib.sha256(b'one').hexdigest()
+    assert os.path.exists(path)
+
+    # kept on disc; an unchanged file is not read again
+    cache = HashCache(path)
+    hashed = []
+    monkeypatch.setattr(staging, 'file_hash',
+                        lambda fn: hashed.append(fn) or file_hash(fn))
+    assert cache.hash(fn) == first
+    assert hashed == []
+
+    with open(fn, 'wb') as f:
+        f.write(b'two!')
+    assert cache.hash(fn) == hashlib.sha256(b'two!').hexdigest()
+    assert hashed == [fn]
+
+
+def test_hash_cache_max_entries(tmpdir):
+    cache = HashCache(max_entries=2)
+    for name in 'abc':
+        tmpdir.join(name).write(name)
+        cache.hash(str(tmpdir.join(name)))
+    assert sorted(os.path.basename(k) for k in cache._entries) == ['b', 'c']
+
+
+def test_check_needs_upload(knit, tmpdir):
+    one = tmpdir.mkdir('one').join('env.zip')
+    one.write('environment one')
+    two = tmpdir.mkdir('two').join('env.zip')
+    two.write('environment two')
+    copy = tmpdir.join('renamed.zip')
+    copy.write('environment one')
+
+    path = knit.staging_path(str(one))
+    assert path == '/user/knit/.knitDeps/%s.zip' % hashlib.sha256(
+        b'environment one').hexdigest()
+    # same name, different content
+    assert knit.staging_path(str(two)) != path
+
+    assert knit.check_needs_upload(str(one))
+    knit.hdfs.put(str(one), path)
+    # the listing is cached
+    assert knit.check_needs_upload(str(one))
+    knit._staging_cache.invalidate()
+    assert not knit.check_needs_upload(str(one))
+    assert knit.check_needs_upload(str(two))
+    # same content, different name
+    assert knit.staging_path(str(copy)) == path
+    assert not knit.check_needs_upload(str(copy))
+
+    knit.upload_always = True
+    assert knit.check_needs_upload(str(one))
+
+    assert [f['name'] for f in knit.list_envs()] == [path]
+
+
+def test_one_listing(knit, tmpdir):
+    files = []
+    for i in range(20):
+        fn = tmpdir.join('file%i.txt' % i)
+        fn.write('data %i' % i)
+        files.append(str(fn))
+    for fn in files[::2]:
+        knit.hdfs.put(fn, knit.staging_path(fn))
+    # a partial upload
+    knit.hdfs.put(files[1], knit.staging_path(files[0]) + '.tmp')
+    with open(knit.hdfs._local(knit.staging_path(files[1])), 'wb') as f:
+        f.write(b'data')
+
+    knit.hdfs.calls = []
+    needs = [knit.check_needs_upload(fn) for fn in files]
+    assert needs == [i % 2 == 1 for i in range(20)]
+    assert knit.list_envs() == []
+    assert knit.hdfs.calls == ['ls']
+
+
+def test_nothing_staged(knit, tmpdir):
+    fn = tmpdir.join('env.zip')
+    fn.write('data')
+    assert knit.check_needs_upload(str(fn))
+    assert knit.list_envs() == []
+
+
+class UploadingClient(object):
+    """Stands in for the JVM client's staging calls, uploading to a
+    LocalHDFS one file at a time"""
+
+    def __init__(self, hdfs):
+        self.hdfs = hdfs
+        self.stats = {}
+
+    def stage(self, files, threads, replication):
+        self.replication = replication
+        for local, dest in sorted(files.items()):
+            size = os.path.getsize(local)
+            self.stats[dest] = {'size': size, 'bytes': 0, 'resumed_from': 0,
+                                'seconds': 0.1, 'done': False, 'error': None}
+            time.sleep(0.05)
+            self.hdfs.put(local, dest)
+            self.stats[dest].update(bytes=size, done=True)
+        return json.dumps(self.stats)
+
+    def stagingProgress(self, dests):
+        return json.dumps({d: self.stats[d] for d in dests
+                           if d in self.stats})
+
+
+class LaunchingClient(UploadingClient):
+    """An UploadingClient whose submissions fail, once the given number of
+    files is staged"""
+
+    def __init__(self, hdfs, wait_for=0):
+        super(LaunchingClient, self).__init__(hdfs)
+        self.wait_for = wait_for
+
+    def start(self, files, env, app_name, queue, hdfs_home, jar, replication):
+        wait_until(lambda: sum(s['done'] for s in self.stats.values())
+                   >= self.wait_for, timeout=5)
+        raise RuntimeError('submission failed')
+
+    def kill(self, app_id):
+        return True
+
+
+class LocalClient(SharedClient):
+    """The shared client, without a JVM, counting its starts"""
+
+    def __init__(self, jar, client):
+        super(LocalClient, self).__init__(jar)
+        self.client = client
+        self.started = 0
+
+    def _connect(self):
+        self.started += 1
+        gateway = type('Gateway', (object, ), {})()
+        gateway.entry_point = self.client
+        gateway._gateway_client = None
+        return gateway
+
+    def _disconnect(self):
+        pass
+
+
+def test_stage(knit, tmpdir):
+    files = []
+    for i in range(3):
+        fn = tmpdir.join('file%i.txt' % i)
+        fn.write('data %i' % i * 100)
+        files.append(str(fn))
+    client = UploadingClient(knit.hdfs)
+    knit._jvm = LocalClient(str(tmpdir.join('knit.jar')), client)
+    reports = []
+    stats = knit.stage(files, progress=reports.append, interval=0.01)
+    assert sorted(stats) == files
+    # the settings of this instance go with the call
+    assert client.replication == 1
+    assert all(s['done'] and s['bytes'] == s['size'] for s in stats.values())
+    assert len(reports) > 1
+    # the final report
+    assert summarize(reports[-1])[:2] == (1800, 1800)
+    assert summarize(reports[-1])[2] > 0
+    assert not any(knit.check_needs_upload(f) for f in files)
+    # all staged already
+    assert knit.stage(files) == {}
+
+
+def test_list_envs_names(knit, tmpdir):
+    env = tmpdir.join('dev.zip')
+    env.write('environment')
+    knit._jvm = LocalClient(str(tmpdir.join('knit.jar')),
+                            UploadingClient(knit.hdfs))
+    knit.stage([str(env)])
+    # staged by an earlier version, without a name
+    old = tmpdir.join('old.zip')
+    old.write('old environment')
+    knit.hdfs.put(str(old), knit.staging_path(str(old)))
+    knit._staging_cache.invalidate()
+    envs = {e['name']: e['original_name'] for e in knit.list_envs()}
+    assert envs == {knit.staging_path(str(env)): 'dev.zip',
+                    knit.staging_path(str(old)): None}
+    # the name file is not an upload
+    assert not knit.check_needs_upload(str(env))
+
+
+def test_no_process_settings(tmpdir):
+    before = dict(os.environ)
+    Knit(autodetect=False, rm='localhost', rm_port=8088, user='knit',
+         replication_factor=2, hdfs_home='/user/other')
+    assert dict(os.environ) == before
+
+
+def test_stage_files_when_ready(knit, tmpdir):
+    ready = tmpdir.join('ready.txt')
+    ready.write('ready')
+    later = tmpdir.join('later.zip')
+    client = UploadingClient(knit.hdfs)
+    knit._jvm = LocalClient(str(tmpdir.join('knit.jar')), client)
+    fut = Future()
+    trace = LaunchTrace()
+    uploads = run_in_thread(knit._stage_files,
+                            [str(ready), fut, 'hdfs:///data/x.csv'], trace,
+                            None)
+    # the ready file is uploaded without waiting for the other
+    wait_until(lambda: not knit.check_needs_upload(str(ready)), timeout=5)
+    assert not uploads.done()
+    later.write('built')
+    fut.set_result(str(later))
+    files, staged = uploads.result(timeout=5)
+    assert files == [str(ready), str(later), 'hdfs:///data/x.csv']
+    assert sorted(staged) == sorted([str(ready), str(later)])
+    assert not knit.check_needs_upload(str(later))
+    span = trace.spans[0]
+    assert span.name == 'upload'
+    assert span.attributes == {'files': 2, 'bytes': 10}
+    assert [s.name for s in trace.spans].count('hash') == 2
+
+
+def test_stage_files_failed(knit, tmpdir):
+    fut = Future()
+    fut.set_exception(IOError('no env'))
+    with pytest.raises(IOError):
+        knit._stage_files([fut], LaunchTrace(), None)
+
+
+def test_stage_files_stopped(knit):
+    fut, stop = Future(), Future()
+    uploads = run_in_thread(knit._stage_files, [fut], LaunchTrace(), None,
+                            stop)
+    assert not uploads.done()
+    stop.set_result(None)
+    with pytest.raises(KnitException):
+        uploads.result(timeout=5)
+    # the file being built is the caller's, and may be used again
+    assert not fut.done()
+
+
+def test_failed_launch_stops_uploads(knit, tmpdir, monkeypatch):
+    monkeypatch.setattr(core, 'MapConverter', Converter)
+    knit._jvm = LocalClient(str(tmpdir.join('knit.jar')),
+                            LaunchingClient(knit.hdfs))
+    fut = Future()
+    with pytest.raises(RuntimeError):
+        knit.start('env', files=[fut], checks=False)
+    # the upload thread has finished, not still waiting for the file
+    upload, = [s for s in knit.launch_trace.spans if s.name == 'upload']
+    assert upload.end is not None and 'KnitException' in upload.error
+
+
+class Converter(object):
+    """Stands in for py4j's converters, without a gateway"""
+
+    def convert(self, obj, gateway_client):
+        return obj
+
+
+def test_launch_shares_client_with_uploads(knit, tmpdir, monkeypatch):
+    monkeypatch.setattr(core, 'MapConverter', Converter)
+    fn = tmpdir.join('data.txt')
+    fn.write('data')
+    jvm = knit._jvm = LocalClient(str(tmpdir.join('knit.jar')),
+                                  LaunchingClient(knit.hdfs, wait_for=1))
+    uploaded = threading.Event()
+
+    def on_phase(name, event, span):
+        # let the uploads finish first, if they can before the client
+        # is taken for the submission
+        if (name, event) == ('upload', 'end'):
+            uploaded.set()
+        elif (name, event) == ('client', 'start'):
+            uploaded.wait(1)
+    with pytest.raises(RuntimeError):
+        knit.start('env', files=[str(fn)], checks=False, on_phase=on_phase)
+    assert not knit.check_needs_upload(str(fn))
+    # the uploads finished before the submission, but the JVM was not
+    # shut down meanwhile, nor started again
+    assert jvm.started == 1
+    assert jvm.refs == 1
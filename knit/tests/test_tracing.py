@@ -0,0 +1,112 @@
+from contextlib import contextmanager
+
+import pytest
+
+from knit.core import Knit
+from knit.exceptions import KnitException
+from knit.tracing import LaunchTrace, NoOpTracer, get_tracer, set_tracer
+
+
+class RecordingTracer(object):
+    """Has the interface of an OpenTelemetry tracer"""
+
+    def __init__(self):
+        self.spans = []
+
+    @contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        span = RecordingSpan(name, attributes)
+        self.spans.append(span)
+        yield span
+        span.ended = True
+
+
+class RecordingSpan(object):
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.ended = False
+
+    def set_attribute(self, key, value):
+        assert not self.ended
+        self.attributes[key] = value
+
+
+def test_trace():
+    tracer = RecordingTracer()
+    trace = LaunchTrace(tracer)
+    with trace.span('launch', app_name='x') as launch:
+        with trace.span('upload') as span:
+            span.set_attribute('files', 2)
+        with pytest.raises(ValueError):
+            with trace.span('submit'):
+                raise ValueError('no')
+        trace.add('submit.upload', 0.5)
+        launch.set_attribute('app_id', 'application_1_0001')
+    assert list(trace.timings) == ['launch', 'upload', 'submit',
+                                   'submit.upload']
+    assert abs(trace.timings['submit.upload'] - 0.5) < 1e-6
+    assert trace.spans[2].error == "ValueError('no',)" or \
+        trace.spans[2].error == "ValueError('no')"
+
+    assert [s.name for s in tracer.spans] == ['launch', 'upload', 'submit']
+    assert tracer.spans[0].attributes == {'app_name': 'x',
+                                          'app_id': 'application_1_0001'}
+    assert tracer.spans[1].attributes == {'files': 2}
+    assert trace.spans[1].attributes == {'files': 2}
+
+
+def test_global_tracer():
+    assert isinstance(get_tracer(), NoOpTracer)
+    tracer = RecordingTracer()
+    set_tracer(tracer)
+    try:
+        trace = LaunchTrace()
+        with trace.span('launch'):
+            pass
+        assert [s.name for s in tracer.spans] == ['launch']
+    finally:
+        set_tracer(None)
+    assert isinstance(get_tracer(), NoOpTracer)
+    # the default records locally only
+    trace = LaunchTrace()
+    with trace.span('launch'):
+        pass
+    assert list(trace.timings) == ['launch']
+
+
+def test_on_phase():
+    events = []
+
+    def on_phase(name, event, span):
+        events.append((name, event, span.end is not None))
+        if name == 'b':
+            raise RuntimeError('ignored')
+
+    trace = LaunchTrace(on_phase=on_phase)
+    with trace.span('a'):
+        with trace.span('b'):
+            pass
+    with pytest.raises(ValueError):
+        with trace.span('c'):
+            raise ValueError
+    assert events == [('a', 'start', False), ('b', 'start', False),
+                      ('b', 'end', True), ('a', 'end', True),
+                      ('c', 'start', False), ('c', 'error', True)]
+
+
+def test_start_async(tmpdir):
+    knit = Knit(autodetect=False, rm='localhost', rm_port=8088,
+                user='knit', replication_factor=1, hdfs_home='/user/knit',
+                knit_home=str(tmpdir))
+    events = []
+    # no JAR in knit_home, so the launch fails to start the client
+    fut = knit.start_async('sleep 1', checks=False,
+                           on_phase=lambda *args: events.append(args[:2]))
+    with pytest.raises(KnitException):
+        fut.result(timeout=10)
+    # files are staged from another thread
+    events = [e for e in events if e[0] not in ['upload', 'hash']]
+    assert events == [('launch', 'start'), ('client', 'start'),
+                      ('client', 'error'), ('launch', 'error')]
+    assert {'launch', 'client'} <= set(knit.launch_timings)
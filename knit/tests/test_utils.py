@@ -1,6 +1,10 @@
 import logging
+import threading
 
-from knit.utils import set_logging, triple_slash
+import pytest
+
+from knit.utils import (set_logging, triple_slash, get_log_content,
+                        run_in_thread)
 
 
 def test_set_logging():
@@ -15,3 +19,39 @@ def test_slashes():
     assert triple_slash('hdfs://hello/path') == 'hdfs:///hello/path'
     assert triple_slash('hdfs:///hello/path') == 'hdfs:///hello/path'
     assert triple_slash('hdfs:////hello/path') == 'hdfs:////hello/path'
+
+
+def test_log_content():
+    page = ('<td class="content">\n          <pre>error: oops\npre</pre>\n'
+            '        </td>')
+    assert get_log_content(page) == 'error: oops\npre'
+    page = ('<td class="content">\n          <p>Showing 5 bytes. Click <a '
+            'href="/node/containerlogs/c/u/stdout/?start=0">here</a> for full'
+            ' log</p><pre>\n two</pre>\n        </td>')
+    assert get_log_content(page) == '\n two'
+    assert get_log_content('<td class="content"><h1>Cannot find this log on '
+                           'the local disk.</h1></td>') == ''
+    assert get_log_content('<td class="content"><h1>Invalid start and end '
+                           'values. Start: [9], end[4]</h1></td>') == ''
+    # only the page structure tells a missing file
+    page = '<td class="content"><pre>Cannot find this log</pre></td>'
+    assert get_log_content(page) == 'Cannot find this log'
+
+
+def test_run_in_thread():
+    event = threading.Event()
+
+    def wait(x):
+        assert event.wait(5)
+        return x + 1
+
+    fut = run_in_thread(wait, 1)
+    assert not fut.done()
+    event.set()
+    assert fut.result(timeout=5) == 2
+
+    def fail():
+        raise ValueError('no')
+
+    with pytest.raises(ValueError):
+        run_in_thread(fail).result(timeout=5)
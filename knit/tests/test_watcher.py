@@ -0,0 +1,144 @@
+import time
+
+import pytest
+
+from knit.exceptions import YARNException
+from knit.watcher import StateWatcher, wait_until
+from knit.yarn_api import YARNAPI
+
+
+def test_wait_until():
+    calls = []
+
+    def func():
+        calls.append(time.time())
+        return len(calls) == 4
+    assert wait_until(func, 10, min_interval=0.01, backoff=2)
+    gaps = [b - a for a, b in zip(calls, calls[1:])]
+    assert gaps == sorted(gaps)
+
+    t0 = time.time()
+    assert not wait_until(lambda: False, 0.3, min_interval=0.05)
+    assert 0.3 <= time.time() - t0 < 1
+
+
+def test_one_request_per_poll(fake):
+    now = int(time.time() * 1000)
+    ids = ['application_1_%04d' % i for i in range(100)]
+    for i, app_id in enumerate(ids):
+        fake.add_app(app_id, state='ACCEPTED', startedTime=now + i)
+    fake.add_app('application_1_9999', startedTime=1)
+    w = StateWatcher(YARNAPI(fake.host, fake.port))
+    futures = [w.watch(app_id) for app_id in ids]
+    seen = []
+    w.on_transition(lambda *args: seen.append(args))
+
+    before = fake.counts['requests']
+    assert len(w.poll()) == 100
+    assert fake.counts['requests'] == before + 1
+    assert w.states[ids[0]] == 'ACCEPTED'
+
+    fake.apps[ids[0]]['state'] = 'RUNNING'
+    fake.apps[ids[1]]['state'] = 'FINISHED'
+    assert sorted(w.poll()) == [(ids[0], 'ACCEPTED', 'RUNNING'),
+                                (ids[1], 'ACCEPTED', 'FINISHED')]
+    assert fake.counts['requests'] == before + 2
+    assert futures[1].result(timeout=0) == 'FINISHED'
+    assert not futures[0].done()
+    assert len(seen) == 102
+
+    # no change: interval grows
+    interval = w.interval
+    assert w.poll() == []
+    assert w.interval > interval
+
+
+def test_background(fake):
+    fake.add_app('application_1_0001', state='RUNNING')
+    events = []
+    with StateWatcher(YARNAPI(fake.host, fake.port),
+                      min_interval=0.01, max_interval=0.05) as w:
+        fut = w.watch('application_1_0001',
+                      callback=lambda *args: events.append(args))
+        wait_until(lambda: events, 5, min_interval=0.01)
+        fake.apps['application_1_0001']['state'] = 'KILLED'
+        assert fut.result(timeout=5) == 'KILLED'
+    assert events == [('application_1_0001', None, 'RUNNING'),
+                      ('application_1_0001', 'RUNNING', 'KILLED')]
+
+
+def test_wait(fake):
+    fake.add_app('application_1_0001', state='RUNNING')
+    w = StateWatcher(YARNAPI(fake.host, fake.port), min_interval=0.01)
+    t0 = time.time()
+    assert w.wait('application_1_0001', timeout=0.2) is None
+    assert time.time() - t0 < 1
+    fake.apps['application_1_0001']['state'] = 'FAILED'
+    assert w.wait('application_1_0001', timeout=5) == 'FAILED'
+
+
+def test_listing_starts_recent(fake):
+    fake.add_app('application_1_0001', startedTime=1)
+    fake.add_app('application_1_0002')
+    queries = []
+    orig = fake._apps
+
+    def apps(query, body):
+        queries.append(query)
+        return orig(query, body)
+
+    fake.routes = [r[:2] + (apps, ) if r[2] == orig else r
+                   for r in fake.routes]
+    w = StateWatcher(YARNAPI(fake.host, fake.port), max_misses=2)
+    w.watch('application_1_0001')
+    w.watch('application_1_0002')
+    # even the first listing leaves out old apps...
+    assert w.poll() == [('application_1_0002', None, 'RUNNING')]
+    assert int(queries[0]['startedTimeBegin'][0]) > 1
+    # ... but an app missing from it is eventually looked up on its own
+    assert w.poll() == [('application_1_0001', None, 'RUNNING')]
+    # and is then listed
+    fake.apps['application_1_0001']['state'] = 'FINISHED'
+    assert w.poll() == [('application_1_0001', 'RUNNING', 'FINISHED')]
+    assert int(queries[-1]['startedTimeBegin'][0]) == 1
+
+
+def test_unknown_app(fake):
+    w = StateWatcher(YARNAPI(fake.host, fake.port), min_interval=0.01,
+                     max_misses=2)
+    fut = w.watch('application_1_0404')
+    w.poll()
+    assert not fut.done()
+    w.poll()
+    with pytest.raises(YARNException):
+        fut.result(timeout=0)
+    assert 'application_1_0404' not in w.states
+    with pytest.raises(YARNException):
+        w.wait('application_1_0404', timeout=5)
+
+
+def test_knits_share_watcher(fake):
+    from knit.core import Knit
+    ids = ['application_1_%04d' % i for i in range(10)]
+    knits = []
+    for app_id in ids:
+        fake.add_app(app_id)
+        k = Knit(autodetect=False, rm=fake.host, rm_port=fake.port,
+                 user='knit')
+        k.app_id = app_id
+        knits.append(k)
+    w = StateWatcher.shared(knits[0].yarn_api, min_interval=0.01,
+                            max_interval=0.05)
+    try:
+        assert all(StateWatcher.shared(k.yarn_api) is w for k in knits)
+        assert not knits[0].wait_for_completion(timeout=0.1)
+        for app_id in ids:
+            fake.apps[app_id]['state'] = 'FINISHED'
+        # the watcher lists the apps, rather than asking for each state
+        for k in knits:
+            k.yarn_api.state = None
+        assert all(k.wait_for_completion(timeout=5) for k in knits)
+    finally:
+        w.stop()
+        for k in knits:
+            k.app_id = None
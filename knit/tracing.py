@@ -0,0 +1,149 @@
+"""
+Timing the phases of launching an app, optionally reported to a tracer.
+
+A tracer is anything with OpenTelemetry's ``start_as_current_span(name,
+attributes=None)`` method, returning a context manager whose span has
+``set_attribute(key, value)``; so ``opentelemetry.trace.get_tracer(...)``
+can be passed to ``set_tracer`` or ``Knit(tracer=...)`` directly.
+"""
+from __future__ import absolute_import, division, print_function
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _NoOpSpan(object):
+    def set_attribute(self, key, value):
+        pass
+
+
+class NoOpTracer(object):
+    """Tracer which records nothing, the default"""
+
+    @contextmanager
+    def start_as_current_span(self, name, attributes=None, **kwargs):
+        yield _NoOpSpan()
+
+
+_tracer = NoOpTracer()
+
+
+def set_tracer(tracer):
+    """Set the tracer used by launches without their own; None for none"""
+    global _tracer
+    _tracer = tracer if tracer is not None else NoOpTracer()
+
+
+def get_tracer():
+    """The tracer used by launches without their own"""
+    return _tracer
+
+
+class Span(object):
+    """A phase of a launch, as recorded by ``LaunchTrace``
+
+    Attributes
+    ----------
+    name: str
+    start, end: float
+        Epoch seconds; end is None while running
+    attributes: dict
+    error: str or None
+        The exception which ended the phase, if any
+    """
+
+    def __init__(self, name, attributes, tracer_span=None):
+        self.name = name
+        self.start = time.time()
+        self.end = None
+        self.attributes = dict(attributes)
+        self.error = None
+        self._tracer_span = tracer_span
+
+    @property
+    def duration(self):
+        """Seconds taken so far"""
+        return (self.end or time.time()) - self.start
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+        if self._tracer_span is not None:
+            self._tracer_span.set_attribute(key, value)
+
+    def __repr__(self):
+        return '<Span {0}: {1:.3f}s>'.format(self.name, self.duration)
+
+
+class LaunchTrace(object):
+    """The phases of one launch, each recorded and passed to a tracer
+
+    Parameters
+    ----------
+    tracer: tracer or None
+        None to use the one set by ``set_tracer``
+    on_phase: callable or None
+        Called as ``on_phase(name, event, span)`` as each phase starts and
+        ends, where event is one of 'start', 'end' or 'error'. Exceptions
+        it raises are logged and otherwise ignored.
+
+    Examples
+    --------
+    >>> trace = LaunchTrace()
+    >>> with trace.span('upload', files=2):
+    ...     pass
+    >>> list(trace.timings)
+    ['upload']
+    """
+
+    def __init__(self, tracer=None, on_phase=None):
+        self.tracer = tracer
+        self.on_phase = on_phase
+        self.spans = []
+
+    def _notify(self, name, event, span):
+        if self.on_phase is not None:
+            try:
+                self.on_phase(name, event, span)
+            except Exception:
+                logger.exception("Error in launch phase callback")
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Record the enclosed code as a phase"""
+        tracer = self.tracer if self.tracer is not None else get_tracer()
+        with tracer.start_as_current_span(name,
+                                          attributes=attributes) as ts:
+            span = Span(name, attributes, ts)
+            self.spans.append(span)
+            self._notify(name, 'start', span)
+            try:
+                yield span
+            except BaseException as e:
+                span.error = repr(e)
+                span.end = time.time()
+                self._notify(name, 'error', span)
+                raise
+            span.end = time.time()
+            self._notify(name, 'end', span)
+
+    def add(self, name, seconds, **attributes):
+        """Record a phase timed elsewhere, e.g., in the JVM, as ending now"""
+        span = Span(name, attributes)
+        span.end = time.time()
+        span.start = span.end - seconds
+        self.spans.append(span)
+        return span
+
+    @property
+    def timings(self):
+        """Phase name -> seconds, for the phases which have finished; those
+        which ran more than once are summed"""
+        out = OrderedDict()
+        for s in list(self.spans):
+            if s.end is not None:
+                out[s.name] = out.get(s.name, 0) + s.duration
+        return out
@@ -1,6 +1,9 @@
 from __future__ import print_function, division, absolute_import
 
 import logging
+import threading
+
+from concurrent.futures import Future
 
 from .compatibility import check_output
 
@@ -36,13 +39,27 @@ def shell_out(cmd=None, **kwargs):
 
 
 def get_log_content(s):
-    if 'Cannot find this log' in s:
-        return ''
+    """Log text of a NodeManager's container log page
+
+    Only the ``<pre>`` block holds text of the file: a page for part of it
+    (``?start=N``) begins with a "Showing N bytes" note, and the page for a
+    missing file, or for a start past the end of the file, has only a
+    heading, for which this returns ''. The text is still HTML-escaped.
+    """
     st = """<td class="content">"""
-    ind0 = s.find(st) + len(st)
-    ind1 = s[ind0:].find("</td>")
-    out = s[ind0:ind0+ind1]
-    return out.lstrip('\n          <pre>').rstrip('</pre>\n        ')
+    ind0 = s.find(st)
+    if ind0 >= 0:
+        s = s[ind0 + len(st):]
+        ind1 = s.find("</td>")
+        if ind1 >= 0:
+            s = s[:ind1]
+    ind0 = s.find('<pre>')
+    if ind0 < 0:
+        return ''
+    ind1 = s.rfind('</pre>')
+    if ind1 < ind0:
+        ind1 = len(s)
+    return s[ind0 + 5:ind1]
 
 
 def triple_slash(s):
@@ -50,3 +67,30 @@ def triple_slash(s):
         return 'hdfs:///' + s[7:]
     else:
         return s
+
+
+def run_in_thread(func, *args, **kwargs):
+    """
+    Call func in a new daemon thread
+
+    Returns
+    -------
+    concurrent.futures.Future, resolving to the result of func or raising
+    its exception
+    """
+    fut = Future()
+
+    def run():
+        if not fut.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            fut.set_exception(e)
+        else:
+            fut.set_result(result)
+
+    thread = threading.Thread(target=run, name='knit-' + func.__name__)
+    thread.daemon = True
+    thread.start()
+    return fut
@@ -0,0 +1,298 @@
+"""
+Waiting on and watching the states of YARN applications.
+"""
+from __future__ import absolute_import, division, print_function
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+logger = logging.getLogger(__name__)
+
+# application states after which nothing more will happen
+FINAL_STATES = ('FINISHED', 'FAILED', 'KILLED')
+
+
+def wait_until(func, timeout, min_interval=0.2, max_interval=2, backoff=1.5):
+    """Call func with growing pauses, until it returns a true value
+
+    The deadline is by wall-clock, so time spent in func counts against it.
+
+    Parameters
+    ----------
+    func: callable
+        Takes no arguments
+    timeout: number
+        Seconds after which to give up
+    min_interval, max_interval: number
+        Bounds on the pause between calls, in seconds
+    backoff: number
+        Factor by which the pause grows after each call
+
+    Returns
+    -------
+    The last value returned by func
+    """
+    deadline = time.time() + timeout
+    interval = min_interval
+    while True:
+        out = func()
+        remaining = deadline - time.time()
+        if out or remaining <= 0:
+            return out
+        time.sleep(min(interval, remaining))
+        interval = min(interval * backoff, max_interval)
+
+
+class StateWatcher(object):
+    """Track the states of many applications with one poller
+
+    Each poll makes a single app-listing request to the RM, whatever the
+    number of apps being watched. The interval between polls starts at
+    ``min_interval`` and grows by ``backoff`` up to ``max_interval`` while
+    no watched app changes state, falling back to ``min_interval`` on any
+    change.
+
+    Poll in a background thread with ``start()``, or in the calling thread
+    with ``wait()``. ``Knit`` instances watch their apps with the watcher
+    ``shared`` by all those of a ResourceManager in the process.
+
+    Parameters
+    ----------
+    yarn_api: YARNAPI
+    min_interval, max_interval: number
+        Bounds on the time between polls, in seconds
+    backoff: number
+        Factor by which the interval grows while nothing changes
+    lookback: number
+        The listing only covers apps started since the earliest start time
+        seen of a watched app; for apps not yet seen, since this many
+        seconds before they were watched.
+    max_misses: int
+        After this many polls in a row whose listing lacks an app (e.g., it
+        started before the lookback), the app is looked up on its own. If
+        the RM does not know it (a wrong ID, or forgotten), its future
+        raises the RM's error and it is no longer watched.
+    filters:
+        Extra filters for the listing request (see ``YARNAPI.apps_info``),
+        e.g., ``user=``, to keep its response small
+
+    Examples
+    --------
+    >>> w = StateWatcher(k.yarn_api).start()  # doctest: +SKIP
+    >>> w.on_transition(lambda app, old, new: print(app, old, '->', new))
+    >>> fut = w.watch(app_id)
+    >>> fut.result()  # final state
+    'FINISHED'
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, yarn_api, min_interval=0.2, max_interval=5,
+                 backoff=1.5, lookback=600, max_misses=3, **filters):
+        self.yarn_api = yarn_api
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.lookback = lookback
+        self.max_misses = max_misses
+        self.filters = filters
+        self.interval = min_interval
+        self.states = {}
+        # app ID -> earliest start time of apps to list for it, in ms
+        self._started = {}
+        self._misses = {}
+        self._futures = {}
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def shared(cls, yarn_api, **kwargs):
+        """The running watcher of the RM of yarn_api, made and started if
+        needed; kwargs apply only when it is made"""
+        with cls._shared_lock:
+            watcher = cls._shared.get(yarn_api.url)
+            if watcher is None or watcher._thread is None:
+                watcher = cls._shared[yarn_api.url] = cls(yarn_api, **kwargs)
+                watcher.start()
+            return watcher
+
+    def watch(self, app_id, callback=None):
+        """Start tracking an app
+
+        Parameters
+        ----------
+        app_id: str
+        callback: callable or None
+            Called as ``callback(app_id, old_state, new_state)`` on each
+            state change of this app
+
+        Returns
+        -------
+        Future, resolving to the app's final state
+        """
+        with self._lock:
+            if app_id not in self._futures:
+                self.states[app_id] = None
+                self._started[app_id] = int(
+                    (time.time() - self.lookback) * 1000)
+                self._futures[app_id] = Future()
+            fut = self._futures[app_id]
+            if callback is not None:
+                self._callbacks.append((app_id, callback))
+        self.interval = self.min_interval
+        return fut
+
+    def unwatch(self, app_id):
+        """Stop tracking an app; its future is cancelled if unresolved"""
+        fut = self._forget(app_id)
+        if fut is not None:
+            fut.cancel()
+
+    def _forget(self, app_id):
+        """Drop all record of an app, returning its future"""
+        with self._lock:
+            self.states.pop(app_id, None)
+            self._started.pop(app_id, None)
+            self._misses.pop(app_id, None)
+            self._callbacks = [(a, cb) for a, cb in self._callbacks
+                               if a != app_id]
+            return self._futures.pop(app_id, None)
+
+    def on_transition(self, callback):
+        """Call ``callback(app_id, old_state, new_state)`` on any change"""
+        with self._lock:
+            self._callbacks.append((None, callback))
+
+    def poll(self):
+        """Update the states of all watched apps with one listing request
+
+        Returns
+        -------
+        list of (app_id, old_state, new_state) for the apps which changed
+        """
+        with self._lock:
+            watching = [a for a in self.states
+                        if self.states[a] not in FINAL_STATES]
+            started = [self._started[a] for a in watching]
+        if not watching:
+            return []
+        filters = dict(self.filters)
+        # only list apps at least as recent as the watched ones
+        filters['startedTimeBegin'] = min(started)
+        listed = {a['id']: a for a in self.yarn_api.apps_info(fresh=True,
+                                                              **filters)}
+        missing = []
+        with self._lock:
+            for app_id in watching:
+                if app_id in listed:
+                    self._misses.pop(app_id, None)
+                elif app_id in self.states:
+                    self._misses[app_id] = self._misses.get(app_id, 0) + 1
+                    if self._misses[app_id] >= self.max_misses:
+                        missing.append(app_id)
+        failed = []
+        for app_id in missing:
+            try:
+                listed[app_id] = self.yarn_api.apps_info(app_id, fresh=True)
+            except Exception as e:
+                logger.warning("Could not find app %s; no longer watching"
+                               " it", app_id, exc_info=1)
+                failed.append((app_id, e))
+        for app_id, e in failed:
+            fut = self._forget(app_id)
+            if fut is not None and not fut.done():
+                fut.set_exception(e)
+        changes = []
+        with self._lock:
+            for app_id in watching:
+                if app_id not in listed:
+                    continue
+                info = listed[app_id]
+                self._misses.pop(app_id, None)
+                if info.get('startedTime'):
+                    self._started[app_id] = info['startedTime']
+                old = self.states.get(app_id, 'UNWATCHED')
+                if app_id in self.states and info['state'] != old:
+                    self.states[app_id] = info['state']
+                    changes.append((app_id, old, info['state']))
+            callbacks = list(self._callbacks)
+        for app_id, old, new in changes:
+            for target, callback in callbacks:
+                if target is None or target == app_id:
+                    try:
+                        callback(app_id, old, new)
+                    except Exception:
+                        logger.exception("Error in state callback")
+            if new in FINAL_STATES:
+                fut = self._futures.get(app_id)
+                if fut is not None and not fut.done():
+                    fut.set_result(new)
+        if changes:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff,
+                                self.max_interval)
+        return changes
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.warning("State poll failed", exc_info=1)
+                self.interval = min(self.interval * self.backoff,
+                                    self.max_interval)
+            self._stopped.wait(self.interval)
+
+    def start(self):
+        """Poll in a background thread"""
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name='knit-state-watcher')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the background thread, if running"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def wait(self, app_id, timeout=None):
+        """Block until the given app reaches a final state
+
+        Returns
+        -------
+        The final state, or None if ``timeout`` seconds passed first.
+        Raises the RM's error if it does not know the app.
+        """
+        fut = self.watch(app_id)
+        if self._thread is None:
+            def done():
+                if not fut.done():
+                    try:
+                        self.poll()
+                    except Exception:
+                        # e.g., the RM briefly unreachable: try again
+                        logger.warning("State poll failed", exc_info=1)
+                return fut.done()
+            wait_until(done, float('inf') if timeout is None else timeout,
+                       self.min_interval, self.max_interval, self.backoff)
+        try:
+            return fut.result(timeout=0 if self._thread is None else timeout)
+        except TimeoutError:
+            return None
@@ -1,25 +1,289 @@
 from __future__ import absolute_import, division, print_function
 
+import codecs
+import io
+import json
 import logging
 import os
 import re
 import requests
+from requests.adapters import HTTPAdapter
 import socket
-from subprocess import STDOUT
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import Popen, PIPE, STDOUT, CalledProcessError
 try:
     from subprocess import SubprocessError
 except ImportError:  # pragma: no cover
     # py2
     from subprocess import CalledProcessError as SubprocessError
+import threading
 import time
 import warnings
 
+from .aggregated_logs import app_log_dir, read_app_logs
+from .cache import TTLCache, cached
+from .compatibility import unescape
 from .utils import shell_out, get_log_content
 from .exceptions import YARNException
 logger = logging.getLogger(__name__)
 
+# application states before completion
+ACTIVE_STATES = ['NEW', 'NEW_SAVING', 'SUBMITTED', 'ACCEPTED', 'RUNNING']
 
-class YARNAPI(object):
+
+_container_header = re.compile(br'Container: (\S+) on (\S+)')
+
+
+def iter_cli_logs(stream, chunksize=2**16):
+    """Parse the output of ``yarn logs`` incrementally
+
+    Only one chunk is held in memory at a time, so this is suitable for
+    reading directly from the pipe of the CLI process.
+
+    Parameters
+    ----------
+    stream: binary file-like
+        Output of ``yarn logs``
+    chunksize: int
+        Maximum number of bytes of log contents per record (approximate,
+        if the CLI does not give the length of the log)
+
+    Yields
+    ------
+    (container ID, node ID, log type, text chunk). Each log starts with a
+    record with empty text, so that empty logs are still reported.
+    """
+    container = node = ltype = length = None
+    pending = None
+    while True:
+        line = pending or stream.readline()
+        pending = None
+        if not line:
+            return
+        m = _container_header.match(line)
+        if m:
+            container, node = [g.decode('utf-8') for g in m.groups()]
+            ltype = None
+        elif line.startswith(b'LogType:'):
+            ltype = line[8:].strip().decode('utf-8')
+            length = None
+        elif line.startswith(b'LogLength:'):
+            try:
+                length = int(line[10:])
+            except ValueError:
+                length = None
+        elif line.rstrip(b'\r\n') == b'Log Contents:' and ltype:
+            yield container, node, ltype, ''
+            decoder = codecs.getincrementaldecoder('utf-8')('replace')
+            if length is not None:
+                while length > 0:
+                    data = stream.read(min(chunksize, length))
+                    if not data:
+                        break
+                    length -= len(data)
+                    text = decoder.decode(data)
+                    if text:
+                        yield container, node, ltype, text
+            else:
+                # no declared length (old CLI output): contents run until
+                # the next section header, and chunks are whole lines
+                buf, size = [], 0
+                while True:
+                    line = stream.readline()
+                    if (not line or line.startswith(b'LogType:') or
+                            line.startswith(b'End of LogType:') or
+                            _container_header.match(line)):
+                        pending = line
+                        break
+                    buf.append(line)
+                    size += len(line)
+                    if size >= chunksize:
+                        yield container, node, ltype, decoder.decode(
+                            b''.join(buf))
+                        buf, size = [], 0
+                if buf:
+                    yield container, node, ltype, decoder.decode(
+                        b''.join(buf))
+            text = decoder.decode(b'', final=True)
+            if text:
+                yield container, node, ltype, text
+            ltype = None
+
+
+def collect_cli_logs(records):
+    """Gather records from ``iter_cli_logs`` into per-container logs
+
+    Returns
+    -------
+    dict of container ID -> {'nodeId': .., 'stdout': .., 'stderr': ..,
+    <other log types>: ..}
+    """
+    parts = {}
+    nodes = {}
+    for container, node, ltype, chunk in records:
+        nodes[container] = node
+        parts.setdefault(container, {}).setdefault(ltype, []).append(chunk)
+    logs = {}
+    for container, node in nodes.items():
+        log = dict(nodeId=node, stdout='', stderr='')
+        for ltype, chunks in parts[container].items():
+            log[ltype] = ''.join(chunks)
+        logs[container] = log
+    return logs
+
+
+def parse_cli_logs(out):
+    """Split the complete output of ``yarn logs`` into per-container logs
+
+    See ``collect_cli_logs``.
+    """
+    if not isinstance(out, bytes):
+        out = out.encode('utf-8')
+    return collect_cli_logs(iter_cli_logs(io.BytesIO(out)))
+
+
+def cli_log_records(app_id, chunksize=2**16):
+    """Logs of an app from ``yarn logs``, parsed as the CLI produces them
+
+    Parameters
+    ----------
+    app_id: str
+        A yarn application ID string
+    chunksize: int
+        Maximum number of bytes of log contents per record
+
+    Yields
+    ------
+    (container ID, node ID, log type, text chunk); see ``iter_cli_logs``.
+    Raises ``CalledProcessError`` at the end if the CLI failed.
+    """
+    cmd = ["yarn", "logs", "-applicationId", app_id]
+    proc = Popen(cmd, stdout=PIPE)
+    try:
+        for record in iter_cli_logs(proc.stdout, chunksize):
+            yield record
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    if proc.returncode:
+        raise CalledProcessError(proc.returncode, cmd)
+
+
+def container_parents(container_id):
+    """App and app-attempt IDs of the given container ID
+
+    >>> container_parents('container_1452274436693_0001_01_000002')
+    ('application_1452274436693_0001', 'appattempt_1452274436693_0001_000001')
+    """
+    parts = container_id.split('_')[1:]
+    if parts[0].startswith('e'):
+        # container_e17_...: RM epoch
+        parts = parts[1:]
+    ts, app, attempt = parts[:3]
+    return ('application_{0}_{1}'.format(ts, app),
+            'appattempt_{0}_{1}_{2:06d}'.format(ts, app, int(attempt)))
+
+
+class YARNBase(object):
+    """Connection details and response handling shared by the REST clients
+
+    See ``YARNAPI`` for the parameters.
+    """
+    timeout = 2  # for REST HTTP calls
+    node_list_ttl = 30  # seconds, when fanning out to NodeManagers
+    # where NodeManagers aggregate the logs of finished apps
+    remote_log_dir = '/tmp/logs'
+    remote_log_dir_suffix = 'logs'
+
+    def __init__(self, rm, rm_port, scheme='http', gateway_path='',
+                 kerberos=False, username=None, password=None):
+        self.rm = rm
+        self.rm_port = rm_port
+        self.scheme = scheme
+        self.gateway_path = gateway_path
+        self.host_port = "{0}:{1}".format(self.rm, self.rm_port)
+        self.url = scheme + '://' + self.host_port + gateway_path + '/ws/v1/'
+        self.kerberos = kerberos
+        self.username = username
+        self.password = password
+
+    @staticmethod
+    def _kerberos_auth():
+        """requests_kerberos handler of the SPNEGO authentication of REST
+        calls; the async client takes its headers from one too"""
+        from requests_kerberos import HTTPKerberosAuth
+        return HTTPKerberosAuth()
+
+    @staticmethod
+    def _parse_container_status(out):
+        """Fields of a report of ``yarn container -status``, as a dict"""
+        fields = {}
+        for line in out.split('\n'):
+            if ' : ' in line:
+                key, value = line.split(' : ', 1)
+                fields[key.strip()] = value.strip()
+        return fields
+
+    @staticmethod
+    def _error(text):
+        """YARNException from the body of a failed REST response"""
+        try:
+            ex = json.loads(text)['RemoteException']
+            return YARNException(ex.get('message', str(ex)))
+        except (ValueError, KeyError, TypeError):
+            return YARNException(text)
+
+    @staticmethod
+    def _query_params(filters):
+        """RM query parameters from filter values; lists are comma-joined"""
+        return {k: ','.join(v) if isinstance(v, (list, tuple)) else v
+                for k, v in filters.items() if v is not None}
+
+    @staticmethod
+    def _attempt_id(app_id, attempt):
+        """ID of an attempt, as listed by ``app_attempts``"""
+        return attempt.get('appAttemptId') or (
+            'appattempt_{0}_{1:06d}'.format(app_id.split('_', 1)[1],
+                                            int(attempt['id'])))
+
+    @staticmethod
+    def _reports_missing(status, text, app_id, attempt_id):
+        """Whether a failure to list the containers of an attempt means that
+        the RM lacks the endpoint (before Hadoop 2.9)
+
+        The RM's "not found" for an unknown app or attempt names it; a 404
+        which does not is for the endpoint itself.
+        """
+        return status == 404 and app_id not in text and attempt_id not in text
+
+    @staticmethod
+    def _from_report(c):
+        """RM container report with the NodeManager's field names added"""
+        out = dict(c)
+        out.update(id=c['containerId'], state=c.get('containerState'),
+                   nodeId=c.get('assignedNodeId') or c.get('nodeId'),
+                   containerLogsLink=c.get('logUrl'))
+        return out
+
+    @staticmethod
+    def _containers_of_app(app_id, data):
+        """Filter a NodeManager ``containers`` response to the given app"""
+        if not data:
+            raise YARNException("No containers available")
+
+        container = data['container']
+        logger.debug(container)
+
+        # container_1452274436693_0001_01_000001
+        def get_app_id_num(x):
+            return "_".join(x.split("_")[1:3])
+
+        app_id_num = get_app_id_num(app_id)
+        return [d for d in container
+                if get_app_id_num(d['id']) == app_id_num]
+
+
+class YARNAPI(YARNBase):
     """REST interface to YARN
 
     self.auth holds the authentication being used - it can be updated as
@@ -40,26 +304,151 @@ class YARNAPI(object):
         https://github.com/requests/requests-kerberos
     username, password: str
         For simple authentication of the REST endpoint.
+    pool_connections: int
+        Number of per-host connection pools to keep (the RM plus however
+        many NodeManagers are contacted for container information and logs)
+    pool_maxsize: int
+        Maximum number of keep-alive connections retained for each host
+    cache: TTLCache, dict or number
+        If given, results of queries are cached for a time; see
+        ``knit.cache.TTLCache``. A ``TTLCache`` instance may be shared
+        between several YARNAPIs. Default: no caching.
+    rm_ha: list of (host, port) or "host:port"
+        All ResourceManagers, if running in HA mode. Calls go to the one
+        last found to be active; when that redirects or cannot be reached,
+        all are probed at once for the new active RM, and the call is
+        retried there. The active RM is remembered between instances.
     """
-    timeout = 2  # for REST HTTP calls
+    # tuple of RM addresses -> last known active one
+    _active_rms = {}
 
     def __init__(self, rm, rm_port, scheme='http', gateway_path='',
-                 kerberos=False, username=None, password=None):
-        self.rm = rm
-        self.rm_port = rm_port
-        self.scheme = scheme
-        self.gateway_path = gateway_path
-        self.host_port = "{0}:{1}".format(self.rm, self.rm_port)
-        self.url = scheme + '://' + self.host_port + gateway_path + '/ws/v1/'
+                 kerberos=False, username=None, password=None,
+                 pool_connections=10, pool_maxsize=10, cache=None,
+                 rm_ha=None):
+        super(YARNAPI, self).__init__(rm, rm_port, scheme=scheme,
+                                      gateway_path=gateway_path,
+                                      kerberos=kerberos, username=username,
+                                      password=password)
         if kerberos:
-            from requests_kerberos import HTTPKerberosAuth
-            self.auth = HTTPKerberosAuth()
+            self.auth = self._kerberos_auth()
         elif username and password:
             self.auth = (username, password)
         else:
             self.auth = None
-        self.username = username
-        self.password = password
+        self.session = self._make_session(pool_connections, pool_maxsize)
+        if cache is not None and not isinstance(cache, TTLCache):
+            cache = TTLCache(cache)
+        self.cache = cache
+        # whether the RM reports containers of an attempt (unknown: None)
+        self._rm_container_reports = None
+        self._node_list = None
+        self.rm_ha = tuple(
+            a if isinstance(a, str) else '{0}:{1}'.format(*a)
+            for a in rm_ha or ())
+        self._failover_lock = threading.Lock()
+        if self.rm_ha:
+            if self.host_port not in self.rm_ha:
+                self.rm_ha = (self.host_port, ) + self.rm_ha
+            active = self._active_rms.get(self.rm_ha)
+            if active:
+                self._set_rm(active)
+
+    def _set_rm(self, host_port):
+        """Direct subsequent RM calls to the given address"""
+        self.rm, port = host_port.rsplit(':', 1)
+        self.rm_port = int(port)
+        self.host_port = host_port
+        self.url = (self.scheme + '://' + host_port + self.gateway_path +
+                    '/ws/v1/')
+
+    def _probe_rm(self, host_port):
+        """HA state of the RM at the given address, or None if unreachable"""
+        url = (self.scheme + '://' + host_port + self.gateway_path +
+               '/ws/v1/cluster/info')
+        try:
+            r = self.session.get(url, auth=self.auth, timeout=self.timeout,
+                                 allow_redirects=False)
+            return r.json()['clusterInfo'].get('haState')
+        except (requests.RequestException, ValueError, KeyError):
+            return None
+
+    def find_active_rm(self):
+        """Probe all RMs of the HA set at once, and use the active one
+
+        Returns
+        -------
+        "host:port" of the active RM, or None if none could be found (in
+        which case the current RM is kept).
+        """
+        if not self.rm_ha:
+            return self.host_port
+        with ThreadPoolExecutor(max_workers=len(self.rm_ha)) as ex:
+            states = list(ex.map(self._probe_rm, self.rm_ha))
+        for host_port, state in zip(self.rm_ha, states):
+            if state == 'ACTIVE':
+                logger.debug("Active RM is %s", host_port)
+                self._active_rms[self.rm_ha] = host_port
+                self._set_rm(host_port)
+                return host_port
+        logger.warning("No active RM among %s", self.rm_ha)
+        return None
+
+    def _failover(self, base):
+        """Find the active RM, if the RM with URL base was in use; returns
+        whether calls now go elsewhere"""
+        with self._failover_lock:
+            if self.url == base:
+                self.find_active_rm()
+            return self.url != base
+
+    @staticmethod
+    def _make_session(pool_connections, pool_maxsize):
+        """HTTP session with keep-alive connection pools, shared by calls"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _get(self, url, **kwargs):
+        """GET on the pooled session, with the current timeout and auth"""
+        return self._request('get', url, **kwargs)
+
+    def _request(self, method, url, **kwargs):
+        """Make a request on the pooled session, failing over to another RM
+        in HA mode if needed"""
+        kwargs.setdefault('timeout', self.timeout)
+        base = self.url
+        if not (self.rm_ha and url.startswith(base)):
+            return self.session.request(method, url, auth=self.auth,
+                                        **kwargs)
+        try:
+            r = self.session.request(method, url, auth=self.auth, **kwargs)
+        except requests.ConnectionError:
+            if not self._failover(base):
+                raise
+            logger.info("RM %s unreachable, failed over to %s",
+                        base, self.url)
+        else:
+            if not r.history:
+                return r
+            # a standby RM redirected us; the answer is good, but find the
+            # active RM so that later calls don't take the extra hop
+            self._failover(base)
+            return r
+        return self.session.request(method, self.url + url[len(base):],
+                                    auth=self.auth, **kwargs)
+
+    def close(self):
+        """Release pooled connections"""
+        self.session.close()
+
+    def invalidate(self, endpoint=None):
+        """Drop cached results, of the given endpoint (method name) or all"""
+        if self.cache is not None:
+            self.cache.invalidate(endpoint)
 
     @property
     def apps(self):
@@ -68,75 +457,155 @@ class YARNAPI(object):
         apps = [d['id'] for d in data]
         return apps
 
-    def apps_info(self, app_id=None):
-        """List app apps, or info for given app"""
+    @cached
+    def apps_info(self, app_id=None, states=None, user=None, queue=None,
+                  applicationTypes=None, name=None, limit=None,
+                  startedTimeBegin=None, **filters):
+        """List app apps, or info for given app
+
+        When listing, the filters are applied by the RM, so that only the
+        matching apps are transferred.
+
+        Parameters
+        ----------
+        app_id: str or None
+            If given, return info for this app only, and ignore filters
+        states: list of str
+            Application states to include, e.g., ``['RUNNING']``
+        user, queue, name: str
+            Only apps of this user, in this queue, with this name
+        applicationTypes: list of str
+            Application types to include, e.g., ``['YARN']``
+        limit: int
+            Maximum number of apps to return
+        startedTimeBegin: int
+            Only apps started at or after this time (ms since epoch)
+        filters:
+            Any further query parameters supported by the RM, e.g.,
+            ``finishedTimeBegin``
+        """
         if app_id is None:
             # this query allows for filtering on a number of parameters
             url = self.url + 'cluster/apps/'
-            logger.debug("Getting Resource Manager Info: {0}".format(url))
-            r = requests.get(url, timeout=self.timeout, auth=self.auth)
+            filters.update(states=states, user=user, queue=queue,
+                           applicationTypes=applicationTypes, name=name,
+                           limit=limit, startedTimeBegin=startedTimeBegin)
+            params = self._query_params(filters)
+            logger.debug("Getting Resource Manager Info: {0} {1}".format(
+                url, params))
+            r = self._get(url, params=params)
             self._verify_response(r)
             data = r.json()
-            return (data.get('apps', None) or {'app': []})['app']
+            apps = (data.get('apps', None) or {'app': []})['app']
+            if name is not None:
+                # older RMs ignore this filter
+                apps = [a for a in apps if a['name'] == name]
+            return apps
         else:
-            r = requests.get(self.url + 'cluster/apps/{}'.format(app_id),
-                             timeout=self.timeout, auth=self.auth)
+            r = self._get(self.url + 'cluster/apps/{}'.format(app_id))
             self._verify_response(r)
             return r.json()['app']
 
     def app_attempts(self, app_id):
         """List of attempt details for given app"""
-        r = requests.get(self.url + 'cluster/apps/{}/appattempts'.format(
-                app_id), timeout=self.timeout, auth=self.auth)
+        r = self._get(self.url + 'cluster/apps/{}/appattempts'.format(app_id))
         self._verify_response(r)
         return r.json().get('appAttempts', {'app_attempt': []})['appAttempt']
 
-    def app_containers(self, app_id=None, info=None):
+    def app_containers(self, app_id=None, info=None, max_workers=32):
         """
-        Get list of container information for given app. If given app_id,
-        will automatically get its info, or can skip by providing the info
-        directly.
-        
+        Get list of container information for given app, on all nodes.
+
+        Asks the RM for the containers of the app's current attempt
+        (Hadoop 2.9+). For older RMs, every running NodeManager is asked
+        concurrently, with the list of nodes cached for ``node_list_ttl``
+        seconds.
+
         Parameters
         ----------
         app_id: str
             YARN ID for the app
         info: dict
-            Produced by app_info()
-    
+            Produced by app_info(), as an alternative to app_id
+        max_workers: int
+            Number of NodeManagers to query at once, if needed
+
         Returns
         -------
-        List of container info dictionaries
+        List of container info dictionaries, with at least the fields of
+        the NodeManager REST API: id, state, nodeId, containerLogsLink
         """
         if (app_id is None) == (info is None):
             raise TypeError('Must provide app_id or info')
-        if app_id:
-            info = self.status(app_id)
-
-        amHostHttpAddress = info['amHostHttpAddress']
-
-        url = "http://{0}/ws/v1/node/containers".format(
-            amHostHttpAddress)
-        r = requests.get(url, timeout=self.timeout, auth=self.auth)
-        self._verify_response(r)
-
-        data = r.json()['containers']
+        app_id = app_id or info['id']
+        if self._rm_container_reports is not False:
+            attempts = self.app_attempts(app_id)
+            if not attempts:
+                # not yet scheduled
+                return []
+            attempt_id = self._attempt_id(app_id, attempts[-1])
+            r = self._get(self.url + 'cluster/apps/{0}/appattempts/{1}/'
+                          'containers'.format(app_id, attempt_id))
+            if r.ok:
+                self._rm_container_reports = True
+                return [self._from_report(c)
+                        for c in r.json().get('container') or []]
+            if not self._reports_missing(r.status_code, r.text, app_id,
+                                         attempt_id):
+                self._verify_response(r)
+            self._rm_container_reports = False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            per_node = ex.map(lambda addr: self._node_app_containers(
+                addr, app_id), self._node_addresses())
+            return [c for containers in per_node for c in containers]
+
+    def _node_addresses(self):
+        """HTTP addresses of running NodeManagers, cached for a time"""
+        if self._node_list is None or self._node_list[0] < time.time():
+            addresses = [n['nodeHTTPAddress'] for n in self.nodes()
+                         if n.get('state', 'RUNNING') == 'RUNNING']
+            self._node_list = (time.time() + self.node_list_ttl, addresses)
+        return self._node_list[1]
+
+    def _node_app_containers(self, address, app_id):
+        """Containers of the app on one NodeManager"""
+        url = "http://{0}/ws/v1/node/containers".format(address)
+        try:
+            r = self._get(url)
+            self._verify_response(r)
+            data = r.json()['containers']
+        except Exception:
+            logger.debug("Failed to list containers on %s", address,
+                         exc_info=1)
+            return []
         if not data:
-            raise YARNException("No containers available")
+            return []
+        return self._containers_of_app(app_id, data)
 
-        container = data['container']
-        logger.debug(container)
+    def _container_logs(self, c, semaphore):
+        """Fetch stdout/stderr of one container, holding the node's semaphore
 
-        # container_1452274436693_0001_01_000001
-        def get_app_id_num(x):
-            return "_".join(x.split("_")[1:3])
-
-        app_id_num = get_app_id_num(app_id)
-        containers = [d for d in container
-                      if get_app_id_num(d['id']) == app_id_num]
-        return containers
-
-    def logs(self, app_id, shell=False, retries=4, delay=3):
+        A failure to fetch either file is recorded under ``errors`` rather
+        than raised, so that one bad container does not lose the others.
+        """
+        log = dict(nodeId=c['nodeId'])
+        with semaphore:
+            for ltype in ['stdout', 'stderr']:
+                url = "{0}/{1}/?start=0".format(c['containerLogsLink'], ltype)
+                logger.debug("Gather {0} data from {1}: {2}".format(
+                    ltype, c['nodeId'], url))
+                try:
+                    r = self._get(url)
+                    self._verify_response(r)
+                    log[ltype] = get_log_content(r.text)
+                except Exception as e:
+                    log[ltype] = ''
+                    log.setdefault('errors', {})[ltype] = str(e)
+        return log
+
+    def logs(self, app_id, shell=False, retries=4, delay=3, max_workers=16,
+             per_node=4, fs=None):
         """
         Collect logs from RM (if running)
         With shell=True, collect logs from HDFS after job completion
@@ -151,88 +620,200 @@ class YARNAPI(object):
             If CLI is not returning info, retry this many times
         delay: number
             Seconds to wait between retries
+        max_workers: int
+            Number of container logs to fetch concurrently from a running app
+        per_node: int
+            Maximum simultaneous fetches from any one NodeManager
+        fs: HDFileSystem or None
+            If given, the logs of a finished app are read directly from its
+            aggregated log files (see ``aggregated_logs``), and the CLI is
+            only used if that fails.
 
         Returns
         -------
         log: dictionary
-            logs from each container (when possible)
+            logs from each container (when possible). For a running app, the
+            entry of a container whose logs could not be fetched has an
+            ``errors`` dict, log-type: message.
         """
-        running = self.state(app_id) == 'RUNNING'
+        running = self.state(app_id, fresh=True) == 'RUNNING'
         if not shell and running:
             # logs are held in memory only while app is running
             try:
                 containers = self.app_containers(app_id)
-                logs = {}
-                for c in containers:
-                    log = dict(nodeId=c['nodeId'])
-
-                    # grab stdout
-                    url = "{0}/stdout/?start=0".format(c['containerLogsLink'])
-                    logger.debug("Gather stdout/stderr data from {0}:"
-                                 " {1}".format(c['nodeId'], url))
-                    r = requests.get(url, timeout=self.timeout, auth=self.auth)
-                    log['stdout'] = get_log_content(r.text)
-
-                    # grab stderr
-                    url = "{0}/stderr/?start=0".format(c['containerLogsLink'])
-                    r = requests.get(url, timeout=self.timeout, auth=self.auth)
-                    log['stderr'] = get_log_content(r.text)
-
-                    logs[c['id']] = log
-                return logs
+                semaphores = {c['nodeId']: threading.BoundedSemaphore(
+                    per_node) for c in containers}
+                with ThreadPoolExecutor(max_workers=max_workers) as ex:
+                    futures = {c['id']: ex.submit(self._container_logs, c,
+                                                  semaphores[c['nodeId']])
+                               for c in containers}
+                return {cid: f.result() for cid, f in futures.items()}
 
             except Exception:
                 logger.warning("Error while attempting to fetch logs,"
                                " using fallback", exc_info=1)
 
+        if fs is not None and not running:
+            try:
+                return self.aggregated_logs(app_id, fs)
+            except Exception:
+                logger.warning("Error while reading aggregated logs,"
+                               " using CLI fallback", exc_info=1)
+
         # fallback
-        # TODO: this is just a location in HDFS given by app info
-        cmd = ["yarn", "logs", "-applicationId", app_id]
         while True:
             try:
-                out = shell_out(cmd)
-                break
+                return collect_cli_logs(self.stream_cli_logs(app_id))
             except SubprocessError:  # pragma: no cover
                 retries -= 1
                 if retries < 0:
                     raise RuntimeError('Retries exceeded when fetching logs for'
                                        ' ' + app_id)
                 time.sleep(delay)
-        logs = {}
-        container = None
-        ltype = 'stdout'
-        started = False
-        for line in out.split('\n'):
-            p = re.compile('Container: ([a-zA-Z0-9_]+) on ([a-zA-Z0-9_]+)')
-            r = p.match(line)
-            if r:
-                container, nodeID = r.groups()
-                logs[container] = dict(nodeId=nodeID, stdout='', stderr='')
-                started = False
-            elif line == 'LogType:stderr':
-                ltype = 'stderr'
-            elif line == 'LogType:stdout':
-                ltype = 'stdout'
-            elif line == "Log Contents:":
-                started = True
-            elif started:
-                logs[container][ltype] = logs[container][ltype] + '\n' + line
-
-        return logs
+
+    def aggregated_logs(self, app_id, fs=None, containers=None,
+                        log_types=None):
+        """Logs of a finished app, read from its aggregated log files
+
+        Much faster than the yarn CLI, as no JVM is started and only the
+        logs asked for are read. Only YARN's default TFile format can be
+        read; logs aggregated in the IndexedFile format (IFile) raise
+        IOError, and must be fetched with ``logs(app_id, shell=True)``.
+
+        Parameters
+        ----------
+        app_id: str
+        fs: HDFileSystem or None
+            Filesystem holding the logs; the local filesystem if None.
+        containers: list of str or None
+            Only these containers' logs
+        log_types: list of str or None
+            Only these log types, e.g., ``['stderr']``
+
+        Returns
+        -------
+        dict of container ID -> {'nodeId': .., <log type>: text}
+        """
+        user = self.apps_info(app_id).get('user') or self.username
+        path = app_log_dir(app_id, user, self.remote_log_dir,
+                           self.remote_log_dir_suffix)
+        return read_app_logs(path, fs, containers=containers,
+                             log_types=log_types)
+
+    def stream_cli_logs(self, app_id, chunksize=2**16):
+        """Logs of an app from ``yarn logs``, parsed as the CLI produces them
+
+        See ``cli_log_records``.
+        """
+        return cli_log_records(app_id, chunksize)
+
+    def _log_increment(self, c, ltype, offset, semaphore):
+        """Text of a container's log file from the given byte offset"""
+        url = "{0}/{1}/?start={2}".format(c['containerLogsLink'], ltype,
+                                          offset)
+        with semaphore:
+            r = self._get(url)
+        self._verify_response(r)
+        return unescape(get_log_content(r.text))
+
+    def follow_logs(self, app_id, log_types=('stdout', 'stderr'), interval=1,
+                    max_workers=16, per_node=4):
+        """
+        Generator of container log lines of a running app, as they appear
+
+        A byte offset is kept for each container and log file, so that each
+        poll only fetches the bytes written since the previous one. Returns
+        once the app is no longer running (after a final poll).
+
+        Parameters
+        ----------
+        app_id: str
+            A yarn application ID string
+        log_types: list of str
+            Which log files to follow in each container
+        interval: number
+            Seconds between polls
+        max_workers, per_node: int
+            Concurrency of fetches, overall and for any one NodeManager
+
+        Yields
+        ------
+        (container ID, log type, line)
+        """
+        offsets = {}
+        partial = {}
+        containers = []
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            while True:
+                running = self.state(app_id, fresh=True) == 'RUNNING'
+                if running:
+                    containers = self.app_containers(app_id)
+                # else: one last poll of the containers seen, for output
+                # written since the previous one
+                semaphores = {c['nodeId']: threading.BoundedSemaphore(
+                    per_node) for c in containers}
+                futures = [((c['id'], ltype), ex.submit(
+                    self._log_increment, c, ltype,
+                    offsets.get((c['id'], ltype), 0),
+                    semaphores[c['nodeId']]))
+                    for c in containers for ltype in log_types]
+                for key, f in futures:
+                    try:
+                        text = f.result()
+                    except Exception:
+                        logger.debug("Failed to fetch log %s", key,
+                                     exc_info=1)
+                        continue
+                    if not text:
+                        continue
+                    offsets[key] = (offsets.get(key, 0) +
+                                    len(text.encode('utf-8')))
+                    lines = (partial.pop(key, '') + text).split('\n')
+                    # an unterminated last line waits for the next poll
+                    partial[key] = lines.pop()
+                    for line in lines:
+                        yield key + (line,)
+                if not running:
+                    break
+                time.sleep(interval)
+        for key, line in partial.items():
+            if line:
+                yield key + (line,)
 
     def container_status(self, container_id):
         """Ask the YARN shell about the given container
 
         Better to use app_containers, assuming you know the app_id, which
-        is normally "_".join(container_id.split("_")[:3])
+        is normally "_".join(container_id.split("_")[:3]); or
+        ``container_info``, which does not start the CLI.
         """
         cmd = ["yarn", "container", "-status", container_id]
         return str(shell_out(cmd))
 
+    def container_info(self, container_id):
+        """Report on the given container, as a dictionary
+
+        Asks the RM's REST service (Hadoop 2.9+), falling back to the yarn
+        CLI (``container_status``), whose report is parsed into a dict of
+        its fields.
+        """
+        app_id, attempt_id = container_parents(container_id)
+        url = self.url + 'cluster/apps/{0}/appattempts/{1}/containers/{2}'
+        try:
+            r = self._get(url.format(app_id, attempt_id, container_id))
+            self._verify_response(r)
+            return r.json()['container']
+        except (requests.RequestException, YARNException, ValueError,
+                KeyError):
+            logger.debug("Container report not available from REST, using"
+                         " CLI fallback", exc_info=1)
+        return self._parse_container_status(
+            self.container_status(container_id))
+
+    @cached
     def state(self, app_id):
         """Current state of given application"""
-        r = requests.get(self.url + 'cluster/apps/{}/state'.format(app_id),
-                         timeout=self.timeout, auth=self.auth)
+        r = self._get(self.url + 'cluster/apps/{}/state'.format(app_id))
         self._verify_response(r)
         return r.json()['state']
     
@@ -250,26 +831,40 @@ class YARNAPI(object):
         """
         return self.apps_info(app_id)
 
-    def kill_all(self, knit_only=True):
+    def kill_all(self, knit_only=True, max_workers=16):
         """Kill a set of applications
-        
+
         Parameters
         ----------
         knit_only: bool (True)
-            Only kill apps with the name 'knit' (i.e., ones we started)
+            Only kill apps with the name 'knit' (i.e., ones we started,
+            unless given another ``app_name``); False to kill every active
+            app
+        max_workers: int
+            Number of kills to run concurrently
+
+        Returns
+        -------
+        dict of app ID -> whether killing succeeded; this used to return
+        None, so callers which ignore the result are unaffected
         """
-        for app in self.apps:
-            stat = self.apps_info(app)
-            if knit_only and stat['name'] != 'knit':
-                continue
-            if stat['state'] in ['KILLED', 'FINISHED', 'FAILED']:
-                continue
-            self.kill(app)
+        apps = self.apps_info(states=ACTIVE_STATES,
+                              name='knit' if knit_only else None, fresh=True)
+        # as before, any app not yet finished; checked here too, in case
+        # the RM ignored the filter
+        app_ids = [a['id'] for a in apps if a['state'] in ACTIVE_STATES]
+        if not app_ids:
+            return {}
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            return dict(zip(app_ids, ex.map(self.kill, app_ids)))
 
     def kill(self, app_id):
         """
         Method to kill a yarn application
 
+        Asks the RM's REST service to move the app to the KILLED state; if
+        that is refused, falls back to the yarn CLI.
+
         Parameters
         ----------
         app_id: str
@@ -278,56 +873,65 @@ class YARNAPI(object):
         Returns
         -------
         bool:
-            True if successful, False otherwise.
+            True if successful (or the kill was accepted and is in
+            progress), False otherwise.
         """
+        url = self.url + 'cluster/apps/{}/state'.format(app_id)
+        params = {'user.name': self.username} if self.username else None
+        try:
+            r = self._request('put', url, json={'state': 'KILLED'},
+                              params=params)
+            self._verify_response(r)
+            self.invalidate('state')
+            self.invalidate('apps_info')
+            return True
+        except (requests.RequestException, YARNException):
+            logger.debug("Kill by REST failed, using CLI fallback",
+                         exc_info=1)
 
         cmd = ["yarn", "application", "-kill", app_id]
         try:
             out = shell_out(cmd, stderr=STDOUT)
             return "Killed application" in out
-        except SubprocessError:
+        except (SubprocessError, OSError):
             return False
 
     def _verify_response(self, r):
         if not r.ok:
-            try:
-                ex = r.json()['RemoteException']
-                raise YARNException(ex.get('message', str(ex)))
-            except (ValueError, IndexError):
-                raise YARNException(r.text)
+            raise self._error(r.text)
 
+    @cached
     def cluster_info(self):
         """YARN cluster information: driver, version..."""
-        r = requests.get(self.url + 'cluster', timeout=self.timeout,
-                         auth=self.auth)
+        r = self._get(self.url + 'cluster')
         self._verify_response(r)
         return r.json()['clusterInfo']
 
+    @cached
     def cluster_metrics(self):
         """YARN cluster global capacity/allocations"""
-        r = requests.get(self.url + 'cluster/metrics', timeout=self.timeout,
-                         auth=self.auth)
+        r = self._get(self.url + 'cluster/metrics')
         self._verify_response(r)
         return r.json()['clusterMetrics']
 
+    @cached
     def scheduler(self):
         """State of the scheduler/queue"""
-        r = requests.get(self.url + 'cluster/scheduler', timeout=self.timeout,
-                         auth=self.auth)
+        r = self._get(self.url + 'cluster/scheduler')
         self._verify_response(r)
         return r.json()['scheduler']
 
+    @cached
     def app_stats(self):
         """Number of apps of various states"""
-        r = requests.get(self.url + 'cluster/appstatistics',
-                         timeout=self.timeout, auth=self.auth)
+        r = self._get(self.url + 'cluster/appstatistics')
         self._verify_response(r)
         return r.json()['appStatInfo']
 
+    @cached
     def nodes(self):
         """Info on YARN's worker nodes"""
-        r = requests.get(self.url + 'cluster/nodes', timeout=self.timeout,
-                         auth=self.auth)
+        r = self._get(self.url + 'cluster/nodes')
         self._verify_response(r)
         return r.json()['nodes']['node']
 
@@ -186,13 +186,17 @@ object ApplicationMaster extends Logging with AMRMClientAsync.CallbackHandler wi
   
         if (files.length > 0) {
           for (fileName <- files) {
+            // "<path>#<name>" appears in the container as name
+            val (location, name) = fileName.split("#", 2) match {
+              case Array(loc, link) => (loc, link)
+              case _ => (fileName, new Path(fileName).getName)
+            }
             var iszip = false
-            if (fileName.endsWith(".zip")) {
+            if (name.endsWith(".zip")) {
               iszip = true
             }
             val fileUpload = Records.newRecord(classOf[LocalResource])
-            var p = new Path(fileName)
-            val name = p.getName  
+            var p = new Path(location)
             logger.info(f"RESOURCE: $p archive=$iszip")
             setUpLocalResource(p, fileUpload, archived=iszip)
             localResources(name) = fileUpload
@@ -24,7 +24,7 @@ import org.apache.hadoop.yarn.api.ApplicationConstants
 import org.apache.hadoop.yarn.api.records.{ContainerLaunchContext, _}
 import org.apache.hadoop.yarn.client.api.YarnClient
 import org.apache.hadoop.yarn.conf.YarnConfiguration
-import org.apache.hadoop.yarn.util.Records
+import org.apache.hadoop.yarn.util.{ConverterUtils, Records}
 import org.apache.log4j.Logger
 
 
@@ -36,16 +36,49 @@ import org.apache.log4j.Logger
  */
 
 object Client extends Logging {
-  
-  var client: YarnClient = _
-  var appId: ApplicationId = _
+
+  // one YarnClient serves all the applications started by this JVM
+  lazy val client: YarnClient = {
+    val c = YarnClient.createYarnClient()
+    c.init(new YarnConfiguration())
+    c.start()
+    c
+  }
+  // the last application started, for the calls without an application ID
+  @volatile var appId: ApplicationId = _
+
+  val UPLOAD_THREADS = 4
+
+  // application ID -> timings of its start, until collected
+  private val appTimings = new java.util.concurrent.ConcurrentHashMap[String, String]()
+
+  // when running as a daemon: pids of the attached Python processes, with
+  // the number of references each holds, and when each was last heard from
+  private val attached = HashMap[Int, Int]()
+  private val lastSeen = HashMap[Int, Long]()
+  private var idleSince = System.currentTimeMillis
+  // milliseconds without a heartbeat after which a process is forgotten
+  @volatile private var leaseTimeout = 60000L
 
   def main(args: Array[String]) {
     //from https://github.com/apache/spark/blob/d83c2f9f0b08d6d5d369d9fae04cdb15448e7f0d/core/src/main/scala/org/apache/spark/api/python/PythonGatewayServer.scala
     //thank you spark
     
+    val parsedArgs = parseArgs(args)
+    logger.debug(f"$parsedArgs%s")
+
+    // Only callers with the token chosen by the launching process may use
+    // the gateway; it comes in the environment, which other users cannot see
+    val authToken = sys.env.getOrElse("KNIT_GATEWAY_TOKEN", {
+      logger.error("KNIT_GATEWAY_TOKEN not set; exiting")
+      sys.exit(1)
+    })
+
     //Start a GatewayServer on an ephemeral port
-    val gatewayServer: GatewayServer = new GatewayServer(this, 0)
+    val gatewayServer: GatewayServer = new GatewayServer.GatewayServerBuilder(this)
+      .javaPort(0)
+      .authToken(authToken)
+      .build()
     gatewayServer.start()
     
     val boundPort: Int = gatewayServer.getListeningPort
@@ -56,9 +89,6 @@ object Client extends Logging {
       logger.debug(s"Started PythonGatewayServer on port $boundPort")
     }
     
-    val parsedArgs = parseArgs(args)
-    logger.debug(f"$parsedArgs%s")
-    
     // Communicate the bound port back to the caller via the caller-specified callback port
     val callbackHost = parsedArgs.callbackHost
     val callbackPort = parsedArgs.callbackPort
@@ -70,6 +100,14 @@ object Client extends Logging {
     dos.close()
     callbackSocket.close()
 
+    if (parsedArgs.daemon) {
+      // Outlive the Python driver, serving any process which attaches
+      leaseTimeout = parsedArgs.leaseTimeout * 1000L
+      waitIdle(parsedArgs.idleTimeout)
+      logger.info("Exiting daemon after idle timeout")
+      System.exit(0)
+    }
+
     // Exit on EOF or broken pipe to ensure that this process dies when the Python driver dies:
     while (System.in.read() != -1) {
       // Do nothing
@@ -77,33 +115,104 @@ object Client extends Logging {
     logger.debug("Exiting due to broken pipe from Python driver")
     System.exit(0)
   }
+
+  def attach(pid: Int): Int = synchronized {
+    attached(pid) = attached.getOrElse(pid, 0) + 1
+    lastSeen(pid) = System.currentTimeMillis
+    logger.info(s"Process $pid attached")
+    attached.values.sum
+  }
+
+  def detach(pid: Int): Int = synchronized {
+    attached.get(pid) match {
+      case Some(n) if n > 1 => attached(pid) = n - 1
+      case Some(_) =>
+        attached.remove(pid)
+        lastSeen.remove(pid)
+      case None =>
+    }
+    logger.info(s"Process $pid detached")
+    if (attached.isEmpty) {
+      idleSince = System.currentTimeMillis
+    }
+    attached.values.sum
+  }
+
+  // sent periodically by each attached process, with the number of
+  // references it holds
+  def heartbeat(pid: Int, refs: Int): Int = synchronized {
+    if (refs > 0) {
+      attached(pid) = refs
+      lastSeen(pid) = System.currentTimeMillis
+    }
+    attached.values.sum
+  }
+
+  def references(): Int = synchronized {
+    reapDetached()
+    attached.values.sum
+  }
+
+  // forget processes not heard from within the lease, e.g., which died
+  // without detaching
+  private def reapDetached() = synchronized {
+    val now = System.currentTimeMillis
+    val dead = attached.keys.filter(pid => now - lastSeen.getOrElse(pid, 0L) > leaseTimeout).toList
+    for (pid <- dead) {
+      logger.info(s"Process $pid not heard from in ${leaseTimeout / 1000}s; forgetting it")
+      attached.remove(pid)
+      lastSeen.remove(pid)
+    }
+    if (dead.nonEmpty && attached.isEmpty) {
+      idleSince = now
+    }
+  }
+
+  // block until no process has been attached for idleTimeout seconds
+  def waitIdle(idleTimeout: Int) {
+    var idle = false
+    while (!idle) {
+      Thread.sleep(1000)
+      idle = synchronized {
+        reapDetached()
+        attached.isEmpty && System.currentTimeMillis - idleSince > idleTimeout * 1000L
+      }
+    }
+  }
   
-  def start(files2: java.util.ArrayList[String], envin2: java.util.HashMap[String, String],
-            appName: String, queue: String) : String = {
+  // files2 maps each local file to the HDFS path it is staged at; the
+  // staging settings come with each call, as Knit instances sharing this
+  // JVM may differ in them
+  def start(files2: java.util.HashMap[String, String], envin2: java.util.HashMap[String, String],
+            appName: String, queue: String, hdfsHome: String, jar: String,
+            replication: Int) : String = {
     logger.info("Starting Application Master")
     var files = files2.asScala
     var envin = envin2.asScala
 
+    // seconds spent in each step, reported by timings()
+    val steps = new java.util.LinkedHashMap[String, Double]()
+    def timed[T](name: String)(body: => T): T = {
+      val t0 = System.nanoTime
+      try body finally steps.put(name, (System.nanoTime - t0) / 1e9)
+    }
+
     implicit val conf = new YarnConfiguration()
     val fs = FileSystem.get(conf)
     val cred = new Credentials()
-    val out = fs.addDelegationTokens("yarn", cred)
-
-    setDependencies()
+    val out = timed("tokens") { fs.addDelegationTokens("yarn", cred) }
 
     val stagingDir = ".knitDeps"
-    val stagingDirPath = new Path(sys.env("HDFS_KNIT_DIR"), stagingDir)
-    val KNIT_JAR = new Path(stagingDirPath, "knit-1.0-SNAPSHOT.jar")
+    val stagingDirPath = new Path(hdfsHome, stagingDir)
+
+    val KNIT_JAR = timed("stage_jar") {
+      setDependencies(stagingDirPath, new File(jar), replication.toShort)
+    }
     val KNIT_JAR_PATH = KNIT_JAR.makeQualified(fs.getUri, fs.getWorkingDirectory)
     logger.debug(f"$KNIT_JAR_PATH%s")
 
-    // start a yarn client
-    client = YarnClient.createYarnClient()
-    client.init(conf)
-    client.start()
-
     // application creation
-    val app = client.createApplication()
+    val app = timed("create_application") { client.createApplication() }
     val amContainer = Records.newRecord(classOf[ContainerLaunchContext])
 
     val dob = new DataOutputBuffer()
@@ -123,22 +232,11 @@ object Client extends Logging {
     env("KNIT_USER") = UserGroupInformation.getCurrentUser.getShortUserName
     env("KNIT_YARN_STAGING_DIR") = stagingDirPath.toString
 
-    if (files.length > 0) {
-      for (fileName <- files) {
-        var iszip = false
-        if (fileName.endsWith(".zip")) {
-          iszip = true
-        }
-        val fileUpload = Records.newRecord(classOf[LocalResource])
-        var p = new Path(fileName)
-        val name = p.getName  
-        if (fileName.startsWith("hdfs://")) {
-          logger.debug(s"HDFS existing resource $fileName")
-        } else {
-          val file = new File(fileName)
-          uploadFile(file.getAbsolutePath)  
-        }
-      }
+    val uploads = files.filterKeys(!_.startsWith("hdfs://")).map {
+      case (fileName, dest) => (new File(fileName).getAbsolutePath, dest)
+    }.toMap
+    timed("upload") {
+      Uploader.upload(uploads, UPLOAD_THREADS, replication.toShort)
     }
 
     //add the jar which contains the Application master code to classpath
@@ -173,20 +271,49 @@ object Client extends Logging {
     appContext.setQueue(queue)
 
     //submit the application
-    appId = appContext.getApplicationId
-    logger.info(s"Submitting application $appId")
-    client.submitApplication(appContext)
-    
-    return appId.toString
+    val newAppId = appContext.getApplicationId
+    logger.info(s"Submitting application $newAppId")
+    timed("submit") { client.submitApplication(appContext) }
+    appId = newAppId
+    appTimings.put(newAppId.toString, steps.asScala.map {
+      case (k, v) => "\"%s\": %.6f".formatLocal(java.util.Locale.ROOT, k, v)
+    }.mkString("{", ", ", "}"))
+
+    return newAppId.toString
   }
   
-  def masterRPCHost(): String = {
-    val appReport = client.getApplicationReport(appId)
+  // upload local files to their HDFS paths, several at a time; returns the
+  // statistics of each as JSON, see Uploader.report
+  def stage(files: java.util.HashMap[String, String], threads: Int, replication: Int): String = {
+    implicit val conf = new YarnConfiguration()
+    val uploads = files.asScala.toMap
+    Uploader.upload(uploads, threads, replication.toShort)
+    Uploader.report(uploads.values.toList)
+  }
+
+  def stagingProgress(dests: java.util.ArrayList[String]): String = {
+    Uploader.report(dests.asScala)
+  }
+
+  // seconds taken by each step of starting an application, as JSON; each
+  // application's are reported once
+  def timings(app: String): String = {
+    Option(appTimings.remove(app)).getOrElse("{}")
+  }
+
+  private def toAppId(app: String): ApplicationId = ConverterUtils.toApplicationId(app)
+
+  def masterRPCHost(): String = masterRPCHost(appId.toString)
+
+  def masterRPCHost(app: String): String = {
+    val appReport = client.getApplicationReport(toAppId(app))
     appReport.getHost
   }
 
-  def getContainers(): String = {
-    val attempts = client.getApplicationAttempts(appId).asScala
+  def getContainers(): String = getContainers(appId.toString)
+
+  def getContainers(app: String): String = {
+    val attempts = client.getApplicationAttempts(toAppId(app)).asScala
     val attempt = attempts.last
 
     logger.info(s"Getting containers for $attempt")
@@ -202,29 +329,39 @@ object Client extends Logging {
     container_list
   }
 
-  def masterRPCPort(): Int = {
-    val appReport = client.getApplicationReport(appId)
+  def masterRPCPort(): Int = masterRPCPort(appId.toString)
+
+  def masterRPCPort(app: String): Int = {
+    val appReport = client.getApplicationReport(toAppId(app))
     appReport.getRpcPort
   }
 
-  def numUsedContainers() : Int = {
-    val appReport = client.getApplicationReport(appId)
+  def numUsedContainers(): Int = numUsedContainers(appId.toString)
+
+  def numUsedContainers(app: String): Int = {
+    val appReport = client.getApplicationReport(toAppId(app))
     val usageReport = appReport.getApplicationResourceUsageReport
     usageReport.getNumUsedContainers
   }
 
-  def status() : String = {
-    val appReport = client.getApplicationReport(appId)
+  def status(): String = status(appId.toString)
+
+  def status(app: String): String = {
+    val appReport = client.getApplicationReport(toAppId(app))
     appReport.getYarnApplicationState.name
   }
 
-  def applicationAttempts() : String = {
-    val attempts = client.getApplicationAttempts(appId)
+  def applicationAttempts(): String = applicationAttempts(appId.toString)
+
+  def applicationAttempts(app: String): String = {
+    val attempts = client.getApplicationAttempts(toAppId(app))
     attempts.toString
   }
 
-  def kill() : Boolean = {
-    client.killApplication(appId)
+  def kill(): Boolean = kill(appId.toString)
+
+  def kill(app: String): Boolean = {
+    client.killApplication(toAppId(app))
     true
   }
 
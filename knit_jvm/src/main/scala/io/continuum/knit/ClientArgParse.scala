@@ -5,7 +5,9 @@ import scala.collection.mutable.ArraySeq
 
 import scopt._
 
-case class ClientConfig(callbackHost: String = "127.0.0.1", callbackPort: Int = 0)
+case class ClientConfig(callbackHost: String = "127.0.0.1", callbackPort: Int = 0,
+                        daemon: Boolean = false, idleTimeout: Int = 600,
+                        leaseTimeout: Int = 60)
 
 object ClientArguments {
   val parser = new scopt.OptionParser[ClientConfig]("scopt") {
@@ -18,6 +20,18 @@ object ClientArguments {
       c.copy(callbackPort = x)
     } text ("Port of the python callbackhost")
 
+    opt[Unit]('d', "daemon") action { (_, c) =>
+      c.copy(daemon = true)
+    } text ("Outlive the launching process; exit once idle")
+
+    opt[Int]('i', "idleTimeout") action { (x, c) =>
+      c.copy(idleTimeout = x)
+    } text ("Seconds without attached processes before a daemon exits")
+
+    opt[Int]('l', "leaseTimeout") action { (x, c) =>
+      c.copy(leaseTimeout = x)
+    } text ("Seconds without a heartbeat before a daemon forgets a process")
+
     help("help") text ("command line for launching distributed python")
 
   }
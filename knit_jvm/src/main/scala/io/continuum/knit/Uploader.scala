@@ -0,0 +1,241 @@
+package io.continuum.knit
+import java.io.{File, FileInputStream, IOException}
+import java.util.concurrent.{ConcurrentHashMap, ExecutionException, Executors}
+
+import scala.collection.JavaConverters._
+
+import org.apache.hadoop.conf.Configuration
+import org.apache.hadoop.fs.Path
+import org.apache.hadoop.fs.permission.FsPermission
+import org.apache.hadoop.ipc.RemoteException
+
+/**
+ * Progress of the upload of one file; read by other threads while it runs.
+ */
+class UploadProgress(val size: Long) {
+  val started: Long = System.currentTimeMillis
+  @volatile var bytes: Long = 0
+  @volatile var resumedFrom: Long = 0
+  @volatile var finished: Long = 0
+  @volatile var error: String = null
+
+  def seconds: Double =
+    ((if (finished > 0) finished else System.currentTimeMillis) - started) / 1000.0
+}
+
+/**
+ * Uploads local files to HDFS several at a time, resuming partial uploads.
+ *
+ * Each file is written to <dest>._COPYING_ and renamed when complete, so a
+ * file at its destination is always whole. Data is flushed to the DataNodes
+ * chunk by chunk; an upload which fails leaves the partial file behind, and
+ * a later attempt for the same destination appends to it. Destinations are
+ * content-addressed, so a partial file of the same name holds the start of
+ * the same content.
+ *
+ * Only one writer at a time uploads to a destination: within this JVM, by
+ * a lock, and between JVMs (or hosts), by the HDFS lease on the partial
+ * file, which makes create and append fail for other clients while its
+ * writer is alive. Such a failure is waited out, after which the
+ * destination is usually found staged; the lease of a writer which died
+ * expires after HDFS's soft limit, a minute, and its partial file is then
+ * taken over.
+ */
+object Uploader extends Logging {
+
+  val CHUNK_SIZE = 4 * 1024 * 1024
+
+  // App files are world-wide readable and owner writable -> rw-r--r--
+  val APP_FILE_PERMISSION: FsPermission =
+    FsPermission.createImmutable(Integer.parseInt("644", 8).toShort)
+
+  // destination -> progress of its current or last upload
+  val progress = new ConcurrentHashMap[String, UploadProgress]()
+
+  // milliseconds to wait for another client writing the same destination
+  val WRITER_WAIT = 600000L
+
+  // only one upload at a time to each destination from this JVM; all its
+  // threads share one HDFS client, and so one lease
+  private val locks = new ConcurrentHashMap[String, Object]()
+
+  private def lock(dest: String): Object = {
+    locks.putIfAbsent(dest, new Object)
+    locks.get(dest)
+  }
+
+  // forget uploads which finished more than ten minutes ago
+  private def purge() {
+    val old = System.currentTimeMillis - 600000
+    for ((dest, p) <- progress.asScala.toList if p.finished > 0 && p.finished < old) {
+      progress.remove(dest)
+    }
+  }
+
+  /**
+   * Upload files, a map of local path -> HDFS destination path, using up to
+   * `threads` at once; throws the first failure once all have finished.
+   */
+  def upload(files: Map[String, String], threads: Int, replication: Short)
+            (implicit conf: Configuration): Unit = {
+    if (files.isEmpty) {
+      return
+    }
+    purge()
+    val pool = Executors.newFixedThreadPool(math.max(1, math.min(threads, files.size)))
+    try {
+      val futures = for ((local, dest) <- files.toList) yield {
+        pool.submit(new Runnable {
+          def run() {
+            lock(dest).synchronized {
+              uploadOne(local, dest, replication)
+            }
+          }
+        })
+      }
+      var failure: Throwable = null
+      for (f <- futures) {
+        try {
+          f.get()
+        } catch {
+          case e: ExecutionException if failure == null => failure = e.getCause
+          case e: ExecutionException =>
+        }
+      }
+      if (failure != null) {
+        throw failure
+      }
+    } finally {
+      pool.shutdown()
+    }
+  }
+
+  def uploadOne(local: String, destination: String, replication: Short)
+               (implicit conf: Configuration): Unit = {
+    val file = new File(local)
+    val dest = new Path(destination)
+    val fs = dest.getFileSystem(conf)
+    val partial = new Path(dest.getParent, dest.getName + "._COPYING_")
+    val p = new UploadProgress(file.length)
+    progress.put(destination, p)
+    try {
+      // staged by someone else before, or while waiting for their lease
+      if (staged(dest, file) || copyHoldingLease(file, dest, partial, p, replication)) {
+        logger.info(s"$dest already staged")
+        p.bytes = p.size
+        p.resumedFrom = p.size
+      } else {
+        fs.setReplication(partial, replication)
+        fs.setPermission(partial, new FsPermission(APP_FILE_PERMISSION))
+        fs.delete(dest, false)
+        if (!fs.rename(partial, dest)) {
+          throw new IOException(s"Could not rename $partial to $dest")
+        }
+        val rate = (p.bytes - p.resumedFrom) / 1048576.0 / math.max(p.seconds, 0.001)
+        logger.info(f"Uploaded $local%s to $dest%s: ${p.bytes}%d bytes in ${p.seconds}%.1fs ($rate%.1f MB/s)")
+      }
+    } catch {
+      case e: Exception =>
+        p.error = e.toString
+        throw e
+    } finally {
+      p.finished = System.currentTimeMillis
+    }
+  }
+
+  private def staged(dest: Path, file: File)(implicit conf: Configuration): Boolean = {
+    val fs = dest.getFileSystem(conf)
+    fs.exists(dest) && fs.getFileStatus(dest).getLen == file.length
+  }
+
+  // whether the lease of the file is held by another HDFS client, or being
+  // recovered from one which died
+  private def leaseHeld(e: IOException): Boolean = {
+    val name = e match {
+      case r: RemoteException => r.getClassName
+      case _ => e.getClass.getName
+    }
+    name.endsWith("AlreadyBeingCreatedException") || name.endsWith("RecoveryInProgressException")
+  }
+
+  /**
+   * Copy the file to the partial path, waiting while another client holds
+   * its lease; returns true, without copying, if that client staged the
+   * destination meanwhile.
+   */
+  private def copyHoldingLease(file: File, dest: Path, partial: Path, p: UploadProgress,
+                               replication: Short)(implicit conf: Configuration): Boolean = {
+    val deadline = System.currentTimeMillis + WRITER_WAIT
+    while (true) {
+      try {
+        copy(file, partial, p, replication)
+        return false
+      } catch {
+        case e: IOException if leaseHeld(e) && System.currentTimeMillis < deadline =>
+          logger.info(s"Another client is writing $partial; waiting")
+          Thread.sleep(5000)
+          if (staged(dest, file)) {
+            return true
+          }
+      }
+    }
+    false
+  }
+
+  private def copy(file: File, partial: Path, p: UploadProgress, replication: Short)
+                  (implicit conf: Configuration): Unit = {
+    val fs = partial.getFileSystem(conf)
+    var offset = 0L
+    val out = if (fs.exists(partial) && fs.getFileStatus(partial).getLen <= file.length) {
+      try {
+        offset = fs.getFileStatus(partial).getLen
+        val stream = fs.append(partial)
+        logger.info(s"Resuming upload to $partial from $offset bytes")
+        stream
+      } catch {
+        case e: IOException =>
+          // e.g., append not supported, or the lease of a crashed writer
+          // not yet expired
+          logger.info(s"Cannot resume $partial, starting over: $e")
+          offset = 0
+          fs.create(partial, true, CHUNK_SIZE, replication, fs.getDefaultBlockSize(partial))
+      }
+    } else {
+      fs.create(partial, true, CHUNK_SIZE, replication, fs.getDefaultBlockSize(partial))
+    }
+    p.resumedFrom = offset
+    p.bytes = offset
+    val in = new FileInputStream(file)
+    try {
+      in.getChannel.position(offset)
+      val buf = new Array[Byte](CHUNK_SIZE)
+      var n = in.read(buf)
+      while (n > 0) {
+        out.write(buf, 0, n)
+        // so that a later attempt can resume from here
+        out.hflush()
+        p.bytes += n
+        n = in.read(buf)
+      }
+    } finally {
+      in.close()
+      out.close()
+    }
+  }
+
+  private def quote(s: String): String =
+    if (s == null) "null"
+    else "\"" + s.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") + "\""
+
+  /**
+   * Progress of the uploads to the given destinations, as JSON:
+   * {dest: {size, bytes, resumed_from, seconds, done, error}}
+   */
+  def report(dests: Seq[String]): String = {
+    val entries = for (d <- dests; p <- Option(progress.get(d))) yield {
+      quote(d) + ": " + "{\"size\": %d, \"bytes\": %d, \"resumed_from\": %d, \"seconds\": %.3f, \"done\": %s, \"error\": %s}".formatLocal(
+        java.util.Locale.ROOT, p.size, p.bytes, p.resumedFrom, p.seconds, p.finished > 0, quote(p.error))
+    }
+    entries.mkString("{", ", ", "}")
+  }
+}
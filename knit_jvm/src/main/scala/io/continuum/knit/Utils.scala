@@ -1,5 +1,6 @@
 package io.continuum.knit
-import java.io.File
+import java.io.{File, FileInputStream}
+import java.security.MessageDigest
 import java.net.{InetAddress, UnknownHostException, URI, URISyntaxException}
 import com.google.common.base.Objects
 
@@ -42,46 +43,58 @@ object Utils extends Logging {
 
   }
 
-  def setDependencies()(implicit conf: YarnConfiguration) = {
+  // local file -> ((length, modification time), hex SHA-256)
+  private val hashes = new java.util.concurrent.ConcurrentHashMap[String, ((Long, Long), String)]()
+
+  def fileHash(file: File): String = {
+    val stamp = (file.length, file.lastModified)
+    val known = hashes.get(file.getAbsolutePath)
+    if (known != null && known._1 == stamp) {
+      return known._2
+    }
+    val digest = MessageDigest.getInstance("SHA-256")
+    val in = new FileInputStream(file)
+    try {
+      val buf = new Array[Byte](1024 * 1024)
+      var n = in.read(buf)
+      while (n > 0) {
+        digest.update(buf, 0, n)
+        n = in.read(buf)
+      }
+    } finally {
+      in.close()
+    }
+    val hex = digest.digest().map("%02x".format(_)).mkString
+    hashes.put(file.getAbsolutePath, (stamp, hex))
+    hex
+  }
+
+  /**
+   * Stage the knit JAR in the given staging directory, returning its path
+   * in HDFS.
+   *
+   * The JAR is staged by its content, as .knitDeps/<sha256>.jar, and only
+   * uploaded if missing: an unchanged JAR keeps its HDFS timestamp, so the
+   * NodeManagers' localized copies stay valid.
+   */
+  def setDependencies(stagingDirPath: Path, KNIT_JAR: File, replicationFactor: Short)
+                     (implicit conf: YarnConfiguration): Path = {
     val fs = FileSystem.get(conf)
-    val stagingDir = ".knitDeps"
-    val stagingDirPath = new Path(sys.env("HDFS_KNIT_DIR"), stagingDir)
+    val dest = new Path(stagingDirPath, fileHash(KNIT_JAR) + ".jar")
+    if (fs.exists(dest)) {
+      logger.debug(s"$KNIT_JAR already staged at $dest")
+      return dest
+    }
 
     // Staging directory is globally readable for now
     val STAGING_DIR_PERMISSION: FsPermission =
       FsPermission.createImmutable(Integer.parseInt("777", 8).toShort)
     FileSystem.mkdirs(fs, stagingDirPath, new FsPermission(STAGING_DIR_PERMISSION))
 
-    val replicationFactor = sys.env("REPLICATION_FACTOR").toShort
     logger.info(s"Setting Replication Factor to: $replicationFactor")
-
-    val jarDepPath = Seq(sys.env("KNIT_HOME")).mkString(File.separator)
-    val KNIT_JAR = new File(jarDepPath, "knit-1.0-SNAPSHOT.jar").getAbsolutePath()
-    logger.info(s"Attemping upload of $KNIT_JAR to $stagingDirPath")
-
-    // upload all files to stagingDir
-    List(KNIT_JAR).foreach {
-      case (file) =>
-        val p = getQualifiedLocalPath(Utils.resolveURI(file))
-        copyFileToRemote(stagingDirPath, p, replicationFactor)
-    }
-  }
-
-  def uploadFile(filePath: String)(implicit conf: YarnConfiguration) = {
-    val fs = FileSystem.get(conf)
-    val stagingDir = ".knitDeps"
-    val stagingDirPath = new Path(sys.env("HDFS_KNIT_DIR"), stagingDir)
-    val replicationFactor = sys.env("REPLICATION_FACTOR").toShort
-
-    val FILE_PATH = new File(filePath).getAbsolutePath()
-    logger.info(s"Attempting upload of $FILE_PATH to $stagingDirPath")
-
-    // upload all files to stagingDir
-    List(FILE_PATH).foreach {
-      case (file) =>
-        val p = getQualifiedLocalPath(Utils.resolveURI(file))
-        copyFileToRemote(stagingDirPath, p, replicationFactor)
-    }
+    logger.info(s"Attemping upload of $KNIT_JAR to $dest")
+    Uploader.upload(Map(KNIT_JAR.getAbsolutePath -> dest.toString), 1, replicationFactor)
+    dest
   }
 
   def copyFileToRemote(destDir: Path, srcPath: Path,
@@ -39,6 +39,8 @@ setup(name='knit',
       packages=['knit', 'dask_yarn'],
       package_data={'knit': ['java_libs/knit-1.0-SNAPSHOT.jar']},
       install_requires=requires,
+      extras_require={'async': ['aiohttp'],
+                      'kerberos': ['requests-kerberos']},
       long_description=(open('README.rst').read()
                         if os.path.exists('README.rst') else ''),
       zip_safe=False)